@@ -0,0 +1,158 @@
+import time
+
+
+class AdaptiveBatchController:
+    """
+    Controller adapting batch sizes to a memory budget (RSS limit) during inference.
+
+    The token budget of the Hugging Face classifiers (see `dynamic_batching`) and the batch
+    size of the PyABSA aspect extractor were fixed for one Colab machine. The controller
+    instead scales both with a common factor: after every batch it measures the peak memory
+    (RSS) of the process and the throughput, grows the batches while the peak stays well
+    below the budget and the throughput improves, and shrinks them when the peak gets close
+    to the budget. If a batch fails to allocate memory, `run` halves the batches and the
+    batch is retried, instead of the file failing.
+
+    Parameters
+    ----------
+    memory_budget : float
+        Maximal RSS of the process in GB.
+    token_budget : int, default=16384
+        Initial maximal number of (padded) tokens per batch.
+    batch_size : int, default=256
+        Initial maximal number of texts per batch.
+    min_scale, max_scale : float, default=1/64 and 16
+        Range of the factor applied to the initial token budget and batch size.
+    """
+
+    def __init__(self, memory_budget, token_budget=16384, batch_size=256, min_scale=1/64, max_scale=16):
+        if memory_budget <= 0:
+            raise ValueError(f"Unsupported memory_budget: {memory_budget}. Must be positive (GB)")
+        self.memory_budget = memory_budget * 1024**3
+        self.base_token_budget = token_budget
+        self.base_batch_size = batch_size
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.scale = 1.0
+
+        # Best throughput so far and the scale reaching it, growing stops when larger batches are slower
+        self.best_throughput = 0.0
+        self.best_scale = 1.0
+        self.growing = True
+
+    @property
+    def token_budget(self):
+        return max(1, int(self.base_token_budget * self.scale))
+
+    @property
+    def batch_size(self):
+        return max(1, int(self.base_batch_size * self.scale))
+
+    def run(self, batch_function, size_function=None):
+        """
+        Run one batch, adapting the batch size to its peak memory and throughput.
+
+        Parameters
+        ----------
+        batch_function : callable
+            Called with the controller (to read the current `token_budget` / `batch_size`),
+            runs one batch and returns its result.
+        size_function : callable, optional
+            Called with the result, returns the amount of work done (e.g. number of texts or
+            tokens) to measure the throughput. By default the length of the result.
+
+        Returns
+        -------
+        object
+            Result of `batch_function`.
+        """
+        while True:
+            reset_peak_rss()
+            start_time = time.time()
+            try:
+                result = batch_function(self)
+            except Exception as e:
+                # Back off and retry the batch with half the size on allocation failures
+                if not is_allocation_failure(e) or self.scale <= self.min_scale:
+                    raise
+                self.scale = max(self.min_scale, self.scale / 2)
+                self.growing = False
+                print(f"Allocation failure ({type(e).__name__}), retrying with token budget {self.token_budget} / batch size {self.batch_size}")
+                continue
+            self.update(peak_rss(), (size_function or len)(result), time.time() - start_time)
+            return result
+
+    def update(self, peak, work, seconds):
+        """
+        Adapt the scale of the batches to the peak memory and the throughput of the last batch.
+        """
+        throughput = work / seconds if seconds > 0 else float("inf")
+
+        # Shrink batches close to the memory budget
+        if peak > 0.9 * self.memory_budget:
+            self.scale = max(self.min_scale, self.scale * 0.75)
+            self.growing = False
+            return
+
+        # Grow batches with memory to spare as long as the throughput improves, otherwise return to the best scale
+        if throughput >= self.best_throughput:
+            self.best_throughput = throughput
+            self.best_scale = self.scale
+        elif throughput < 0.95 * self.best_throughput:
+            self.scale = self.best_scale
+            self.growing = False
+            return
+        if self.growing and peak < 0.75 * self.memory_budget:
+            self.scale = min(self.max_scale, self.scale * 1.25)
+
+
+def reset_peak_rss():
+    """
+    Reset the peak RSS of the process (Linux only), so `peak_rss` returns the peak of the next batch.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss():
+    """
+    Return the peak RSS of the process since `reset_peak_rss` in bytes (Linux), the current RSS on
+    other systems (requires psutil).
+    """
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import psutil
+    return psutil.Process().memory_info().rss
+
+
+def is_allocation_failure(error):
+    """
+    Return True for errors raised when memory can't be allocated (CPU, CUDA or ONNX Runtime).
+    """
+    if isinstance(error, MemoryError):
+        return True
+    message = str(error).lower()
+    return isinstance(error, RuntimeError) and any(text in message for text in ("out of memory", "failed to allocate", "can't allocate memory", "cannot allocate memory"))
+
+
+# Controllers of the analysis functions in this process, keeping their state across chunks
+_controllers = {}
+
+
+def batch_controller(name, memory_budget, token_budget=16384, batch_size=256):
+    """
+    Return the controller of analysis function `name` in this process, creating it on first use
+    (or when the memory budget changes).
+    """
+    controller = _controllers.get(name)
+    if controller is None or controller.memory_budget != memory_budget * 1024**3:
+        controller = _controllers[name] = AdaptiveBatchController(memory_budget, token_budget=token_budget, batch_size=batch_size)
+    return controller
@@ -2,16 +2,29 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 from tqdm import tqdm
+from Storage.shard_storage import shard_path, write_shard
+from Storage.EmbeddingStore import EmbeddingStore, segment_sums
+from Storage.AggregateState import AggregateState, shard_fingerprint
 
 
-def AggregateEmbeddings(Review_Type):
+def AggregateEmbeddings(Review_Type, incremental=True):
     """
     Aggregate review-level embeddings into a single average embedding per movie.
 
+    The embedding matrices written by `CalculateEmbeddings` (see `EmbeddingStore`) are
+    memory-mapped and streamed one at a time. As the rows of each file are sorted by movie
+    id, the embeddings of each movie are a contiguous block of the matrix, summed without
+    copying (`segment_sums`), so the embeddings of all reviews are never held in memory
+    at once. The per-movie sums, counts and sums of squares of every file are kept in a
+    state file, so later runs only read new, changed or removed files.
+
     Parameters
     ----------
     Review_Type : str
         Either "Audience" or "Critic".
+    incremental : bool, default=True
+        If True, update the aggregate state of the previous run with the files that changed
+        since (see `AggregateState`). If False, the state is rebuilt from all files.
 
     Returns
     -------
@@ -24,12 +37,12 @@ def AggregateEmbeddings(Review_Type):
     ------------
     - Saves aggregated embeddings to:
       NLP Data/{Review_Type} Embeddings/rt_{review_type}_embeddings_aggregated.parquet
+    - Saves the aggregate state to:
+      NLP Data/{Review_Type} Embeddings/rt_{review_type}_embeddings_state.pkl
     """
 
     VALID_REVIEW_TYPES = {"Audience", "Critic"}
 
-    num_files = {"Audience": 25, "Critic": 20}
-
     # Find Workspace folder for relative paths to input/output folders & files
     PROJECT_ROOT = Path(__file__).resolve().parents[1]
 
@@ -39,22 +52,47 @@ def AggregateEmbeddings(Review_Type):
     
     # Set up paths for reading / writing data
     folder = PROJECT_ROOT / "NLP Data" / f"{Review_Type} Embeddings"
-    output_path = folder / f"rt_{Review_Type.lower()}_embeddings_aggregated.parquet"
+    output_path = shard_path(folder, f"rt_{Review_Type.lower()}_embeddings_aggregated")
+    state_path = folder / f"rt_{Review_Type.lower()}_embeddings_state.pkl"
 
     print("PROJECT_ROOT:", PROJECT_ROOT)
     print("Looking in folder:", folder)
 
-    # Load Data
-    embeddings_data = pd.concat([pd.read_parquet(folder / f"rt_{Review_Type.lower()}_embeddings_{i}.parquet") for i in range(num_files[Review_Type])], ignore_index = True)
-    embeddings_data["embeddings"] = embeddings_data["embeddings"].apply(np.array)
+    # Embedding matrices with id/reviewId index, one per review file
+    store = EmbeddingStore(folder, f"rt_{Review_Type.lower()}_embeddings")
+
+    fingerprints = {store.matrix_path(i).name: shard_fingerprint(store.matrix_path(i), store.index_path(i)) for i in store.shards()}
+
+    # Load aggregate state of the previous run and retract files that no longer exist
+    state = AggregateState.load(state_path) if incremental else AggregateState()
+    for name in state.stale_shards(fingerprints):
+        state.retract(name)
+
+    # Only read new or changed files
+    changed = [i for i in store.shards() if not state.is_current(store.matrix_path(i).name, fingerprints[store.matrix_path(i).name])]
+    print(f"Files to aggregate: {len(changed)}/{len(fingerprints)}")
+
+    # Sum embeddings, their squares and count reviews per movie, one file at a time
+    for i in tqdm(changed, desc="Aggregating Embeddings"):
+        index, matrix = store.read_shard(i)
+        movie_ids, starts = store.movie_slices(index)
+        sums, sumsqs = segment_sums(matrix, starts, squares=True)
+        counts = np.diff(np.r_[starts, len(index)])
+
+        # Replace the file's previous partial aggregates
+        name = store.matrix_path(i).name
+        state.merge(name, fingerprints[name], movie_ids, sums, counts, sumsqs)
+
+    state.save(state_path)
 
-    # Aggregate embeddings with progress tracker
-    tqdm.pandas()
-    AvgEmbeddings = (embeddings_data.groupby("id")["embeddings"].progress_apply(lambda x: np.mean(np.stack(x), axis=0).tolist()).reset_index())
+    # Average embedding per movie
+    movie_ids, embeddings = state.means()
+    AvgEmbeddings = pd.DataFrame({"id": movie_ids,
+                                  "embeddings": embeddings.tolist()})
 
-    print(f"Processed {len(embeddings_data)} reviews across {embeddings_data['id'].nunique()} movies.")
+    print(f"Processed {int(state.counts.sum())} reviews across {len(AvgEmbeddings)} movies.")
 
     # Write to file
-    AvgEmbeddings.to_parquet(output_path)
+    write_shard(AvgEmbeddings, output_path)
 
     return AvgEmbeddings
\ No newline at end of file
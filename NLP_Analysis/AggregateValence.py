@@ -1,23 +1,34 @@
 import pandas as pd
-import numpy as np
 from pathlib import Path
 from tqdm import tqdm
+from Storage.shard_storage import SCHEMAS, check_file_format, shard_path, write_shard
+from Storage.ShardSet import ShardSet
+from Storage.AggregateState import AggregateState, shard_fingerprint
 
 
 
-def AggregateValence(Review_Type):
+def AggregateValence(Review_Type, file_format="parquet", incremental=True):
     """
     Aggregate sentiment valence scores for movie reviews of a given type.
 
     This function loads sentiment analysis outputs for either audience or critic
     reviews, transforms negative sentiment scores into negative values, and 
-    computes the mean valence score per movie (grouped by movie ID). The aggregated
-    results are written to a JSON file and returned as a DataFrame.
+    computes the mean valence score per movie (grouped by movie ID). The input files
+    are streamed one at a time, summing the scores per movie, so the whole dataset is
+    never held in memory. The per-movie sums, counts and sums of squares of every file
+    are kept in a state file, so later runs only read new, changed or removed files.
+    The aggregated results are written to a Parquet (or JSON) file and returned as a
+    DataFrame.
 
     Parameters
     ----------
     Review_Type : str
         The type of reviews to process. Must be either "Audience" or "Critic".
+    file_format : {"parquet", "json"}, default="parquet"
+        Format of the output file. Input files are read in either format.
+    incremental : bool, default=True
+        If True, update the aggregate state of the previous run with the files that changed
+        since (see `AggregateState`). If False, the state is rebuilt from all files.
 
     Returns
     -------
@@ -29,11 +40,12 @@ def AggregateValence(Review_Type):
     Notes
     -----
     - Input data must exist in the following folder structure relative to the project root:
-        NLP Data/{Review_Type} Sentiment Data/rt_{review_type}_reviews_sentiment_{i}.json
+        NLP Data/{Review_Type} Sentiment Data/rt_{review_type}_reviews_sentiment_{i}.parquet (or .json)
     - Output is saved as:
-        NLP Data/{Review_Type} Sentiment Data/rt_{review_type}_valence_aggregated.json
-    - The function assumes a fixed number of files per review type
-      (25 for audience reviews, 20 for critic reviews).
+        NLP Data/{Review_Type} Sentiment Data/rt_{review_type}_valence_aggregated.parquet (or .json)
+    - The aggregate state is saved as:
+        NLP Data/{Review_Type} Sentiment Data/rt_{review_type}_valence_state.pkl
+    - All sentiment files found in the folder are aggregated (see `ShardSet`).
     - Negative sentiment scores are multiplied by -1 before aggregation to ensure
       the valence score correctly reflects sentiment polarity.
 
@@ -42,43 +54,63 @@ def AggregateValence(Review_Type):
     >>> AggregateValence("Audience")
     PROJECT_ROOT: /path/to/project
     Looking in folder: /path/to/project/NLP Data/Audience Sentiment Data
-    Length Valence Data: 120000
     Processed 120000 reviews across 500 movies.
     """
 
     VALID_REVIEW_TYPES = {"Audience", "Critic"}
 
-    num_files = {"Audience": 25, "Critic": 20}
-
     # Find Workspace folder for relative paths to input/output folders & files
     PROJECT_ROOT = Path(__file__).resolve().parents[1]
 
     # Check for valid Review_Type
     if Review_Type not in VALID_REVIEW_TYPES:
         raise ValueError(f"Unsupported Review Type: {Review_Type}. Must be one of {VALID_REVIEW_TYPES}")
+    check_file_format(file_format)
     
     # Set up paths for reading / writing data
     folder = PROJECT_ROOT / "NLP Data" / f"{Review_Type} Sentiment Data"
-    output_path = folder / f"rt_{Review_Type.lower()}_valence_aggregated.json"
+    output_path = shard_path(folder, f"rt_{Review_Type.lower()}_valence_aggregated", file_format=file_format)
+    state_path = folder / f"rt_{Review_Type.lower()}_valence_state.pkl"
 
     print("PROJECT_ROOT:", PROJECT_ROOT)
     print("Looking in folder:", folder)
 
-    # Load Data
-    valence_data = pd.concat([pd.read_json(folder / f"rt_{Review_Type.lower()}_reviews_sentiment_{i}.json") for i in range(num_files[Review_Type])], ignore_index=True)
+    # Discover sentiment files, only the needed columns are read
+    shards = ShardSet(folder, f"rt_{Review_Type.lower()}_reviews_sentiment", columns=["id", "sentiment", "sentimentScore"])
+    fingerprints = {path.name: shard_fingerprint(path) for path in shards.paths}
+
+    # Load aggregate state of the previous run and retract files that no longer exist
+    state = AggregateState.load(state_path) if incremental else AggregateState()
+    for name in state.stale_shards(fingerprints):
+        state.retract(name)
+
+    # Only read new or changed files
+    changed = shards.select(lambda path: not state.is_current(path.name, fingerprints[path.name]))
+    print(f"Files to aggregate: {len(changed)}/{len(shards)}")
+
+    # Sum valence scores, their squares and count reviews per movie, one file at a time
+    for path, valence_data in tqdm(changed.items(), total=len(changed), desc="Aggregating Valence"):
+
+        # Transform negative sentiment scores to negative values
+        valence_data.loc[valence_data["sentiment"] == "Negative", "sentimentScore"] *= -1
+
+        valence_data["squaredScore"] = valence_data["sentimentScore"] ** 2
+        partial = valence_data.groupby("id").agg(sum = ("sentimentScore", "sum"),
+                                                 count = ("sentimentScore", "count"),
+                                                 sumsq = ("squaredScore", "sum"))
 
-    print(f"Length Valence Data: {valence_data.shape[0]}")
+        # Replace the file's previous partial aggregates
+        state.merge(path.name, fingerprints[path.name], partial.index.to_numpy(), partial["sum"].to_numpy(), partial["count"].to_numpy(), partial["sumsq"].to_numpy())
 
-    # Transform negative sentiment scores to negative values
-    valence_data.loc[valence_data["sentiment"] == "Negative", "sentimentScore"] *= -1
+    state.save(state_path)
 
     # Aggregate Valence on movie id
-    tqdm.pandas()
-    AvgValence = valence_data.groupby("id")["sentimentScore"].progress_apply(np.mean).reset_index(name="AvgValence")
+    movie_ids, valence = state.means()
+    AvgValence = pd.DataFrame({"id": movie_ids, "AvgValence": valence})
 
-    print(f"Processed {len(valence_data)} reviews across {valence_data['id'].nunique()} movies.")
+    print(f"Processed {int(state.counts.sum())} reviews across {len(AvgValence)} movies.")
 
     # Write to file
-    AvgValence.to_json(output_path, date_format="iso", orient="records", indent=2)
+    write_shard(AvgValence, output_path, schema=SCHEMAS["valence_aggregated"])
 
     return AvgValence
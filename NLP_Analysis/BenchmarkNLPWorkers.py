@@ -0,0 +1,127 @@
+from NLP_Analysis.MovieReviewEmotionDetection import MovieReviewEmotionDetection
+from NLP_Analysis.MovieReviewSentimentAnalyser import MovieReviewSentimentAnalyser
+from NLP_Analysis.MovieReviewArgumentDetection import MovieReviewArgumentDetection
+from NLP_Analysis.MovieReviewAspectExtraction import MovieReviewAspectExtraction
+from NLP_Analysis.WorkerPool import WorkerPool
+from NLP_Analysis.onnx_backend import backend_agreement
+import pandas as pd
+import torch
+import time
+from functools import partial
+from pathlib import Path
+from Storage.shard_storage import list_shards, read_shard
+
+
+def BenchmarkNLPWorkers(Review_Type, Analysis_Type, file_number = 0, worker_counts = (1, 2, 4, 8), num_threads = 8, chunk_size = 1000, max_reviews = None, token_budget = 16384, backend = "torch"):
+    """
+    Benchmark multi-process inference (NLPAnalysis with num_workers > 1) against the
+    single-process path on the same shard.
+
+    For every number of workers, the reviews of one preprocessed shard are analysed in chunks
+    of `chunk_size` like in NLPAnalysis (without result cache), with `num_threads` CPU threads
+    in total. One process runs the analysis function directly with `num_threads` intra-op
+    threads, more processes use a `WorkerPool`. Model loading and the start of the workers
+    are done before timing, on a few reviews. The results of each run are compared with the
+    first run (labels and scores may differ slightly, as reviews are batched differently).
+
+    Parameters
+    ----------
+    Review_Type : {"Audience", "Critic"}
+        Type of reviews to analyze.
+    Analysis_Type : {"sentiment", "emotion", "argument", "aspects"}
+        Type of analysis to benchmark.
+    file_number : int, default=0
+        Number of the preprocessed shard to analyse.
+    worker_counts : sequence of int, default=(1, 2, 4, 8)
+        Numbers of processes to benchmark, 1 is the single-process path.
+    num_threads : int, default=8
+        Total number of CPU threads, shared equally by the workers.
+    chunk_size : int, default=1000
+        Number of reviews per chunk.
+    max_reviews : int, optional
+        Only analyse the first `max_reviews` reviews of the shard.
+    token_budget : int, default=16384
+        Maximal number of (padded) tokens per batch of the sentiment, emotion and argument models.
+    backend : {"torch", "onnx"}, default="torch"
+        Inference backend of the sentiment, emotion and argument models.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per number of workers with 'workers', 'threads_per_worker', 'reviews',
+        'seconds', 'reviews_per_second', 'speedup' (relative to the first entry of
+        `worker_counts`), 'label_agreement' and 'max_score_diff' (compared with the first run;
+        for aspect extraction, whether the output is identical).
+    """
+    ANALYSIS_FUNCTIONS = {"sentiment": MovieReviewSentimentAnalyser,
+                          "emotion": MovieReviewEmotionDetection,
+                          "argument": MovieReviewArgumentDetection,
+                          "aspects": MovieReviewAspectExtraction}
+
+    # Analysis types running a Hugging Face pipeline with length-bucketed dynamic batching
+    BATCHED_ANALYSIS_TYPES = {"sentiment", "emotion", "argument"}
+
+    VALID_REVIEW_TYPES = {"Audience", "Critic"}
+
+    # Find Workspace folder for relative paths to input/output folders & files
+    PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+    # Check for valid Review_Type/Analysis_Type argument
+    analysisFunction = ANALYSIS_FUNCTIONS.get(Analysis_Type.lower())
+    if analysisFunction is None:
+        raise ValueError(f"Unsupported Analysis_Type: {Analysis_Type}")
+    if Review_Type not in VALID_REVIEW_TYPES:
+        raise ValueError(f"Unsupported Review Type: {Review_Type}. Must be one of {VALID_REVIEW_TYPES}")
+    kwargs = {"token_budget": token_budget, "backend": backend} if Analysis_Type.lower() in BATCHED_ANALYSIS_TYPES else {}
+
+    # Load reviews of the shard
+    folder = PROJECT_ROOT / "Rotten Tomatoes Reviews" / f"{Review_Type} Reviews Preprocessed for NLP"
+    input_files = list_shards(folder, f"rt_{Review_Type.lower()}_reviews_preprocessed")
+    if file_number >= len(input_files):
+        raise ValueError(f"Unsupported file_number: {file_number}. Found {len(input_files)} files in {folder}")
+    movie_data = read_shard(input_files[file_number], columns=["id", "reviewId", "cleanedReviews"])
+    if max_reviews is not None:
+        movie_data = movie_data.iloc[:max_reviews]
+
+    print(f"[→] Benchmarking {Analysis_Type.capitalize()} analysis on {len(movie_data)} reviews of {input_files[file_number].name} with {num_threads} threads…")
+
+    rows = []
+    reference = None
+    for num_workers in worker_counts:
+        pool = WorkerPool(num_workers, num_threads) if num_workers > 1 else None
+        analyse = partial(pool.analyse, analysisFunction) if pool is not None else analysisFunction
+        torch.set_num_threads(num_threads)
+
+        # Load model(s) and start workers before timing
+        analyse(movie_data.iloc[:num_workers * 8], **kwargs)
+
+        # Analyse the shard in chunks, like NLPAnalysis
+        start_time = time.time()
+        result = pd.concat([analyse(movie_data.iloc[start_idx:start_idx+chunk_size], **kwargs) for start_idx in range(0, len(movie_data), chunk_size)], ignore_index=True)
+        elapsed = time.time() - start_time
+
+        if pool is not None:
+            pool.close()
+
+        # Compare with the first run
+        if reference is None:
+            reference = result
+        if kwargs:
+            agreement = backend_agreement(reference, result)
+        else:
+            same_results = result.astype(str).equals(reference.astype(str))
+            agreement = {"label_agreement": float(same_results), "max_score_diff": 0.0 if same_results else float("nan")}
+
+        rows.append({"workers": num_workers,
+                     "threads_per_worker": pool.threads_per_worker if pool is not None else num_threads,
+                     "reviews": len(movie_data),
+                     "seconds": elapsed,
+                     "reviews_per_second": len(movie_data) / elapsed if elapsed else float("inf")})
+        rows[-1]["speedup"] = rows[0]["seconds"] / elapsed if elapsed else float("inf")
+        rows[-1]["label_agreement"] = agreement["label_agreement"]
+        rows[-1]["max_score_diff"] = agreement["max_score_diff"]
+        print(f"{num_workers} worker(s) x {rows[-1]['threads_per_worker']} threads: {elapsed:.2f} seconds, "
+              f"{rows[-1]['reviews_per_second']:.1f} reviews/s, speedup {rows[-1]['speedup']:.2f}, "
+              f"label agreement {agreement['label_agreement']:.1%}, score difference max {agreement['max_score_diff']:.4f}")
+
+    return pd.DataFrame(rows)
@@ -3,10 +3,12 @@ import numpy as np
 from sentence_transformers import SentenceTransformer
 from pathlib import Path
 import torch
-import re, gc
+import gc
+from Storage.shard_storage import find_shard, list_shards, read_shard
+from Storage.EmbeddingStore import EmbeddingStore
 
 
-def CalculateEmbeddings(Review_Type):
+def CalculateEmbeddings(Review_Type, dtype="float32"):
 
 
     VALID_REVIEW_TYPES = {"Audience", "Critic"}
@@ -27,39 +29,43 @@ def CalculateEmbeddings(Review_Type):
     output_folder = PROJECT_ROOT / "NLP Data" / f"{Review_Type} Embeddings"
     output_folder.mkdir(parents=True, exist_ok=True)
 
+    # Embedding matrices (float32 or float16) with id/reviewId index, one per input file
+    store = EmbeddingStore(output_folder, f"rt_{Review_Type.lower()}_embeddings")
+
     print("PROJECT_ROOT:", PROJECT_ROOT)
     print("Looking in folder:", folder)
-    print("Glob pattern:", f"rt_{Review_Type.lower()}_reviews_preprocessed_*.json")
+    print("Shard pattern:", f"rt_{Review_Type.lower()}_reviews_preprocessed_*")
 
     # List of files to process, sorted to maintain order
-    json_files = sorted(folder.glob(f"rt_{Review_Type.lower()}_reviews_preprocessed_*.json"), key=lambda x: int(re.search(r"_(\d+)\.json$", x.name).group(1)))
+    input_files = list_shards(folder, f"rt_{Review_Type.lower()}_reviews_preprocessed")
 
     # Process files
-    for i, file_path in enumerate(json_files):
-
-        # Skip already processed files
-        output_path = output_folder / f"rt_{Review_Type.lower()}_embeddings_{i}.parquet"
+    for i, file_path in enumerate(input_files):
 
         # Skip already processed files
-        if output_path.exists():
+        if store.has_shard(i):
             print(f"[✓] Skipping File {i} — already completed.")
             continue
 
-        print(f"[→] Processing file {i}/{len(json_files)-1}: {file_path.name}, calculating embeddings…")
+        # Convert embeddings previously stored as lists in a Parquet/JSON file instead of recalculating them
+        legacy_path = find_shard(output_folder, f"rt_{Review_Type.lower()}_embeddings", i)
+        if legacy_path is not None:
+            print(f"[→] Converting file {i}/{len(input_files)-1}: {legacy_path.name} to embedding matrix…")
+            data = read_shard(legacy_path, columns=["id", "reviewId", "embeddings"])
+            store.write_shard(i, data["id"], data["reviewId"], np.stack(data["embeddings"].to_numpy()), dtype=dtype)
+            continue
+
+        print(f"[→] Processing file {i}/{len(input_files)-1}: {file_path.name}, calculating embeddings…")
 
         # Load Data
-        data = pd.read_json(file_path)
+        data = read_shard(file_path, columns=["id", "reviewId", "cleanedReviews"])
         docs = data["cleanedReviews"].to_list()
 
         # Calculate embeddings
         embeddings = embedding_model.encode(docs, batch_size=256, show_progress_bar=True)
 
-        # Store in DataFrame
-        data["embeddings"] = embeddings.tolist()
-        data = data[["id", "reviewId", "embeddings"]]
-
-        # Write to file
-        data.to_parquet(output_path, index=False)
+        # Write embedding matrix and id/reviewId index to file
+        store.write_shard(i, data["id"], data["reviewId"], embeddings, dtype=dtype)
 
         # Clean up
         del embeddings, data, docs
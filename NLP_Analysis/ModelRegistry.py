@@ -0,0 +1,63 @@
+import gc
+import sys
+import threading
+
+
+class ModelRegistry:
+    """
+    Registry of the NLP models, each loaded on first use and cached until released.
+
+    The analysis functions register a loader for their model when they are imported, but
+    the model (Hugging Face pipeline, PyABSA extractor, ...) is only built when it is first
+    requested with `get`. A run of NLPAnalysis therefore only loads the models of the
+    selected Analysis_Type, reuses them for all chunks and files, and can release them
+    afterwards to free their memory. Models are loaded under a lock, so threads requesting
+    the same model at once (e.g. the tokenizer stage of a pipelined run) share one instance.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader):
+        """
+        Register the function `loader` building model `name`, without loading it.
+        """
+        self._loaders[name] = loader
+
+    def get(self, name):
+        """
+        Return model `name`, loading it if it isn't loaded yet.
+        """
+        with self._lock:
+            if name not in self._models:
+                if name not in self._loaders:
+                    raise ValueError(f"Unknown model: {name}. Must be one of {set(self._loaders)}")
+                self._models[name] = self._loaders[name]()
+            return self._models[name]
+
+    def loaded(self):
+        """
+        Return the names of the currently loaded models.
+        """
+        return list(self._models)
+
+    def release(self, name=None):
+        """
+        Release model `name` (all loaded models if None) and free its (GPU) memory.
+        """
+        with self._lock:
+            names = [name] if name is not None else list(self._models)
+            for model_name in names:
+                self._models.pop(model_name, None)
+        gc.collect()
+
+        # Return cached GPU memory (only if torch was already imported by a model)
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+# Models used by the analysis functions, shared by all of them
+model_registry = ModelRegistry()
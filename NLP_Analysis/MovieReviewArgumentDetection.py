@@ -1,31 +1,52 @@
 import pandas as pd
-import torch
-from transformers import pipeline
+from NLP_Analysis.ModelRegistry import model_registry
+from NLP_Analysis.dynamic_batching import classify_batched
+from NLP_Analysis.onnx_backend import load_onnx_classifier
+from NLP_Analysis.hub_revision import resolve_revision
+from NLP_Analysis.AdaptiveBatchController import batch_controller
 
 
 # Specify model
 MODEL = "chkla/roberta-argument"
 
-# Specify pipeline for argument detection
-classifier = pipeline("text-classification", model=MODEL, top_k=None)
+# Model revision (branch, tag or commit hash on Hugging Face), loaded as the commit hash it points to, which is part of the key of cached results (see hub_revision, ResultCache)
+MODEL_REVISION = "main"
 
-# model and pipeline outside function so it only get's loaded once when calling the wrapper function instead of being loaded and created every time a new chunk is processed in the wrapper function
 
+def load_argument_classifier():
+    """
+    Create the pipeline for argument detection.
+    """
+    from transformers import pipeline
+    return pipeline("text-classification", model=MODEL, revision=resolve_revision(MODEL, MODEL_REVISION), top_k=None)
+
+# pipeline is registered instead of created at import, so it only get's loaded when the first chunk is processed and is then reused for every chunk (see ModelRegistry)
+model_registry.register("argument", load_argument_classifier)
+
+# int8-quantized ONNX export of the same model, run with ONNX Runtime (see onnx_backend)
+model_registry.register("argument_onnx", lambda: load_onnx_classifier("text-classification", MODEL, revision=resolve_revision(MODEL, MODEL_REVISION), top_k=None))
 
-def MovieReviewArgumentDetection(Movie_Review_DataFrame):
+
+def MovieReviewArgumentDetection(Movie_Review_DataFrame, token_budget=16384, backend="torch", memory_budget=None):
     """
     Perform Argument Detection on a DataFrame containing Movie Reviews using the 'chkla/roberta-argument' model published on Hugging Face.
     """
 
+    # Get pipeline for argument detection (loaded on first use, PyTorch or ONNX backend)
+    classifier = model_registry.get("argument" if backend == "torch" else f"argument_{backend}")
+
     # Create list containing movie review, serving as input for the analysis pipeline
     review_list = Movie_Review_DataFrame["cleanedReviews"].to_list()
 
-    # Perform Argument Detection, max_length = 256 due to memory bottleneck
-    result = classifier(review_list,
-                        batch_size = 64,
-                        truncation = True,
-                        padding = True,
-                        max_length = 256)
+    # Adapt the token budget to the memory budget (in GB) if given (see AdaptiveBatchController)
+    controller = batch_controller(f"argument_{backend}", memory_budget, token_budget=token_budget) if memory_budget is not None else None
+
+    # Perform Argument Detection, max_length = 256 due to memory bottleneck, reviews of similar length are batched together under a token budget (see dynamic_batching)
+    result = classify_batched(classifier, review_list,
+                              max_length = 256,
+                              token_budget = token_budget,
+                              controller = controller,
+                              top_k = None)
     
     # Store results in DataFrame
     argument_data = pd.DataFrame([{item["label"]: item["score"] for item in res} for res in result])
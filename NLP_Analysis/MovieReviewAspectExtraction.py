@@ -1,29 +1,59 @@
 import pandas as pd
-from pyabsa import AspectTermExtraction as ATE
+from NLP_Analysis.ModelRegistry import model_registry
+from NLP_Analysis.AdaptiveBatchController import batch_controller
 
 
-# Specify Model
-aspect_extractor = ATE.AspectExtractor("english", 
-                                         cal_perplexity = False,
-                                         auto_device = True)
+# Specify PyABSA checkpoint to use
+MODEL = "english"
 
-# model outside function so it only get's loaded once when calling the wrapper function instead of being loaded and created every time a new chunk is processed in the wrapper function
+# PyABSA checkpoints aren't versioned, change when the checkpoint is updated, as it's part of the key of cached results (see ResultCache)
+MODEL_REVISION = "1"
 
 
+def load_aspect_extractor():
+    """
+    Create the PyABSA aspect extractor.
+    """
+    from pyabsa import AspectTermExtraction as ATE
+
+    # Specify Model
+    return ATE.AspectExtractor(MODEL, 
+                               cal_perplexity = False,
+                               auto_device = True)
+
+# model is registered instead of created at import, so it only get's loaded when the first chunk is processed and is then reused for every chunk (see ModelRegistry)
+model_registry.register("aspects", load_aspect_extractor)
 
-def MovieReviewAspectExtraction(Movie_Review_DataFrame):
+
+
+def MovieReviewAspectExtraction(Movie_Review_DataFrame, memory_budget=None):
     """
-    Run Aspect Extraction on Movie Reviews.
+    Run Aspect Extraction on Movie Reviews. With a memory budget (in GB), the reviews are
+    extracted in batches whose size adapts to it (see AdaptiveBatchController).
     """
+    # Get aspect extractor (loaded on first use)
+    aspect_extractor = model_registry.get("aspects")
+
     # Create list containing movie review, serving as input
     review_list = Movie_Review_DataFrame["cleanedReviews"].to_list()
 
     # Perform aspect extraction on a sample sentence
-    result = aspect_extractor.extract_aspect(
-        review_list,
-        save_result=False,
-        print_result=False,
-        batch_size = 512)
+    if memory_budget is None:
+        result = aspect_extractor.extract_aspect(
+            review_list,
+            save_result=False,
+            print_result=False,
+            batch_size = 512)
+    else:
+        # Extract batches of the controller's current batch size, retried with smaller batches on allocation failures
+        controller = batch_controller("aspects", memory_budget, batch_size=512)
+        result = []
+        while len(result) < len(review_list):
+            result += controller.run(lambda current: aspect_extractor.extract_aspect(
+                review_list[len(result):len(result)+current.batch_size],
+                save_result=False,
+                print_result=False,
+                batch_size = current.batch_size))
     
     # Store results in DataFrame
     aspect_data = pd.DataFrame(result)
@@ -1,33 +1,55 @@
 import pandas as pd
-import torch
-from transformers import pipeline
+from NLP_Analysis.ModelRegistry import model_registry
+from NLP_Analysis.dynamic_batching import classify_batched
+from NLP_Analysis.onnx_backend import load_onnx_classifier
+from NLP_Analysis.hub_revision import resolve_revision
+from NLP_Analysis.AdaptiveBatchController import batch_controller
 
 # Load tokenizer and model
 model_name = "borisn70/bert-43-multilabel-emotion-detection"
 
-# Create pipeline
-classifier = pipeline("text-classification", model = model_name, top_k = None, function_to_apply="softmax") #function_to_apply="sigmoid")
+# Model revision (branch, tag or commit hash on Hugging Face), loaded as the commit hash it points to, which is part of the key of cached results (see hub_revision, ResultCache)
+model_revision = "main"
 
-# model and pipeline outside function so it only get's loaded once when calling the wrapper function instead of being loaded and created every time a new chunk is processed in the wrapper function
 
+def load_emotion_classifier():
+    """
+    Create the pipeline for emotion detection.
+    """
+    from transformers import pipeline
+    return pipeline("text-classification", model = model_name, revision = resolve_revision(model_name, model_revision), top_k = None, function_to_apply="softmax") #function_to_apply="sigmoid")
+
+# pipeline is registered instead of created at import, so it only get's loaded when the first chunk is processed and is then reused for every chunk (see ModelRegistry)
+model_registry.register("emotion", load_emotion_classifier)
+
+# int8-quantized ONNX export of the same model, run with ONNX Runtime (see onnx_backend)
+model_registry.register("emotion_onnx", lambda: load_onnx_classifier("text-classification", model_name, revision = resolve_revision(model_name, model_revision), top_k = None, function_to_apply="softmax"))
 
-def MovieReviewEmotionDetection(Movie_Review_DataFrame):
+
+def MovieReviewEmotionDetection(Movie_Review_DataFrame, token_budget=16384, backend="torch", memory_budget=None):
     """
      Perform Emotion Detection on a DataFrame containing Movie Reviews using the 'borisn70/bert-43-multilabel-emotion-detection' model published on hugging face.
     """
+    # Get pipeline for emotion detection (loaded on first use, PyTorch or ONNX backend)
+    classifier = model_registry.get("emotion" if backend == "torch" else f"emotion_{backend}")
+
     # Create list containing the movie reviews, serving as input for the analysis pipeline
     review_list = Movie_Review_DataFrame["cleanedReviews"].tolist()
 
-    # Run Emotion Detection, max_length = 256 due to memory bottleneck
-    predictions = classifier(review_list,
-                             batch_size = 64,
-                             truncation = True,
-                             padding = True,
-                             max_length = 256)
+    # Adapt the token budget to the memory budget (in GB) if given (see AdaptiveBatchController)
+    controller = batch_controller(f"emotion_{backend}", memory_budget, token_budget=token_budget) if memory_budget is not None else None
+
+    # Run Emotion Detection, max_length = 256 due to memory bottleneck, reviews of similar length are batched together under a token budget (see dynamic_batching)
+    predictions = classify_batched(classifier, review_list,
+                                   max_length = 256,
+                                   token_budget = token_budget,
+                                   controller = controller,
+                                   top_k = None,
+                                   function_to_apply = "softmax")
 
     # Create DataFrame containing results
     emotion_data = pd.DataFrame({item["label"]: item["score"] for item in pred} for pred in predictions)
-    emotion_data["reviewId"] = Movie_Review_DataFrame["reviewId"]
+    emotion_data["reviewId"] = Movie_Review_DataFrame["reviewId"].values
 
     # Reordering columns to show "reviewId first"
     cols = ["reviewId"] + [c for c in emotion_data.columns if c != "reviewId"]
@@ -1,36 +1,86 @@
 import pandas as pd
-from transformers import pipeline
+from NLP_Analysis.ModelRegistry import model_registry
+from NLP_Analysis.dynamic_batching import classify_batched
+from NLP_Analysis.onnx_backend import load_onnx_classifier
+from NLP_Analysis.hub_revision import resolve_revision
+from NLP_Analysis.AdaptiveBatchController import batch_controller
+from NLP_Analysis.SentimentCascade import CASCADE_PATH, SentimentCascade
 
 
 # Specify model to use
 MODEL = "srimeenakshiks/aspect-based-sentiment-analyzer-using-bert"
 
-# Specify pipeline for sentiment analysis
-classifier = pipeline("sentiment-analysis", model = MODEL)    
+# Model revision (branch, tag or commit hash on Hugging Face), loaded as the commit hash it points to, which is part of the key of cached results (see hub_revision, ResultCache)
+MODEL_REVISION = "main"
 
-# model and pipeline outside function so it only get's loaded once when calling the wrapper function instead of being loaded and created every time a new chunk is processed in the wrapper function
 
+def load_sentiment_classifier():
+    """
+    Create the pipeline for sentiment analysis.
+    """
+    from transformers import pipeline
+    return pipeline("sentiment-analysis", model = MODEL, revision = resolve_revision(MODEL, MODEL_REVISION))
+
+# pipeline is registered instead of created at import, so it only get's loaded when the first chunk is processed and is then reused for every chunk (see ModelRegistry)
+model_registry.register("sentiment", load_sentiment_classifier)
+
+# int8-quantized ONNX export of the same model, run with ONNX Runtime (see onnx_backend)
+model_registry.register("sentiment_onnx", lambda: load_onnx_classifier("sentiment-analysis", MODEL, revision = resolve_revision(MODEL, MODEL_REVISION)))
 
 
-def MovieReviewSentimentAnalyser(Movie_Review_DataFrame):
+def load_sentiment_cascade():
+    """
+    Load the first stage of the sentiment cascade (see TrainSentimentCascade).
+    """
+    if not CASCADE_PATH.exists():
+        raise ValueError(f"No sentiment cascade found at {CASCADE_PATH}. Run TrainSentimentCascade first")
+    return SentimentCascade.load(CASCADE_PATH)
+
+# cheap first-stage classifier of the cascade, labelling confident reviews (see SentimentCascade)
+model_registry.register("sentiment_cascade", load_sentiment_cascade)
+
+
+def MovieReviewSentimentAnalyser(Movie_Review_DataFrame, token_budget=16384, backend="torch", memory_budget=None, cascade=False):
     """
     Perform Sentiment Analysis on a DataFrame containing Movie Reviews using the 'distilbert/distilbert-base-uncased-finetuned-sst-2-english' model published on Hugging Face.
+    With cascade=True, reviews labelled confidently by the first stage of the sentiment cascade keep its label (marked in the column 'cascade'), only the others are run through the model.
     """
+    # Get pipeline for sentiment analysis (loaded on first use, PyTorch or ONNX backend)
+    classifier = model_registry.get("sentiment" if backend == "torch" else f"sentiment_{backend}")
+
     # Create list containing the movie reviews, serving as input for the analysis pipeline
     review_list = Movie_Review_DataFrame["cleanedReviews"].to_list()
 
-    # Perform sentiment analysis, max_length = 256 due to memory bottleneck
-    result = classifier(review_list,
-                        batch_size = 64,
-                        truncation = True,
-                        padding = True,
-                        max_length = 256)
+    # Label confident reviews with the first stage of the cascade, route the others to the full model
+    if cascade:
+        first_stage = model_registry.get("sentiment_cascade")
+        cascade_labels, cascade_scores = first_stage.predict(review_list)
+        confident = cascade_scores >= first_stage.threshold
+        print(f"Cascade: {(~confident).sum()}/{len(review_list)} reviews ({(~confident).mean() if len(review_list) else 0:.1%}) routed to the full model")
+        review_list = [review for review, is_confident in zip(review_list, confident) if not is_confident]
+
+    # Adapt the token budget to the memory budget (in GB) if given (see AdaptiveBatchController)
+    controller = batch_controller(f"sentiment_{backend}", memory_budget, token_budget=token_budget) if memory_budget is not None else None
+
+    # Perform sentiment analysis, max_length = 256 due to memory bottleneck, reviews of similar length are batched together under a token budget (see dynamic_batching)
+    result = classify_batched(classifier, review_list,
+                              max_length = 256,
+                              token_budget = token_budget,
+                              controller = controller) if review_list else []
     
     # Store results in DataFrame
-    sentiment_data = pd.DataFrame([res for res in result])
+    sentiment_data = pd.DataFrame([res for res in result], columns=["label", "score"])
     sentiment_data.rename(columns={"label": "sentiment", "score": "sentimentScore"}, inplace=True)
     sentiment_data["sentiment"] = sentiment_data["sentiment"].replace(to_replace=["LABEL_1", "LABEL_0"], value=["Positive", "Negative"])
 
+    # Combine labels of the cascade and of the full model (for the routed reviews)
+    if cascade:
+        labels = cascade_labels.astype(object)
+        scores = cascade_scores.astype(float)
+        labels[~confident] = sentiment_data["sentiment"].to_numpy()
+        scores[~confident] = sentiment_data["sentimentScore"].to_numpy(dtype=float)
+        sentiment_data = pd.DataFrame({"sentiment": labels, "sentimentScore": scores, "cascade": confident})
+
     # Add review Id to DataFrame for future merges with movie/review data
     sentiment_data["reviewId"] = Movie_Review_DataFrame["reviewId"].values
 
@@ -1,16 +1,30 @@
-from NLP_Analysis.MovieReviewEmotionDetection import MovieReviewEmotionDetection
-from NLP_Analysis.MovieReviewSentimentAnalyser import MovieReviewSentimentAnalyser
-from NLP_Analysis.MovieReviewArgumentDetection import MovieReviewArgumentDetection
-from NLP_Analysis.MovieReviewAspectExtraction import MovieReviewAspectExtraction
+from NLP_Analysis.MovieReviewEmotionDetection import MovieReviewEmotionDetection, model_name as EMOTION_MODEL, model_revision as EMOTION_MODEL_REVISION
+from NLP_Analysis.MovieReviewSentimentAnalyser import MovieReviewSentimentAnalyser, MODEL as SENTIMENT_MODEL, MODEL_REVISION as SENTIMENT_MODEL_REVISION
+from NLP_Analysis.MovieReviewArgumentDetection import MovieReviewArgumentDetection, MODEL as ARGUMENT_MODEL, MODEL_REVISION as ARGUMENT_MODEL_REVISION
+from NLP_Analysis.MovieReviewAspectExtraction import MovieReviewAspectExtraction, MODEL as ASPECTS_MODEL, MODEL_REVISION as ASPECTS_MODEL_REVISION
+from NLP_Analysis.ModelRegistry import model_registry
+from NLP_Analysis.ResultCache import ResultCache
+from NLP_Analysis.WorkerPool import WorkerPool
+from NLP_Analysis.onnx_backend import BACKENDS, backend_agreement
+from NLP_Analysis.hub_revision import resolve_revision
+from NLP_Analysis.dynamic_batching import pretokenize
+from NLP_Analysis.compact_scores import SCORE_DTYPES, compact_scores
 import pandas as pd
 import numpy as np
 import torch
 import time
-import re, gc
+import gc
+import os
+import json
+import shutil
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from Storage.shard_storage import SCHEMAS, check_file_format, shard_path, find_shard, read_shard, write_shard
+from Storage.ShardSet import ShardSet
 
 
-def NLPAnalysis(Review_Type, Analysis_Type, chunk_size = 1000, num_threads = 8, timing = True):
+def NLPAnalysis(Review_Type, Analysis_Type, chunk_size = 1000, num_threads = 8, num_workers = 1, file_format = "parquet", wide_table = False, score_dtype = "float64", emotion_top_k = None, token_budget = 16384, memory_budget = None, backend = "torch", agreement_sample = 256, sentiment_cascade = False, result_cache = True, pipelined = False, release_model = False, timing = True):
     """
     Perform NLP-based analysis (sentiment, emotion, arguments, or aspects) on 
     Rotten Tomatoes reviews.
@@ -18,14 +32,16 @@ def NLPAnalysis(Review_Type, Analysis_Type, chunk_size = 1000, num_threads = 8,
     This function applies the specified NLP analysis model to either Audience 
     or Critic reviews in parallelized chunks. It supports multiple analysis 
     types (sentiment analysis, emotion detection, argument mining, and aspect-based 
-    sentiment analysis) and saves the processed results to structured JSON files.
+    sentiment analysis) and saves the processed results to Parquet (or JSON) files.
+    Several analysis types can be run in a single pass, reading each file once and
+    feeding each chunk to all selected models.
 
     Parameters
     ----------
     Review_Type : {"Audience", "Critic"}
         Type of reviews to analyze. Must be either "Audience" or "Critic".
-    Analysis_Type : {"sentiment", "emotion", "argument", "aspects", "topics"}
-        The type of analysis to run on the reviews. 
+    Analysis_Type : {"sentiment", "emotion", "argument", "aspects"} or list of these
+        The type(s) of analysis to run on the reviews. 
         - "sentiment" : Predict sentiment polarity (positive/negative/neutral).
         - "emotion" : Detect emotional categories in the text.
         - "argument" : Identify argumentative structures.
@@ -34,29 +50,104 @@ def NLPAnalysis(Review_Type, Analysis_Type, chunk_size = 1000, num_threads = 8,
         Number of reviews to process in memory at once. Helps prevent memory overflow.
     num_threads : int, default=8
         Number of CPU threads to allocate for model execution.
+    num_workers : int, default=1
+        Number of processes running the models. With more than one, each chunk is split
+        between worker processes, each loading the model(s) once and running with
+        `num_threads / num_workers` intra-op threads (see `WorkerPool`). Scales better than
+        threads alone on many-core hosts; use a larger `chunk_size` with many workers.
+    file_format : {"parquet", "json"}, default="parquet"
+        Format of the output files. Input files are read in either format.
+    wide_table : bool, default=False
+        If True, the results of all selected analysis types are written to one table per
+        file (one row per review, columns of later types that already exist are suffixed
+        with the analysis type) in 'NLP Data/{Review_Type} Combined Data'. Otherwise each
+        analysis type is written to its own folder, as when running it alone.
+    score_dtype : {"float64", "float32", "float16"}, default="float64"
+        Type of the label score columns of the emotion and argument outputs. "float32" and
+        "float16" halve / quarter the size of the Parquet columns (see `compact_scores`);
+        staged chunks and cached results keep full precision.
+    emotion_top_k : int, optional
+        If given, the emotion output only keeps the `emotion_top_k` highest scoring emotions
+        of each review, as the list columns 'topLabels' and 'topScores' (ordered by score),
+        instead of one column per emotion (see `compact_scores.expand_top_k` to expand them).
+    token_budget : int, default=16384
+        Maximal number of (padded) tokens per batch of the sentiment, emotion and argument
+        models. Reviews are batched by similar length under this budget (see `dynamic_batching`).
+    memory_budget : float, optional
+        Memory budget (RSS limit) in GB. If given, the token budget of the sentiment, emotion
+        and argument models and the batch size of the aspect extraction adapt to it after
+        every batch (starting from `token_budget` / 512 reviews), growing while memory is
+        left and throughput improves, and batches failing to allocate memory are retried
+        with smaller ones (see `AdaptiveBatchController`). With several workers, the budget
+        is shared equally by them.
+    backend : {"torch", "onnx"}, default="torch"
+        Inference backend of the sentiment, emotion and argument models. "onnx" runs an
+        int8-quantized ONNX export of the models with ONNX Runtime (exported once and cached
+        in the 'ONNX Models' folder, see `onnx_backend`).
+    agreement_sample : int, default=256
+        With the ONNX backend, the first reviews of the first processed chunk (up to this
+        number) are also run with the PyTorch model, and the agreement of labels and scores
+        is printed (with the sentiment cascade, both backends run the full model on them for
+        this check). 0 disables the check. With the sentiment cascade, the same number of reviews
+        labelled by the cascade are also run through the full model, and the agreement is printed.
+    sentiment_cascade : bool, default=False
+        If True, the sentiment of reviews the cheap first stage of the cascade (a linear model
+        over hashed n-grams trained on earlier outputs of the full model, see
+        `TrainSentimentCascade`) labels with high confidence is taken from it, and only the
+        other reviews are run through the full model. The share of routed reviews is printed
+        per chunk, and the column 'cascade' marks the reviews labelled by the first stage.
+    result_cache : bool, default=True
+        If True, the reviews of each chunk are deduplicated by their (whitespace-normalized)
+        text, and only texts without a cached result for the model id and revision (the
+        commit hash a branch like "main" currently points to, see `hub_revision`, and the
+        backend) are run through the model. Results are kept in the SQLite file
+        'NLP Data/nlp_result_cache.sqlite' across files and runs (see `ResultCache`), and
+        the number of duplicates, cache hits and inferred texts is printed per file.
+    pipelined : bool, default=False
+        If True, disk I/O and tokenization overlap with the model forward passes: a reader
+        thread reads the next file while the current one is processed, a tokenizer stage
+        tokenizes the next chunk for the sentiment, emotion and argument models on separate
+        threads (see `dynamic_batching.pretokenize`), and a writer thread concatenates and
+        writes the results of a file while the next one is processed. At most one file
+        and one chunk are prepared ahead, and one file is being written, to cap memory.
+    release_model : bool, default=False
+        If True, the model(s) are released after all files were processed to free their memory.
+        Otherwise it stays loaded for further runs (e.g. the other Review_Type).
     timing : bool, default=True
         If True, prints runtime statistics for each processed chunk and file.
 
     Returns
     -------
     None
-        The function writes processed JSON files to the output folder and 
+        The function writes processed files to the output folder and 
         does not return a value.
 
     Workflow
     --------
     1. Validate input arguments (`Review_Type` and `Analysis_Type`).
-    2. Assign the appropriate NLP analysis function based on `Analysis_Type`.
-    3. Load review data from the `Clean` folder.
+    2. Assign the appropriate NLP analysis function(s) based on `Analysis_Type`.
+    3. Load review data (only the columns used by the models) from the `Preprocessed for NLP` folder,
+       once per file for all analysis types that haven't processed it yet.
     4. Split reviews into chunks of size `chunk_size` for processing.
-    5. Apply the analysis function to each chunk, running on `num_threads` CPU threads.
-    6. Collect and merge chunk results into a single dataset.
-    7. Save the analyzed reviews as JSON in the `NLP Data` folder, maintaining 
+    5. Apply the analysis function(s) to each chunk, running on `num_threads` CPU threads.
+    6. Collect and merge chunk results into a single dataset per analysis type (or one wide table).
+    7. Save the analyzed reviews as Parquet (or JSON) in the `NLP Data` folder, maintaining 
        consistent file numbering.
 
     Notes
     -----
     - Files that have already been processed are skipped automatically.
+    - The result of every chunk is written to a staging folder ('.staging' in the output
+      folder) as soon as it's done, so a rerun after a crash resumes from the first missing
+      chunk. The output file is only merged from the staged chunks (and the staging folder
+      removed, along with folders staged with another `chunk_size`) when all chunks of the
+      file are present. Staged chunks are only reused with the same `chunk_size`, models,
+      model revisions, `backend` and sentiment cascade (recorded in 'params.json' in the
+      staging folder), otherwise they're discarded.
+    - Parquet outputs store every column separately, so a single label of the emotion or
+      argument output is read without the others, e.g. read_shard(path, columns=["reviewId", "joy"]).
+    - Only the models of the selected Analysis_Type(s) are loaded, when the first chunk is
+      processed, and reused for all chunks (see `ModelRegistry`).
     - The function is memory-conscious by chunking and garbage collecting after each file.
     - Output structure depends on the analysis type and model used.
     - The function assumes the following folder structure exists:
@@ -74,50 +165,132 @@ def NLPAnalysis(Review_Type, Analysis_Type, chunk_size = 1000, num_threads = 8,
                           "argument": MovieReviewArgumentDetection,
                           "aspects": MovieReviewAspectExtraction}
     
+    # Model id and revision of each analysis type, key of the cached results
+    MODELS = {"sentiment": (SENTIMENT_MODEL, SENTIMENT_MODEL_REVISION),
+              "emotion": (EMOTION_MODEL, EMOTION_MODEL_REVISION),
+              "argument": (ARGUMENT_MODEL, ARGUMENT_MODEL_REVISION),
+              "aspects": (ASPECTS_MODEL, ASPECTS_MODEL_REVISION)}
+
+    # Analysis types running a Hugging Face pipeline with length-bucketed dynamic batching
+    BATCHED_ANALYSIS_TYPES = {"sentiment", "emotion", "argument"}
+
     VALID_REVIEW_TYPES = {"Audience", "Critic"}
 
     # Find Workspace folder for relative paths to input/output folders & files
     PROJECT_ROOT = Path(__file__).resolve().parents[1]
 
-    # Assign analysis function to use
-    analysisFunction = ANALYSIS_FUNCTIONS.get(Analysis_Type.lower())
+    # Assign analysis function(s) to use
+    analysis_types = [Analysis_Type] if isinstance(Analysis_Type, str) else list(Analysis_Type)
+    analysisFunctions = {analysis_type: ANALYSIS_FUNCTIONS.get(analysis_type.lower()) for analysis_type in analysis_types}
 
     # Check for valid Review_Type/Analysis_Type argument. 
-    if analysisFunction is None:
+    for analysis_type, analysisFunction in analysisFunctions.items():
+        if analysisFunction is None:
+            raise ValueError(f"Unsupported Analysis_Type: {analysis_type}")
+    if not analysisFunctions:
         raise ValueError(f"Unsupported Analysis_Type: {Analysis_Type}")
     
     if Review_Type not in VALID_REVIEW_TYPES:
         raise ValueError(f"Unsupported Review Type: {Review_Type}. Must be one of {VALID_REVIEW_TYPES}")
+    check_file_format(file_format)
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Unsupported backend: {backend}. Must be one of {BACKENDS}")
     
+    if num_workers < 1:
+        raise ValueError(f"Unsupported number of workers: {num_workers}. Must be at least 1")
+
+    if score_dtype not in SCORE_DTYPES:
+        raise ValueError(f"Unsupported score_dtype: {score_dtype}. Must be one of {SCORE_DTYPES}")
+
+    if emotion_top_k is not None and emotion_top_k < 1:
+        raise ValueError(f"Unsupported emotion_top_k: {emotion_top_k}. Must be at least 1")
+
     # Set number of threads when running on CPU
     torch.set_num_threads(num_threads)
     
-    # Set up paths for reading / saving the data
+    # Set up paths for reading / saving the data (output folder and file name stem per analysis type, or of the wide table)
     folder = PROJECT_ROOT / "Rotten Tomatoes Reviews" / f"{Review_Type} Reviews Preprocessed for NLP"
-    output_folder = PROJECT_ROOT / "NLP Data" / f"{Review_Type} {Analysis_Type.capitalize()} Data"
-    output_folder.mkdir(parents=True, exist_ok=True)
+    if wide_table:
+        outputs = {"wide": (PROJECT_ROOT / "NLP Data" / f"{Review_Type} Combined Data",
+                            f"rt_{Review_Type.lower()}_reviews_{'_'.join(analysisFunctions)}")}
+    else:
+        outputs = {analysis_type: (PROJECT_ROOT / "NLP Data" / f"{Review_Type} {analysis_type.capitalize()} Data",
+                                   f"rt_{Review_Type.lower()}_reviews_{analysis_type}") for analysis_type in analysisFunctions}
+    for output_folder, _ in outputs.values():
+        output_folder.mkdir(parents=True, exist_ok=True)
 
     print("PROJECT_ROOT:", PROJECT_ROOT)
     print("Looking in folder:", folder)
-    print("Glob pattern:", f"rt_{Review_Type.lower()}_reviews_preprocessed_*.json")
+    print("Shard pattern:", f"rt_{Review_Type.lower()}_reviews_preprocessed_*")
+
+    # List of files to process, sorted to maintain order (only the columns used by the analysis functions are read)
+    shards = ShardSet(folder, f"rt_{Review_Type.lower()}_reviews_preprocessed", columns=["id", "reviewId", "cleanedReviews"], max_workers=1)
+    input_files = shards.paths
+
+    # Skip already processed files (in any format), per output
+    pending = {}
+    for i, file_path in enumerate(input_files):
+        pending_outputs = [output for output, (output_folder, stem) in outputs.items() if find_shard(output_folder, stem, i) is None]
+        if pending_outputs:
+            pending[file_path] = (i, pending_outputs)
+        else:
+            print(f"[✓] Skipping File {i} — already completed.")
+    shards = shards.select(lambda path: path in pending)
+
+    # Reader stage: read the next file on a thread if pipelined, otherwise when it's processed
+    files = shards.items() if pipelined else ((file_path, read_shard(file_path, columns=shards.columns)) for file_path in shards.paths)
+
+    # Tokenizer stage (tokenizing the next chunk, unless the models run in worker processes) and writer stage (writing the previous file) if pipelined
+    batched_types = [analysis_type for analysis_type in analysisFunctions if analysis_type.lower() in BATCHED_ANALYSIS_TYPES]
+    tokenizer_executor = ThreadPoolExecutor(max_workers=len(batched_types)) if pipelined and batched_types and num_workers == 1 else None
+    writer_executor = ThreadPoolExecutor(max_workers=1) if pipelined else None
+    write_future = None
+
+    # Start worker processes running the models
+    pool = WorkerPool(num_workers, num_threads) if num_workers > 1 else None
+
+    # Analysis types whose backend agreement was already checked
+    agreement_checked = set()
 
-    # List of files to process, sorted to maintain order
-    json_files = sorted(folder.glob(f"rt_{Review_Type.lower()}_reviews_preprocessed_*.json"), key=lambda x: int(re.search(r"_(\d+)\.json$", x.name).group(1)))
+    # Fingerprint of the trained sentiment cascade, if used
+    cascade_fingerprint = model_registry.get("sentiment_cascade").fingerprint if sentiment_cascade and "sentiment" in {analysis_type.lower() for analysis_type in analysisFunctions} else None
+
+    # Model id and effective revision of each analysis type (commit hash of the Hugging Face models, backend and cascade), key of cached and staged results
+    model_keys = {}
+    for analysis_type in analysisFunctions:
+        model, revision = MODELS[analysis_type.lower()]
+        if analysis_type.lower() in BATCHED_ANALYSIS_TYPES:
+            revision = resolve_revision(model, revision)
+        if analysis_type.lower() in BATCHED_ANALYSIS_TYPES and backend != "torch":
+            revision = f"{revision}+{backend}"
+        if cascade_fingerprint is not None and analysis_type.lower() == "sentiment":
+            revision = f"{revision}+cascade-{cascade_fingerprint}"
+        model_keys[analysis_type] = [model, revision]
+
+    # Open cache of inference results, shared by all analysis types and review types
+    cache = ResultCache(PROJECT_ROOT / "NLP Data" / "nlp_result_cache.sqlite") if result_cache else None
 
     # process files using the MultiThreadingNLP and SentimentAnalysis / EmotionDetection Functions
-    for i, file_path in enumerate(json_files):
+    for file_path, movie_data in files:
+        i, pending_outputs = pending[file_path]
 
-        # Initialize variables
-        movie_data = pd.read_json(file_path)
-        chunks = []
-        output_path = output_folder / f"rt_{Review_Type.lower()}_reviews_{Analysis_Type}_{i}.json"
+        # Analysis types still to run on this file
+        file_types = list(analysisFunctions) if wide_table else pending_outputs
 
-        # Skip already processed files
-        if output_path.exists():
-            print(f"[✓] Skipping File {i} — already completed.")
-            continue
+        # Staging folders of the chunk results (per output and chunk size) and staged chunk path of an analysis type
+        staging = {output: outputs[output][0] / ".staging" / f"{outputs[output][1]}_{i}_{chunk_size}" for output in pending_outputs}
+        chunk_path = lambda analysis_type, n: staging["wide" if wide_table else analysis_type] / f"{analysis_type}_{n}.parquet"
+
+        # Discard chunks staged with other models, revisions, backend or cascade
+        for output, staging_folder in staging.items():
+            prepare_staging(staging_folder, {analysis_type: model_keys[analysis_type] for analysis_type in (file_types if wide_table else [output])})
 
-        print(f"[→] Processing file {i}/{len(json_files)-1}: {file_path.name}, doing {Analysis_Type.capitalize()} analysis on {num_threads} threads…")
+        # Initialize variables
+        cache_stats = {analysis_type: {} for analysis_type in file_types}
+        tokenizer_futures = []
+
+        print(f"[→] Processing file {i}/{len(input_files)-1}: {file_path.name}, doing {', '.join(analysis_type.capitalize() for analysis_type in file_types)} analysis on {num_threads} threads…")
         start_time = time.time()
 
         # Calculate number of total chunks to keep track of progress
@@ -132,27 +305,96 @@ def NLPAnalysis(Review_Type, Analysis_Type, chunk_size = 1000, num_threads = 8,
             if subset.empty:
                 continue
 
+            # Skip chunks already staged by a previous run, per analysis type
+            chunk_types = [analysis_type for analysis_type in file_types if not chunk_path(analysis_type, n).exists()]
+            if not chunk_types:
+                print(f"[✓] Skipping Chunk {n+1}/{num_chunks} — already staged.")
+                continue
+
             print(f"Processing Chunk {n+1}/{num_chunks}")
 
-            # Multithreading NLP analysis
-            ret_chunk = analysisFunction(subset)
+            # Tokenize the next chunk for the batched models while this one is processed (after the previous tokenization finished)
+            if tokenizer_executor is not None:
+                for future in tokenizer_futures:
+                    future.result()
+                next_texts = movie_data["cleanedReviews"].iloc[start_idx+chunk_size:start_idx+2*chunk_size].tolist()
+                tokenizer_futures = [tokenizer_executor.submit(lambda key, texts: pretokenize(model_registry.get(key), texts, max_length=256),
+                                                               analysis_type.lower() if backend == "torch" else f"{analysis_type.lower()}_{backend}", next_texts)
+                                     for analysis_type in file_types if analysis_type in batched_types and next_texts]
+
+            # Multithreading NLP analysis, feeding the chunk to every selected model
+            for analysis_type in chunk_types:
+                batched = analysis_type.lower() in BATCHED_ANALYSIS_TYPES
+                kwargs = {"token_budget": token_budget, "backend": backend} if batched else {}
+                if memory_budget is not None:
+                    kwargs["memory_budget"] = memory_budget / num_workers
+                if sentiment_cascade and analysis_type.lower() == "sentiment":
+                    kwargs["cascade"] = True
+                analyse = partial(pool.analyse, analysisFunctions[analysis_type]) if pool is not None else analysisFunctions[analysis_type]
+
+                # Only run texts through the model that have no cached result (the backend is part of the model revision)
+                if cache is not None:
+                    model, revision = model_keys[analysis_type]
+                    ret_chunk = cache.analyse(analyse, subset, model, revision, stats=cache_stats[analysis_type], **kwargs)
+                else:
+                    ret_chunk = analyse(subset, **kwargs)
 
-            # Collect results
-            chunks.append(ret_chunk)
+                # Check agreement of the ONNX backend with the PyTorch model once per analysis type
+                if batched and backend != "torch" and agreement_sample > 0 and analysis_type not in agreement_checked:
+                    sample = subset.iloc[:agreement_sample]
+
+                    # With the sentiment cascade, the chunk's labels partly come from the first stage, so both backends run the full model on the sample
+                    if kwargs.get("cascade"):
+                        backend_result = analysisFunctions[analysis_type](sample, **dict(kwargs, cascade=False))
+                        torch_result = analysisFunctions[analysis_type](sample, **dict(kwargs, backend="torch", cascade=False))
+                    else:
+                        backend_result = ret_chunk.iloc[:agreement_sample]
+                        torch_result = analysisFunctions[analysis_type](sample, **dict(kwargs, backend="torch"))
+                    agreement = backend_agreement(torch_result, backend_result)
+                    print(f"{analysis_type.capitalize()} {backend} vs torch on {agreement['reviews']} reviews: label agreement {agreement['label_agreement']:.1%}, "
+                          f"score difference max {agreement['max_score_diff']:.4f} / mean {agreement['mean_score_diff']:.4f}")
+                    model_registry.release(analysis_type.lower())
+                    agreement_checked.add(analysis_type)
+
+                # Check agreement of the cascade's labels with the full model once
+                if kwargs.get("cascade") and agreement_sample > 0 and "cascade" not in agreement_checked and ret_chunk["cascade"].any():
+                    labelled = ret_chunk["cascade"].to_numpy(dtype=bool)
+                    cascade_result = ret_chunk[labelled].iloc[:agreement_sample]
+                    full_result = analysisFunctions[analysis_type](subset[labelled].iloc[:agreement_sample], **dict(kwargs, cascade=False))
+                    agreement = backend_agreement(full_result, cascade_result)
+                    print(f"Sentiment cascade vs full model on {agreement['reviews']} reviews labelled by the cascade: label agreement {agreement['label_agreement']:.1%}")
+                    agreement_checked.add("cascade")
+
+                # Stage chunk result (atomically)
+                chunk_path(analysis_type, n).parent.mkdir(parents=True, exist_ok=True)
+                write_shard(ret_chunk, chunk_path(analysis_type, n), schema=SCHEMAS.get(analysis_type.lower()))
 
             chunk_end_time = time.time()
             # Display Chunk Runtime
             if timing:
                 print(f"Runtime Chunk {n+1}: {chunk_end_time-chunk_start_time:.2f} seconds")
 
-        # Concat chunk results into batch result
-        result = pd.concat(chunks, ignore_index=True)
+        # Display duplicate texts and cache hits
+        if cache is not None:
+            for analysis_type, stats in cache_stats.items():
+                if stats:
+                    print(f"{analysis_type.capitalize()} cache: {stats['reviews']} reviews, {stats['duplicates']} duplicates, "
+                          f"{stats['cached']} cache hits, {stats['inferred']} inferred ({1 - stats['inferred']/stats['reviews']:.1%} saved)")
+
+        for future in tokenizer_futures:
+            future.result()
 
-        # Write data to file
-        result.to_json(output_path, orient = "records", indent=2)
+        # Merge staged chunk results into the output file(s), on the writer thread if pipelined (after the previous file was written)
+        chunks = {analysis_type: [chunk_path(analysis_type, n) for n in range(num_chunks)] for analysis_type in file_types}
+        if writer_executor is not None:
+            if write_future is not None:
+                write_future.result()
+            write_future = writer_executor.submit(write_results, chunks, outputs, i, file_format, wide_table, staging, score_dtype, emotion_top_k)
+        else:
+            write_results(chunks, outputs, i, file_format, wide_table, staging, score_dtype, emotion_top_k)
 
         # Clear variables to free up memory
-        del result, chunks, movie_data
+        del chunks, movie_data
         gc.collect()
 
         end_time = time.time()
@@ -161,5 +403,101 @@ def NLPAnalysis(Review_Type, Analysis_Type, chunk_size = 1000, num_threads = 8,
             elapsed = end_time-start_time
             print(f"[✓] Done! Runtime File {i}: {int(elapsed//60)}:{elapsed%60:05.2f}")
 
+    # Wait for the last file to be written
+    if writer_executor is not None:
+        if write_future is not None:
+            write_future.result()
+        writer_executor.shutdown()
+    if tokenizer_executor is not None:
+        tokenizer_executor.shutdown()
+
+    if cache is not None:
+        cache.close()
+
+    # Stop worker processes, freeing their models
+    if pool is not None:
+        pool.close()
+
+    # Free memory of the model(s)
+    if release_model:
+        for analysis_type in analysisFunctions:
+            model_registry.release(analysis_type.lower())
+            model_registry.release(f"{analysis_type.lower()}_{backend}")
+
     return None
 
+
+def prepare_staging(staging_folder, model_keys):
+    """
+    Create the staging folder of a file, recording the model id and effective revision of
+    each analysis type staged in it ('params.json'). Chunks staged by a previous run with
+    other models, revisions, backend or cascade are discarded, so they're never merged with
+    results of this run.
+    """
+    params_path = staging_folder / "params.json"
+    if staging_folder.exists():
+        try:
+            with open(params_path, "r", encoding="utf-8") as f:
+                params = json.load(f)
+        except (OSError, ValueError):
+            params = None
+        if params == model_keys:
+            return
+        print(f"[→] Discarding staged chunks in {staging_folder.name} — staged with other models or settings.")
+        shutil.rmtree(staging_folder)
+
+    staging_folder.mkdir(parents=True)
+    tmp_path = params_path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(model_keys, f, indent=2)
+    os.replace(tmp_path, params_path)
+
+
+def write_results(chunks, outputs, i, file_format, wide_table=False, staging=None, score_dtype="float64", emotion_top_k=None):
+    """
+    Concatenate the staged chunk results of file `i` per analysis type and write them to the
+    output file(s), one per analysis type or one wide table. The scores of the emotion and
+    argument results are compacted (see `compact_scores`) if `score_dtype` isn't "float64" or
+    `emotion_top_k` is given. The staging folders of file `i` (of any chunk size) are removed once
+    the output file(s) are written.
+    """
+    results = {analysis_type: pd.concat([read_shard(path) for path in chunk_paths], ignore_index=True) for analysis_type, chunk_paths in chunks.items()}
+
+    # Compact the label scores of the emotion and argument results
+    for analysis_type, result in results.items():
+        top_k = emotion_top_k if analysis_type.lower() == "emotion" else None
+        if analysis_type.lower() in {"emotion", "argument"} and (score_dtype != "float64" or top_k is not None):
+            results[analysis_type] = compact_scores(result, score_dtype, top_k)
+
+    if wide_table:
+        output_folder, stem = outputs["wide"]
+        write_shard(widen_results(results), shard_path(output_folder, stem, i, file_format))
+    else:
+        for analysis_type, result in results.items():
+            output_folder, stem = outputs[analysis_type]
+            write_shard(result, shard_path(output_folder, stem, i, file_format), schema=SCHEMAS.get(analysis_type.lower()))
+
+    # Remove staged chunks of the written file(s), including those left by runs with another chunk_size
+    for output in (staging or {}):
+        output_folder, stem = outputs[output]
+        for staging_folder in (output_folder / ".staging").glob(f"{stem}_{i}_*"):
+            shutil.rmtree(staging_folder, ignore_errors=True)
+
+
+def widen_results(results):
+    """
+    Combine the results of several analysis types on the same reviews into one table.
+
+    All results have one row per review in the same order, starting with 'reviewId'.
+    Columns of later analysis types that already exist (e.g. 'sentiment' of the aspect
+    extraction) are suffixed with the analysis type.
+    """
+    wide = None
+    for analysis_type, result in results.items():
+        if wide is None:
+            wide = result
+            continue
+        result = result.drop(columns="reviewId")
+        result.columns = [f"{column}_{analysis_type.lower()}" if column in wide.columns else column for column in result.columns]
+        wide = pd.concat([wide, result], axis=1)
+    return wide
@@ -0,0 +1,132 @@
+import hashlib
+import pickle
+import sqlite3
+import pandas as pd
+
+
+class ResultCache:
+    """
+    Persistent cache of NLP inference results, keyed by model, model revision and text.
+
+    Results are stored in a SQLite file, one row per (model id, model revision, hash of the
+    whitespace-normalized text), holding the output columns of the analysis function for
+    that text. Identical texts (e.g. "great movie" in audience reviews, syndicated critic
+    quotes) are therefore only run through a model once, within a chunk and across files
+    and runs.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        Path of the SQLite file, created if it doesn't exist.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS results (model TEXT, revision TEXT, text_hash BLOB, result BLOB, PRIMARY KEY (model, revision, text_hash)) WITHOUT ROWID")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS layouts (model TEXT, revision TEXT, columns BLOB, PRIMARY KEY (model, revision))")
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def get(self, model, revision, text_hashes):
+        """
+        Return the cached results of the given text hashes as a dict (hash -> dict of output columns).
+        """
+        results = {}
+        text_hashes = list(text_hashes)
+        # Query in batches to stay below SQLite's limit on the number of parameters
+        for start in range(0, len(text_hashes), 500):
+            batch = text_hashes[start:start+500]
+            rows = self.connection.execute(f"SELECT text_hash, result FROM results WHERE model = ? AND revision = ? AND text_hash IN ({', '.join('?' * len(batch))})",
+                                           [model, revision, *batch])
+            for text_hash, result in rows:
+                results[text_hash] = pickle.loads(result)
+        return results
+
+    def put(self, model, revision, results):
+        """
+        Store results (hash -> dict of output columns).
+        """
+        self.connection.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                                    [(model, revision, text_hash, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)) for text_hash, result in results.items()])
+        self.connection.commit()
+
+    def layout(self, model, revision, columns=None):
+        """
+        Return the column order of the analysis output of a model, storing `columns` if not known yet.
+        """
+        row = self.connection.execute("SELECT columns FROM layouts WHERE model = ? AND revision = ?", (model, revision)).fetchone()
+        if row is not None:
+            return pickle.loads(row[0])
+        if columns is not None:
+            self.connection.execute("INSERT INTO layouts VALUES (?, ?, ?)", (model, revision, pickle.dumps(list(columns))))
+            self.connection.commit()
+        return columns
+
+    def analyse(self, analysisFunction, Movie_Review_DataFrame, model, revision, stats=None, **kwargs):
+        """
+        Run an analysis function on the reviews whose text isn't cached yet, and return the
+        result for all reviews.
+
+        The reviews of the DataFrame are deduplicated by text, the analysis function only
+        processes the first review of each uncached text, and its results are stored and fanned
+        out to all reviews with the same text (with their own 'reviewId' and 'id').
+
+        Parameters
+        ----------
+        analysisFunction : callable
+            Analysis function returning one row per review, with a 'reviewId' column.
+        Movie_Review_DataFrame : pandas.DataFrame
+            Reviews with the columns 'id', 'reviewId' and 'cleanedReviews'.
+        model, revision : str
+            Model id and revision (incl. inference settings changing the results).
+        stats : dict, optional
+            Counters 'reviews', 'duplicates' (texts seen earlier in the chunk), 'cached' and
+            'inferred' (texts run through the model), updated in place.
+        **kwargs
+            Further arguments of the analysis function.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Output of the analysis function for every review, in the order of the input.
+        """
+        text_hashes = Movie_Review_DataFrame["cleanedReviews"].map(text_hash)
+
+        # Deduplicate texts and look up the cache
+        is_first = ~text_hashes.duplicated()
+        cached = self.get(model, revision, text_hashes[is_first])
+        missing = is_first & ~text_hashes.isin(cached.keys())
+
+        # Run the analysis function on the first review of each uncached text only
+        columns = self.layout(model, revision)
+        if missing.any():
+            new_results = analysisFunction(Movie_Review_DataFrame[missing.to_numpy()], **kwargs)
+            columns = self.layout(model, revision, new_results.columns)
+            output_columns = [column for column in new_results.columns if column not in {"reviewId", "id"}]
+            new_rows = dict(zip(text_hashes[missing], new_results[output_columns].to_dict("records")))
+            self.put(model, revision, new_rows)
+            cached.update(new_rows)
+
+        if stats is not None:
+            stats["reviews"] = stats.get("reviews", 0) + len(text_hashes)
+            stats["duplicates"] = stats.get("duplicates", 0) + int((~is_first).sum())
+            stats["cached"] = stats.get("cached", 0) + int((is_first & ~missing).sum())
+            stats["inferred"] = stats.get("inferred", 0) + int(missing.sum())
+
+        # Fan results out to all reviews, with their own ids
+        result = pd.DataFrame([cached[text_hash] for text_hash in text_hashes])
+        result["reviewId"] = Movie_Review_DataFrame["reviewId"].values
+        if "id" in columns:
+            result["id"] = Movie_Review_DataFrame["id"].values
+        return result[[column for column in columns if column in result.columns] + [column for column in result.columns if column not in columns]]
+
+
+def text_hash(text):
+    """
+    Hash of a review text with normalized whitespace (16-byte BLAKE2b digest).
+    """
+    return hashlib.blake2b(" ".join(str(text).split()).encode("utf-8"), digest_size=16).digest()
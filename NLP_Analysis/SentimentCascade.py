@@ -0,0 +1,81 @@
+import hashlib
+import os
+import pickle
+import numpy as np
+from pathlib import Path
+
+# Trained cascade, saved next to the analysis functions
+CASCADE_PATH = Path(__file__).resolve().parent / "sentiment_cascade.pkl"
+
+
+class SentimentCascade:
+    """
+    Cheap first-stage sentiment classifier of a confidence-gated model cascade.
+
+    A logistic regression over hashed word uni- and bigrams (scikit-learn's HashingVectorizer
+    and SGDClassifier), trained on the labels of the full sentiment model (see
+    `TrainSentimentCascade`). Reviews it labels with a confidence of at least `threshold` keep
+    its label, only the others are routed to the full model (see
+    `MovieReviewSentimentAnalyser` with cascade=True).
+
+    Parameters
+    ----------
+    threshold : float, default=0.9
+        Minimal probability of the predicted label for a review to be labelled by the cascade.
+    n_features : int, default=2**20
+        Number of hashed n-gram features.
+    ngram_range : tuple of int, default=(1, 2)
+        Range of n-gram lengths.
+    alpha : float, default=1e-6
+        Regularization strength of the logistic regression.
+    """
+
+    def __init__(self, threshold=0.9, n_features=2**20, ngram_range=(1, 2), alpha=1e-6):
+        from sklearn.feature_extraction.text import HashingVectorizer
+        from sklearn.linear_model import SGDClassifier
+
+        self.threshold = threshold
+        self.vectorizer = HashingVectorizer(n_features=n_features, ngram_range=ngram_range, alternate_sign=False)
+        self.classifier = SGDClassifier(loss="log_loss", alpha=alpha, random_state=0)
+
+    def partial_fit(self, texts, labels, classes):
+        """
+        Train the classifier on a batch of texts and the labels of the full model.
+        """
+        self.classifier.partial_fit(self.vectorizer.transform(texts), labels, classes=classes)
+
+    def predict(self, texts):
+        """
+        Return the predicted labels and their probabilities (numpy arrays).
+        """
+        probabilities = self.classifier.predict_proba(self.vectorizer.transform(texts))
+        best = probabilities.argmax(axis=1)
+        return self.classifier.classes_[best], probabilities[np.arange(len(best)), best]
+
+    @property
+    def fingerprint(self):
+        """
+        Hash of the trained weights and the threshold, part of the key of cached results (see ResultCache).
+        """
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(self.classifier.coef_.tobytes())
+        digest.update(self.classifier.intercept_.tobytes())
+        digest.update(str(self.threshold).encode("utf-8"))
+        return digest.hexdigest()
+
+    def save(self, path):
+        """
+        Save the cascade (pickle), atomically.
+        """
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path):
+        """
+        Load a cascade saved with `save`.
+        """
+        with open(path, "rb") as f:
+            return pickle.load(f)
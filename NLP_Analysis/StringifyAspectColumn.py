@@ -1,28 +1,28 @@
 import pandas as pd
-import re
 from pathlib import Path
+from Storage.shard_storage import SCHEMAS, list_shards, read_shard, write_shard
 
 def StringifyAspectColumn(Review_Type):
     """
-    Convert the 'aspect' column (a list of aspects) in movie review JSON files into a 
+    Convert the 'aspect' column (a list of aspects) in movie review aspect files into a 
     single string column called 'aspectString'. 
     
-    Each JSON file contains movie reviews with an 'aspect' column, where aspects 
+    Each file contains movie reviews with an 'aspect' column, where aspects 
     are stored as a list of strings. This function:
     
-    1. Reads all review JSON files in the appropriate folder 
+    1. Reads all review aspect files (Parquet or JSON) in the appropriate folder 
        (based on the provided Review_Type).
     2. Creates a new column 'aspectString' by joining the list of aspects 
        into a space-separated string.
     3. Normalizes terminology in 'aspectString' by replacing all occurrences 
        of the word "film" with "movie" (case-insensitive, whole-word match).
-    4. Writes the modified DataFrame back to the same JSON file.
+    4. Writes the modified DataFrame back to the same file, in the same format.
 
     Parameters
     ----------
     Review_Type : str
         The type of reviews to process. Must be one of {"Audience", "Critic"}.
-        Determines which folder of JSON files is processed.
+        Determines which folder of aspect files is processed.
 
     Raises
     ------
@@ -33,7 +33,7 @@ def StringifyAspectColumn(Review_Type):
     -----
     - The transformation only affects the new 'aspectString' column.
     - Original 'aspect' lists are preserved in the files.
-    - JSON files are overwritten with the modified data.
+    - Files are overwritten (atomically) with the modified data.
     """
     VALID_REVIEW_TYPES = {"Audience", "Critic"}
 
@@ -49,18 +49,18 @@ def StringifyAspectColumn(Review_Type):
 
     print("PROJECT_ROOT:", PROJECT_ROOT)
     print("Looking in folder:", folder)
-    print("Glob pattern:", f"rt_{Review_Type.lower()}_reviews_aspects_*.json")
+    print("Shard pattern:", f"rt_{Review_Type.lower()}_reviews_aspects_*")
 
     # List of files to process, sorted to maintain order
-    json_files = sorted(folder.glob(f"rt_{Review_Type.lower()}_reviews_aspects_*.json"), key=lambda x: int(re.search(r"_(\d+)\.json$", x.name).group(1)))
+    input_files = list_shards(folder, f"rt_{Review_Type.lower()}_reviews_aspects")
 
-    for i, file_path in enumerate(json_files):
+    for i, file_path in enumerate(input_files):
         # Read Data
-        movie_data = pd.read_json(file_path)
+        movie_data = read_shard(file_path)
 
         # Join Aspects for each Review
         movie_data["aspectString"] = movie_data["aspect"].apply(lambda aspects: " ".join(aspects) if isinstance(aspects, list) else "").str.replace(r"\bfilm\b", "movie", case=False, regex=True)
 
         # Write back to file
-        movie_data.to_json(file_path, date_format="iso", orient="records", indent=2)
+        write_shard(movie_data, file_path, schema=SCHEMAS["aspects"])
         print(f"✅ Processed: {file_path.name}")
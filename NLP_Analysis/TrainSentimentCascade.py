@@ -0,0 +1,123 @@
+import hashlib
+import pandas as pd
+from pathlib import Path
+from Storage.shard_storage import list_shards, read_shard
+from NLP_Analysis.SentimentCascade import CASCADE_PATH, SentimentCascade
+
+
+def TrainSentimentCascade(Review_Types = ("Audience", "Critic"), target_agreement = 0.98, holdout = 0.1, max_holdout = 100000, epochs = 2):
+    """
+    Train the first stage of the sentiment cascade on the outputs of the full sentiment model.
+
+    The cleaned reviews of the preprocessed files are joined with the sentiment labels written
+    by NLPAnalysis, and a `SentimentCascade` (logistic regression over hashed n-grams) is
+    trained on them, streaming one file at a time. Reviews labelled by the cascade itself
+    (marked in the column 'cascade' by runs with sentiment_cascade=True) are left out of
+    training and evaluation, so only labels of the full model are learned. A share of the reviews (chosen by a hash of
+    the reviewId) is held out to measure, for a range of confidence thresholds, the share of
+    reviews routed to the full model and the agreement of the cascade's labels with the full
+    model's. The smallest threshold reaching `target_agreement` is stored with the cascade.
+
+    Parameters
+    ----------
+    Review_Types : sequence of {"Audience", "Critic"}, default=("Audience", "Critic")
+        Types of reviews to train on.
+    target_agreement : float, default=0.98
+        Minimal share of reviews labelled like the full model (reviews routed to the full
+        model always agree) on the held-out reviews.
+    holdout : float, default=0.1
+        Share of reviews held out from training for the evaluation.
+    max_holdout : int, default=100000
+        Maximal number of held-out reviews kept for the evaluation.
+    epochs : int, default=2
+        Number of passes over the training files.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Evaluation on the held-out reviews, one row per threshold with 'threshold',
+        'routed' (share routed to the full model), 'confident_agreement' (agreement on the
+        reviews labelled by the cascade) and 'agreement' (of the whole cascade).
+
+    Notes
+    -----
+    - Input data must exist in the following folder structure relative to the project root:
+        Rotten Tomatoes Reviews/{Review_Type} Reviews Preprocessed for NLP/rt_{review_type}_reviews_preprocessed_{i}.parquet
+        NLP Data/{Review_Type} Sentiment Data/rt_{review_type}_reviews_sentiment_{i}.parquet (or .json)
+    - The cascade is saved as NLP_Analysis/sentiment_cascade.pkl and used by NLPAnalysis
+      with sentiment_cascade=True.
+    """
+    VALID_REVIEW_TYPES = {"Audience", "Critic"}
+
+    # Confidence thresholds evaluated on the held-out reviews
+    THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.97, 0.98, 0.99, 0.995]
+
+    # Find Workspace folder for relative paths to input/output folders & files
+    PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+    for Review_Type in Review_Types:
+        if Review_Type not in VALID_REVIEW_TYPES:
+            raise ValueError(f"Unsupported Review Type: {Review_Type}. Must be one of {VALID_REVIEW_TYPES}")
+
+    # Pairs of preprocessed reviews and sentiment labels of the same file number
+    file_pairs = []
+    for Review_Type in Review_Types:
+        review_files = list_shards(PROJECT_ROOT / "Rotten Tomatoes Reviews" / f"{Review_Type} Reviews Preprocessed for NLP", f"rt_{Review_Type.lower()}_reviews_preprocessed")
+        sentiment_files = list_shards(PROJECT_ROOT / "NLP Data" / f"{Review_Type} Sentiment Data", f"rt_{Review_Type.lower()}_reviews_sentiment")
+        sentiment_files = {int(path.stem.rsplit("_", 1)[1]): path for path in sentiment_files}
+        file_pairs += [(path, sentiment_files[i]) for i, path in enumerate(review_files) if i in sentiment_files]
+    if not file_pairs:
+        raise ValueError(f"No sentiment data found for {', '.join(Review_Types)}. Run NLPAnalysis with Analysis_Type='sentiment' first")
+
+    # Labels of the full model (all of them must be known before training)
+    classes = sorted(set().union(*(read_shard(sentiment_path, columns=["sentiment"])["sentiment"].unique() for _, sentiment_path in file_pairs)))
+
+    cascade = SentimentCascade()
+    holdout_data = []
+    for epoch in range(epochs):
+        for review_path, sentiment_path in file_pairs:
+            print(f"[→] Training on file {review_path.name} (epoch {epoch+1}/{epochs})")
+
+            # Join cleaned reviews with the labels of the full model (dropping reviews labelled by the cascade itself in a run with sentiment_cascade=True)
+            sentiment_data = read_shard(sentiment_path)
+            if "cascade" in sentiment_data.columns:
+                sentiment_data = sentiment_data[~sentiment_data["cascade"].fillna(False).astype(bool).to_numpy()]
+            data = read_shard(review_path, columns=["reviewId", "cleanedReviews"]).merge(sentiment_data[["reviewId", "sentiment"]], on="reviewId")
+
+            # Hold out reviews by a hash of their reviewId, so the split is the same in every epoch
+            is_holdout = data["reviewId"].map(lambda review_id: hashlib.blake2b(str(review_id).encode("utf-8"), digest_size=8).digest()[0] < 256 * holdout)
+            if epoch == 0 and sum(len(part) for part in holdout_data) < max_holdout:
+                holdout_data.append(data[is_holdout.values])
+
+            # Train on shuffled batches of the file
+            train = data[~is_holdout.values].sample(frac=1, random_state=epoch)
+            for start in range(0, len(train), 10000):
+                batch = train.iloc[start:start+10000]
+                cascade.partial_fit(batch["cleanedReviews"].tolist(), batch["sentiment"].to_numpy(), classes=classes)
+
+    # Evaluate the cascade on the held-out reviews for every threshold
+    holdout_data = pd.concat(holdout_data, ignore_index=True).iloc[:max_holdout]
+    labels, confidences = cascade.predict(holdout_data["cleanedReviews"].tolist())
+    correct = labels == holdout_data["sentiment"].to_numpy()
+    rows = []
+    for threshold in THRESHOLDS:
+        confident = confidences >= threshold
+        rows.append({"threshold": threshold,
+                     "routed": float(1 - confident.mean()),
+                     "confident_agreement": float(correct[confident].mean()) if confident.any() else 1.0,
+                     "agreement": float(1 - (confident & ~correct).mean())})
+    report = pd.DataFrame(rows)
+
+    # Use the smallest threshold reaching the target agreement (routing as few reviews as possible)
+    reaching = report[report["agreement"] >= target_agreement]
+    cascade.threshold = float(reaching["threshold"].iloc[0]) if not reaching.empty else float("inf")
+    cascade.save(CASCADE_PATH)
+
+    print(report.to_string(index=False))
+    selected = report[report["threshold"] == cascade.threshold]
+    if selected.empty:
+        print(f"[✓] No threshold reaches an agreement of {target_agreement:.1%}, the cascade routes all reviews to the full model.")
+    else:
+        print(f"[✓] Saved cascade with threshold {cascade.threshold} to {CASCADE_PATH}: {selected['routed'].iloc[0]:.1%} of reviews routed to the full model, "
+              f"agreement {selected['agreement'].iloc[0]:.2%} on {len(holdout_data)} held-out reviews.")
+    return report
@@ -0,0 +1,98 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+
+
+class WorkerPool:
+    """
+    Pool of worker processes running the NLP analysis functions data-parallel.
+
+    Intra-op threading of a single PyTorch model stops scaling after a few threads for
+    batches of short reviews, so on hosts with many cores several processes with a model
+    each are faster. Every worker is started with `num_threads / num_workers` intra-op
+    threads and loads the model of an analysis function once, on its first task (see
+    `ModelRegistry`), then reuses it for all chunks.
+
+    `analyse` splits a chunk of reviews into one part per worker. The parts are put on the
+    pool's shared task queue, picked up by whichever worker is free, and the results
+    (tagged by part, each row keeping its 'reviewId') are reassembled in the original order.
+
+    Workers are started with the "spawn" method (forking a process that already ran torch
+    can deadlock), so scripts using the pool need an `if __name__ == "__main__":` guard.
+    If a worker dies (e.g. killed when running out of memory), `analyse` raises
+    `concurrent.futures.process.BrokenProcessPool` instead of waiting for its task forever,
+    so NLPAnalysis fails and a rerun resumes from the staged chunks.
+
+    Parameters
+    ----------
+    num_workers : int
+        Number of worker processes.
+    num_threads : int, default=8
+        Total number of CPU threads, shared equally by the workers.
+    """
+
+    def __init__(self, num_workers, num_threads=8):
+        if num_workers < 1:
+            raise ValueError(f"Unsupported number of workers: {num_workers}. Must be at least 1")
+        self.num_workers = num_workers
+        self.threads_per_worker = max(1, num_threads // num_workers)
+        self.executor = ProcessPoolExecutor(num_workers, mp_context=multiprocessing.get_context("spawn"), initializer=init_worker, initargs=(self.threads_per_worker,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        Stop the worker processes, freeing the memory of their models.
+        """
+        self.executor.shutdown(wait=True)
+
+    def analyse(self, analysisFunction, Movie_Review_DataFrame, **kwargs):
+        """
+        Run an analysis function on the reviews of a DataFrame in the worker processes.
+
+        Parameters
+        ----------
+        analysisFunction : callable
+            Analysis function (defined at module level, so it can be sent to the workers),
+            returning one row per review.
+        Movie_Review_DataFrame : pandas.DataFrame
+            Reviews with the columns 'id', 'reviewId' and 'cleanedReviews'.
+        **kwargs
+            Further arguments of the analysis function (e.g. token_budget, backend).
+
+        Returns
+        -------
+        pandas.DataFrame
+            Output of the analysis function, in the order of the input.
+        """
+        # Split reviews into one part per worker
+        bounds = np.linspace(0, len(Movie_Review_DataFrame), min(self.num_workers, len(Movie_Review_DataFrame)) + 1).astype(int)
+        tasks = [(n, analysisFunction, Movie_Review_DataFrame.iloc[start:end], kwargs) for n, (start, end) in enumerate(zip(bounds[:-1], bounds[1:]))]
+        if not tasks:
+            return analysisFunction(Movie_Review_DataFrame, **kwargs)
+
+        # Collect the results as workers finish, and restore the original order
+        futures = [self.executor.submit(run_task, task) for task in tasks]
+        results = dict(future.result() for future in as_completed(futures))
+        return pd.concat([results[n] for n in range(len(tasks))], ignore_index=True)
+
+
+def init_worker(num_threads):
+    """
+    Set the number of intra-op threads of a worker process.
+    """
+    import torch
+    torch.set_num_threads(num_threads)
+
+
+def run_task(task):
+    """
+    Run an analysis function on one part of a chunk in a worker process, returning the result tagged by the part number.
+    """
+    n, analysisFunction, Movie_Review_DataFrame, kwargs = task
+    return n, analysisFunction(Movie_Review_DataFrame, **kwargs)
@@ -1,4 +1,11 @@
 from .NLPAnalysis import NLPAnalysis
+from .ModelRegistry import ModelRegistry, model_registry
+from .ResultCache import ResultCache
+from .WorkerPool import WorkerPool
+from .AdaptiveBatchController import AdaptiveBatchController
+from .BenchmarkNLPWorkers import BenchmarkNLPWorkers
+from .SentimentCascade import SentimentCascade
+from .TrainSentimentCascade import TrainSentimentCascade
 from .MovieReviewSentimentAnalyser import MovieReviewSentimentAnalyser
 from .MovieReviewArgumentDetection import MovieReviewArgumentDetection
 from .MovieReviewEmotionDetection import MovieReviewEmotionDetection
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+# Supported types of the score columns of the emotion and argument outputs
+SCORE_DTYPES = {"float64", "float32", "float16"}
+
+
+def compact_scores(result, score_dtype="float32", top_k=None):
+    """
+    Compact the output of the emotion or argument detection (one score column per label).
+
+    The score columns are cast to `score_dtype`, so Parquet stores each label as one column
+    of 4 (float32) or 2 (float16) byte floats, and a single label can be read without the
+    others (`read_shard(path, columns=["reviewId", label])`). With `top_k`, only the `top_k`
+    highest scoring labels of each review are kept, as the list columns 'topLabels' (ordered
+    by score) and 'topScores' (see `expand_top_k` to get one column per label back).
+
+    Parameters
+    ----------
+    result : pandas.DataFrame
+        Output of MovieReviewEmotionDetection or MovieReviewArgumentDetection, 'reviewId'
+        followed by one score column per label.
+    score_dtype : {"float64", "float32", "float16"}, default="float32"
+        Type of the scores.
+    top_k : int, optional
+        Number of labels kept per review. By default all score columns are kept.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Compacted result, keyed by 'reviewId'.
+    """
+    if score_dtype not in SCORE_DTYPES:
+        raise ValueError(f"Unsupported score_dtype: {score_dtype}. Must be one of {SCORE_DTYPES}")
+    if top_k is not None and top_k < 1:
+        raise ValueError(f"Unsupported top_k: {top_k}. Must be at least 1")
+
+    labels = [column for column in result.columns if column != "reviewId"]
+    scores = result[labels].to_numpy(dtype=float)
+
+    if top_k is None:
+        compact = pd.DataFrame(scores.astype(score_dtype), columns=labels, index=result.index)
+        compact.insert(0, "reviewId", result["reviewId"].values)
+        return compact
+
+    # Highest scoring labels of each review, ordered by their full-precision score
+    top = np.argsort(-scores, axis=1, kind="stable")[:, :top_k]
+    label_array = np.array(labels, dtype=object)
+    return pd.DataFrame({"reviewId": result["reviewId"].values,
+                         "topLabels": list(label_array[top]),
+                         "topScores": list(np.take_along_axis(scores, top, axis=1).astype(score_dtype))}, index=result.index)
+
+
+def expand_top_k(data, labels=None):
+    """
+    Expand the top-k representation of `compact_scores` to one score column per label
+    (0 for labels not among the top k of a review).
+
+    Parameters
+    ----------
+    data : pandas.DataFrame
+        Data with the columns 'reviewId', 'topLabels' and 'topScores'.
+    labels : list of str, optional
+        Label columns to create, by default all labels occurring in 'topLabels'.
+
+    Returns
+    -------
+    pandas.DataFrame
+        'reviewId' followed by one score column per label.
+    """
+    if labels is None:
+        labels = sorted(set().union(*map(set, data["topLabels"])))
+    positions = {label: j for j, label in enumerate(labels)}
+
+    scores = np.zeros((len(data), len(labels)), dtype=np.float32)
+    for row, (top_labels, top_scores) in enumerate(zip(data["topLabels"], data["topScores"])):
+        for label, score in zip(top_labels, top_scores):
+            if label in positions:
+                scores[row, positions[label]] = score
+
+    wide = pd.DataFrame(scores, columns=labels, index=data.index)
+    wide.insert(0, "reviewId", data["reviewId"].values)
+    return wide
@@ -0,0 +1,49 @@
+import re
+from functools import lru_cache
+from pathlib import Path
+
+# Full commit hashes are used as they are, branches and tags are resolved
+COMMIT_HASH = re.compile(r"^[0-9a-f]{40}$")
+
+
+@lru_cache(maxsize=None)
+def resolve_revision(model_name, revision="main"):
+    """
+    Resolve a revision of a Hugging Face model (branch, tag or commit hash) to the commit hash
+    it currently points to.
+
+    Branches like "main" move when a model is updated, so they can't identify the weights
+    results were computed with. The analysers load their pipelines with the resolved commit
+    hash, and it's used in the key of cached and staged results (see ResultCache) and in the
+    folder of ONNX exports (see onnx_backend). The hash is looked up on the Hub, or in the
+    local Hugging Face cache when offline, and kept for the lifetime of the process.
+
+    Parameters
+    ----------
+    model_name : str
+        Hugging Face model id.
+    revision : str, default="main"
+        Branch, tag or commit hash.
+
+    Returns
+    -------
+    str
+        Commit hash of the revision.
+    """
+    if COMMIT_HASH.match(revision):
+        return revision
+
+    from huggingface_hub import HfApi
+    from huggingface_hub.constants import HF_HUB_CACHE
+
+    # Ask the Hub for the current commit of the revision
+    try:
+        return HfApi().model_info(model_name, revision=revision).sha
+    except OSError:
+        pass
+
+    # Offline: use the commit the revision pointed to when the model was downloaded (loaded by transformers offline as well)
+    ref_path = Path(HF_HUB_CACHE) / f"models--{model_name.replace('/', '--')}" / "refs" / revision
+    if ref_path.exists():
+        return ref_path.read_text(encoding="utf-8").strip()
+    raise ValueError(f"Can't resolve revision '{revision}' of {model_name}: the Hugging Face Hub can't be reached and the model isn't in the local cache")
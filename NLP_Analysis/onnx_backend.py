@@ -0,0 +1,100 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Exported and quantized models, cached next to the project's code
+ONNX_FOLDER = Path(__file__).resolve().parents[1] / "ONNX Models"
+
+# Supported inference backends of the sentiment, emotion and argument analysers
+BACKENDS = {"torch", "onnx"}
+
+
+def load_onnx_classifier(task, model_name, revision="main", quantization="avx2", **pipeline_kwargs):
+    """
+    Create a text-classification pipeline running an int8-quantized ONNX export of a model.
+
+    On first use the model is exported to ONNX, dynamically quantized to int8 (weights
+    quantized ahead, activations at runtime) and saved with its tokenizer to
+    'ONNX Models/{model_name}/{revision}'. Later calls load the cached export directly. The
+    pipeline runs on ONNX Runtime (CPU) and is used like the PyTorch one.
+
+    Parameters
+    ----------
+    task : str
+        Pipeline task, e.g. "sentiment-analysis" or "text-classification".
+    model_name : str
+        Hugging Face model id.
+    revision : str, default="main"
+        Model revision (branch, tag or commit hash) to export.
+    quantization : str, default="avx2"
+        Instruction set targeted by the quantization, one of the configurations of
+        optimum's `AutoQuantizationConfig` ("avx2", "avx512", "avx512_vnni", "arm64").
+    **pipeline_kwargs
+        Further arguments of the pipeline (e.g. top_k, function_to_apply).
+    """
+    from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer, pipeline
+
+    export_folder = ONNX_FOLDER / model_name.replace("/", "__") / revision / quantization
+    quantized_file = "model_quantized.onnx"
+
+    # Export and quantize the model once, in a temporary folder renamed when complete
+    if not (export_folder / quantized_file).exists():
+        tmp_folder = export_folder.with_name(export_folder.name + ".tmp")
+        shutil.rmtree(tmp_folder, ignore_errors=True)
+
+        model = ORTModelForSequenceClassification.from_pretrained(model_name, revision=revision, export=True)
+        tokenizer = AutoTokenizer.from_pretrained(model_name, revision=revision)
+        model.save_pretrained(tmp_folder)
+        tokenizer.save_pretrained(tmp_folder)
+
+        quantizer = ORTQuantizer.from_pretrained(model)
+        quantization_config = getattr(AutoQuantizationConfig, quantization)(is_static=False, per_channel=False)
+        quantizer.quantize(save_dir=tmp_folder, quantization_config=quantization_config)
+
+        shutil.rmtree(export_folder, ignore_errors=True)
+        export_folder.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_folder, export_folder)
+
+    # Load quantized model with its tokenizer
+    model = ORTModelForSequenceClassification.from_pretrained(export_folder, file_name=quantized_file)
+    tokenizer = AutoTokenizer.from_pretrained(export_folder)
+    return pipeline(task, model=model, tokenizer=tokenizer, **pipeline_kwargs)
+
+
+def backend_agreement(torch_result, onnx_result):
+    """
+    Compare the outputs of an analysis function run with the PyTorch and the ONNX backend.
+
+    Labels are compared on the 'sentiment' column if present (sentiment analysis), otherwise
+    on the highest scoring label column of each review (emotion and argument detection).
+
+    Parameters
+    ----------
+    torch_result, onnx_result : pandas.DataFrame
+        Outputs of the same analysis function on the same reviews, one per backend.
+
+    Returns
+    -------
+    dict
+        'reviews', 'label_agreement' (share of reviews with the same label) and the maximal
+        and mean absolute difference of the scores ('max_score_diff', 'mean_score_diff').
+    """
+    score_columns = [column for column in torch_result.columns
+                     if column not in {"reviewId", "id"} and pd.api.types.is_numeric_dtype(torch_result[column])]
+    torch_scores = torch_result[score_columns].to_numpy(dtype=float)
+    onnx_scores = onnx_result[score_columns].to_numpy(dtype=float)
+
+    if "sentiment" in torch_result.columns:
+        same_label = torch_result["sentiment"].to_numpy() == onnx_result["sentiment"].to_numpy()
+    else:
+        same_label = torch_scores.argmax(axis=1) == onnx_scores.argmax(axis=1)
+
+    score_diff = np.abs(torch_scores - onnx_scores)
+    return {"reviews": len(torch_result),
+            "label_agreement": float(same_label.mean()) if len(same_label) else 1.0,
+            "max_score_diff": float(score_diff.max()) if score_diff.size else 0.0,
+            "mean_score_diff": float(score_diff.mean()) if score_diff.size else 0.0}
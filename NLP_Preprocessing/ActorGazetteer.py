@@ -0,0 +1,110 @@
+import os
+import pickle
+import pandas as pd
+from pathlib import Path
+from NLP_Preprocessing.normalize_text import normalize_texts
+from NLP_Preprocessing.tokenize_text import get_tokenizer
+from NLP_Preprocessing.ActorMatcher import ActorMatcher
+from NLP_Preprocessing.ExactPhraseMatcher import ExactPhraseMatcher
+from NLP_Preprocessing.preprocessing_manifest import file_hash, actor_list_hash
+
+# Actor list next to this module, independent of the current working directory
+ACTOR_LIST_PATH = Path(__file__).resolve().parent / "Actor_List.csv"
+
+# Gazetteers loaded in this process, keyed by actor list file (path, modification time, size), threshold and tokenizer
+_GAZETTEERS = {}
+
+
+class ActorGazetteer:
+    """
+    Actor list with its precompiled matching indexes, built once and reused by all masking calls.
+
+    Holds the normalized actor names, the maximal number of words of a name, the fuzzy
+    `ActorMatcher` and the exact-match `ExactPhraseMatcher` (Aho-Corasick automaton).
+    Building these from the CSV is cached in a binary pickle file next to the actor list,
+    which is only rebuilt when the content of the CSV, the threshold or the tokenizer change.
+
+    Parameters
+    ----------
+    actors : iterable of str
+        Actor names, normalized with `normalize_texts`.
+    threshold : int or float, default=85
+        Minimum fuzz.ratio score for an n-gram to count as an actor name.
+    tokenizer : str, default="fast"
+        Tokenizer backend used to split the names for exact matching, see `get_tokenizer`.
+    """
+
+    def __init__(self, actors, threshold=85, tokenizer="fast"):
+        self.actors = normalize_texts(pd.Series(list(actors), dtype=object)).tolist()
+        self.threshold = threshold
+        self.tokenizer = tokenizer
+        self.hash = actor_list_hash(self.actors)
+
+        # Precompile matchers over all actor names
+        self.matcher = ActorMatcher(self.actors, threshold=threshold)
+        self.exact_matcher = ExactPhraseMatcher(self.actors, tokenize=get_tokenizer(tokenizer))
+        self.max_actor_len = self.matcher.max_words
+
+    @classmethod
+    def from_csv(cls, csv_path=ACTOR_LIST_PATH, threshold=85, tokenizer="fast", cache_path=None):
+        """
+        Load the gazetteer of an actor list CSV, from its binary cache file if still valid.
+
+        The cache file (default: the CSV path with suffix '.gazetteer.pkl') stores the
+        gazetteer together with the hash of the CSV, the threshold and the tokenizer, and
+        is rewritten atomically whenever one of them changed.
+        """
+        csv_path = Path(csv_path)
+        cache_path = Path(cache_path) if cache_path is not None else csv_path.with_suffix(".gazetteer.pkl")
+        key = (file_hash(csv_path), threshold, tokenizer)
+
+        # Reuse cached gazetteer if it was built from the same actor list and parameters
+        if cache_path.exists():
+            with open(cache_path, "rb") as f:
+                cached = pickle.load(f)
+            if cached["key"] == key:
+                return cached["gazetteer"]
+
+        # Build gazetteer and rewrite cache atomically
+        gazetteer = cls(load_actor_list(csv_path), threshold=threshold, tokenizer=tokenizer)
+        tmp_path = cache_path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"key": key, "gazetteer": gazetteer}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+        return gazetteer
+
+
+def load_actor_list(csv_path=ACTOR_LIST_PATH):
+    """
+    Load the normalized actor names from 'NLP_Preprocessing/Actor_List.csv' as a list.
+    """
+    actors = pd.read_csv(csv_path, index_col=0)           # Top 2000 Actors from the top 10000 celebrities database off of kaggle (Celebrity.csv) supplemented with IMDb_top_1000_actors.csv (total of 2515 actors)
+    return actors.iloc[:, 0].tolist()
+
+
+def _gazetteer_key(threshold, tokenizer):
+    stat = ACTOR_LIST_PATH.stat()
+    return (str(ACTOR_LIST_PATH), stat.st_mtime_ns, stat.st_size, threshold, tokenizer)
+
+
+def get_actor_gazetteer(threshold=85, tokenizer="fast"):
+    """
+    Return the gazetteer of the actor list, loading it at most once per process.
+
+    Pool workers reuse the gazetteer of the parent process (see `share_actor_gazetteer`),
+    so masking a work unit doesn't read the actor list or build any index.
+    """
+    key = _gazetteer_key(threshold, tokenizer)
+    if key not in _GAZETTEERS:
+        _GAZETTEERS[key] = ActorGazetteer.from_csv(threshold=threshold, tokenizer=tokenizer)
+    return _GAZETTEERS[key]
+
+
+def share_actor_gazetteer(gazetteer):
+    """
+    Register a gazetteer loaded in the parent process, used as `multiprocessing.Pool` initializer.
+
+    With the 'fork' start method the workers share the parent's gazetteer read-only
+    (copy-on-write) without pickling it, with 'spawn' it is unpickled once per worker.
+    """
+    _GAZETTEERS[_gazetteer_key(gazetteer.threshold, gazetteer.tokenizer)] = gazetteer
@@ -0,0 +1,146 @@
+import math
+import numpy as np
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from rapidfuzz import fuzz, process
+
+
+class ActorMatcher:
+    """
+    Precompiled fuzzy matcher for actor names.
+
+    Answers the same question as `process.extractOne(ngram, actors, scorer=fuzz.ratio)`,
+    i.e. "what is the best fuzz.ratio score of this n-gram against any actor name", but
+    only scores a handful of candidate names per n-gram instead of the whole list.
+
+    Candidates are blocked in two steps, both of which are exact for a given threshold
+    (no name that could reach the threshold is ever discarded):
+
+    1. Length filter: fuzz.ratio = 200 * LCS / (len1 + len2) can only reach the threshold
+       if the lengths of both strings are close enough. Names are kept sorted by length,
+       so the admissible names form a contiguous slice found with a binary search.
+    2. Q-gram count filter: two strings within edit distance k share at least
+       max(len1, len2) - q + 1 - k * q q-grams. The maximal distance k allowed by the
+       threshold is derived from the lengths, and names sharing fewer q-grams (looked up
+       in an inverted index) are discarded.
+
+    The remaining candidates are scored with RapidFuzz as before. Scores of n-grams are
+    memoized, as reviews repeat the same n-grams over and over.
+
+    Parameters
+    ----------
+    actors : iterable of str
+        Normalized actor names (lowercased, punctuation removed).
+    threshold : int or float, default=85
+        Minimum fuzz.ratio score for an n-gram to count as an actor name.
+    q : int, default=2
+        Length of the q-grams used for the count filter. Bigrams give a tighter bound
+        than trigrams at a threshold of 85, as the bound loses q characters per edit.
+    cache_size : int, default=1_000_000
+        Maximum number of memoized n-gram scores before the memo is cleared.
+    """
+
+    def __init__(self, actors, threshold=85, q=2, cache_size=1_000_000):
+        self.threshold = threshold
+        self.q = q
+        self.cache_size = cache_size
+
+        # Sort names by length so the length filter becomes a contiguous slice
+        names = [str(a) for a in actors]
+        order = sorted(range(len(names)), key=lambda k: len(names[k]))
+        self.names = [names[k] for k in order]
+        self._length_list = [len(name) for name in self.names]
+        self.lengths = np.array(self._length_list, dtype=np.int64)
+        self.max_words = max((len(name.split()) for name in self.names), default=0)
+
+        # Inverted index from (tagged) q-grams to the names containing them
+        self._gram_ids = {}
+        postings = defaultdict(list)
+        for idx, name in enumerate(self.names):
+            for gram in self._tagged_grams(name):
+                gram_id = self._gram_ids.setdefault(gram, len(self._gram_ids))
+                postings[gram_id].append(idx)
+        self._postings = [np.array(postings[gram_id], dtype=np.int64) for gram_id in range(len(self._gram_ids))]
+
+        self._memo = {}
+
+    def __getstate__(self):
+        # The memo is a per-process cache, no need to pickle it to pool workers
+        state = self.__dict__.copy()
+        state["_memo"] = {}
+        return state
+
+    def _tagged_grams(self, text):
+        """
+        Split a string into q-grams, tagging repeated q-grams with their occurrence number,
+        so that the overlap of two tagged sets equals the multiset overlap of the q-grams.
+        """
+        seen = defaultdict(int)
+        grams = []
+        for j in range(len(text) - self.q + 1):
+            gram = text[j:j+self.q]
+            grams.append((gram, seen[gram]))
+            seen[gram] += 1
+        return grams
+
+    def candidates(self, ngram):
+        """
+        Return the actor names that can possibly reach the threshold for `ngram`.
+        """
+        length = len(ngram)
+        ratio = self.threshold / 100
+
+        # Length filter, 200 * min(l1, l2) / (l1 + l2) >= threshold
+        # (small slack so floating point rounding never discards a valid name)
+        min_len = math.floor(length * ratio / (2 - ratio) - 1e-9)
+        max_len = math.ceil(length * (2 - ratio) / ratio + 1e-9)
+        start = bisect_left(self._length_list, min_len)
+        end = bisect_right(self._length_list, max_len)
+        if start == end:
+            return []
+
+        # Maximal number of edits still allowed by the threshold for each candidate length
+        candidate_lengths = self.lengths[start:end]
+        max_edits = np.floor((1 - ratio) * (length + candidate_lengths) + 1e-9)
+        required = np.maximum(length, candidate_lengths) - self.q + 1 - self.q * max_edits
+
+        # Count shared q-grams of each name in the length window
+        hits = [self._postings[gram_id] for gram_id in map(self._gram_ids.get, self._tagged_grams(ngram)) if gram_id is not None]
+        if hits:
+            hits = np.concatenate(hits)
+            hits = hits[(hits >= start) & (hits < end)]
+            shared = np.bincount(hits - start, minlength=end-start)
+        else:
+            shared = np.zeros(end-start, dtype=np.int64)
+
+        keep = np.flatnonzero(shared >= required) + start
+        return [self.names[k] for k in keep]
+
+    def best_score(self, ngram):
+        """
+        Return the best fuzz.ratio score of `ngram` against all actor names.
+
+        Scores of names discarded by the blocking filters are below the threshold, so
+        0 is returned whenever no candidate is left.
+        """
+        score = self._memo.get(ngram)
+        if score is None:
+            candidates = self.candidates(ngram)
+            score = process.extractOne(ngram, candidates, scorer=fuzz.ratio)[1] if candidates else 0
+
+            if len(self._memo) >= self.cache_size:
+                self._memo.clear()
+            self._memo[ngram] = score
+        return score
+
+    def is_match(self, ngram):
+        """
+        Return True if `ngram` matches an actor name with a score of at least `threshold`.
+        """
+        return self.best_score(ngram) >= self.threshold
+
+    def best_scores(self, ngrams):
+        """
+        Return the best fuzz.ratio scores of a batch of n-grams as a NumPy array.
+        """
+        return np.array([self.best_score(ngram) for ngram in ngrams], dtype=np.float64)
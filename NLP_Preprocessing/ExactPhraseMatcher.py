@@ -0,0 +1,90 @@
+from collections import deque
+
+
+class ExactPhraseMatcher:
+    """
+    Aho-Corasick automaton over tokenized phrases (e.g. normalized actor names or titles).
+
+    Finds all exact occurrences of the phrases in a tokenized review in a single linear
+    scan over its tokens, regardless of the number of phrases. Used as an exact fast path
+    before fuzzy matching (see `mask_ngrams`).
+
+    Parameters
+    ----------
+    phrases : iterable of str
+        Normalized phrases to search for.
+    tokenize : callable, default=str.split
+        Function splitting a phrase into tokens. Should be the tokenizer used for the
+        reviews, so that phrases and reviews are split the same way.
+    """
+
+    def __init__(self, phrases, tokenize=str.split):
+        # Trie of phrase tokens: transitions, failure links and lengths of phrases ending in each node
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+        for phrase in phrases:
+            words = tokenize(phrase)
+            if not words:
+                continue
+
+            node = 0
+            for word in words:
+                child = self._goto[node].get(word)
+                if child is None:
+                    child = len(self._goto)
+                    self._goto[node][word] = child
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = child
+
+            if len(words) not in self._out[node]:
+                self._out[node].append(len(words))
+
+        # Compute failure links breadth first, inheriting the outputs of the failure node
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for word, child in self._goto[node].items():
+                queue.append(child)
+
+                fail = self._fail[node]
+                while fail and word not in self._goto[fail]:
+                    fail = self._fail[fail]
+
+                self._fail[child] = self._goto[fail].get(word, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, tokens):
+        """
+        Return the leftmost-longest, non-overlapping exact matches in `tokens`.
+
+        Returns
+        -------
+        list of tuple of int
+            (start, end) token positions of the matches, in order.
+        """
+        matches = []
+        node = 0
+
+        # Scan tokens once, collecting every phrase ending at each position
+        for j, token in enumerate(tokens):
+            while node and token not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(token, 0)
+
+            for length in self._out[node]:
+                matches.append((j - length + 1, j + 1))
+
+        # Keep the longest match at the leftmost position, then continue after it
+        matches.sort(key=lambda match: (match[0], -match[1]))
+        selected = []
+        last_end = 0
+        for start, end in matches:
+            if start >= last_end:
+                selected.append((start, end))
+                last_end = end
+
+        return selected
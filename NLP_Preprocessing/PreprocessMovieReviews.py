@@ -1,21 +1,30 @@
 import pandas as pd
-import numpy as np
 from pathlib import Path
 import multiprocessing
 import time
-import re, gc
+import gc
+import threading
+from functools import partial
 from NLP_Preprocessing.ReplaceMovieTitles import ReplaceMovieTitles
 from NLP_Preprocessing.ReplaceActorNames import ReplaceActorNames
+from NLP_Preprocessing.ReplaceMoviesAndActors import ReplaceMoviesAndActors
+from NLP_Preprocessing.ActorGazetteer import get_actor_gazetteer, share_actor_gazetteer
+from NLP_Preprocessing.normalize_text import normalize_texts
+from NLP_Preprocessing.tokenize_text import get_tokenizer
+from NLP_Preprocessing.token_cache import cached_tokenize
+from NLP_Preprocessing.preprocessing_manifest import (file_hash, actor_list_hash, load_manifest, save_manifest, save_actor_list_snapshot,
+                                                      load_actor_list_snapshot, actor_list_delta, affected_reviews)
+from Storage.shard_storage import SCHEMAS, check_file_format, shard_path, list_shards, read_shard, write_shard
 
 
-def PreprocessMovieReviews(Review_Type, To_Replace, num_cores=8, timing=True):
+def PreprocessMovieReviews(Review_Type, To_Replace, num_cores=8, chunk_size=2000, max_files_in_flight=2, exact_match=False, tokenizer="fast", token_cache=False, threshold=85, resume=True, file_format="parquet", timing=True):
     """
     Preprocess movie reviews by masking mentions of movies or actors in the review text.
 
-    This function reads review JSON files (either raw or previously preprocessed), splits 
-    them into subsets for parallel processing, and applies a text replacement function 
+    This function reads review files (either raw or previously preprocessed), splits 
+    them into small work units of whole movies for parallel processing, and applies a text replacement function 
     (e.g., `ReplaceMovieTitles` or `ReplaceActorNames`) to replace movie or actor mentions 
-    with standardized placeholders. The processed reviews are saved back to JSON files, 
+    with standardized placeholders. The processed reviews are saved back to Parquet (or JSON) files, 
     preserving original review indices.
 
     Parameters
@@ -26,36 +35,76 @@ def PreprocessMovieReviews(Review_Type, To_Replace, num_cores=8, timing=True):
         Type of entities to replace in reviews. Currently supports:
         - "movies": replaces movie titles using fuzzy matching.
         - "actors": replaces actor names using fuzzy matching.
+        - "movies+actors": replaces movie titles and actor names in a single pass, 
+          tokenizing each review once and writing each file once. Always reads from the
+          "Clean" folder, the output equals running "movies" and then "actors".
     num_cores : int, optional, default=8
         Number of CPU cores to use for parallel processing.
+    chunk_size : int, optional, default=2000
+        Approximate number of reviews per work unit handed to a worker.
+    max_files_in_flight : int, optional, default=2
+        Maximum number of files held in memory at once. With 2, the next file is read and
+        split while the work units of the current one are still being processed.
+    exact_match : bool or str, optional, default=False
+        If True, exact mentions are replaced with an Aho-Corasick automaton first and only
+        the remaining text is fuzzy matched. If "compare", both paths are run, the fuzzy-only
+        result is written and the number of reviews where both paths differ is reported.
+        The number of replacements made by each path is printed for every file.
+    tokenizer : str, optional, default="fast"
+        Tokenizer backend, "fast" (compiled regex, gives the same tokens as NLTK on
+        normalized text, see `compare_tokenizers`) or "nltk" (`word_tokenize`).
+    token_cache : bool, optional, default=False
+        If True, tokens of the normalized reviews are stored in (and read from) an on-disk
+        cache of Parquet files with an Arrow list column keyed by 'reviewId':
+        "Rotten Tomatoes Reviews/{Review_Type} Reviews Token Cache", one file per input file
+        and tokenizer backend. Repeated masking runs on the same input text (e.g. with a new
+        actor list) then skip tokenization.
+    threshold : int or float, optional, default=85
+        Minimum fuzzy matching score (0-100) for a mention to be replaced.
+    resume : bool, optional, default=True
+        If True, files that are already up to date according to the preprocessing manifest
+        are skipped, so an interrupted run resumes after the last completed file. In
+        "movies+actors" mode, a changed actor list only reprocesses the affected reviews
+        (see `affected_reviews`). If False, all files are processed again.
+    file_format : str, optional, default="parquet"
+        Format of the output files, "parquet" (compressed, with explicit column types) or
+        "json" (records with an indent of 2, as before). Input files are read in either format.
     timing : bool, optional, default=True
-        If True, prints elapsed processing time for each JSON file.
+        If True, prints elapsed processing time for each file (from reading until writing).
 
     Returns
     -------
     None
-        The function writes processed JSON files to disk. Each review will have a new
+        The function writes processed files to disk. Each review will have a new
         column `cleanedReviews` containing the masked text.
 
     Notes
     -----
-    - Input JSON files should be located in:
+    - Input files (Parquet or JSON) should be located in:
         "Rotten Tomatoes Reviews/{Review_Type} Reviews Clean" (or previously preprocessed folder)
       and must contain columns including 'reviewId', 'id', 'title', and either 
       'reviewText' or 'cleanedReviews'.
     - The function automatically creates the output folder:
         "Rotten Tomatoes Reviews/{Review_Type} Reviews Preprocessed for Aspect Extraction"
       if it does not already exist.
-    - Processing is performed in parallel by splitting reviews by movie ID to balance load 
-      across cores.
+    - Processing is performed in parallel by splitting reviews by movie ID into work units of
+      about `chunk_size` reviews, which are streamed to the workers with `imap_unordered`.
+      Work units of consecutive files are queued back to back, so all cores stay busy 
+      across file boundaries and a slow unit only delays its own file.
     - The actual masking is performed by functions mapped in `PROCESSING_FUNCTIONS`:
         - `ReplaceMovieTitles` for movie titles
         - `ReplaceActorNames` for actor names
+        - `ReplaceMoviesAndActors` for both in a single pass
     - Original review indices are preserved when merging the masked reviews back into 
       the original DataFrame.
+    - Each file is written atomically (temporary file, then rename) and recorded in 
+      "preprocessing_manifest.json" in the output folder, with the hashes of its input and
+      output, the masking mode, exact_match, threshold and the hash of the actor list. The
+      actor lists used are stored in the "Actor Lists" subfolder of the output folder.
     """
     PROCESSING_FUNCTIONS = {"movies": ReplaceMovieTitles,
-                            "actors": ReplaceActorNames}
+                            "actors": ReplaceActorNames,
+                            "movies+actors": ReplaceMoviesAndActors}
 
     VALID_REVIEW_TYPES = {"Audience", "Critic"}
 
@@ -65,8 +114,11 @@ def PreprocessMovieReviews(Review_Type, To_Replace, num_cores=8, timing=True):
     # Check for valid Review_Type / To_Replace argument
     if processing_function is None:
         raise ValueError(f"Unsupported To_Replace Value: {To_Replace}.")
+    if exact_match not in (False, True, "compare"):
+        raise ValueError(f"Unsupported exact_match Value: {exact_match}. Must be one of False, True or 'compare'")
     if Review_Type not in VALID_REVIEW_TYPES:
         raise ValueError(f"Unsupported Review_Type: {Review_Type}. Must be one of {VALID_REVIEW_TYPES}")
+    check_file_format(file_format)
     
     # Find Workspace folder for relative paths to input/output folders & files
     PROJECT_ROOT = Path(__file__).resolve().parents[1]
@@ -74,13 +126,18 @@ def PreprocessMovieReviews(Review_Type, To_Replace, num_cores=8, timing=True):
 
     # Set up paths for reading / saving the data
     output_folder = PROJECT_ROOT / "Rotten Tomatoes Reviews" / f"{Review_Type} Reviews Preprocessed for NLP"
+    cache_folder = PROJECT_ROOT / "Rotten Tomatoes Reviews" / f"{Review_Type} Reviews Token Cache"
+
+    # Assign tokenizer backend (raises for unsupported backends before any file is read)
+    tokenize = get_tokenizer(tokenizer)
     
-    if output_folder.exists():
+    # Combined mode masks both entity types at once, so it always starts from the clean reviews
+    if output_folder.exists() and To_Replace.lower() != "movies+actors":
         data_folder = output_folder
         print("Looking in folder:", data_folder)
 
         # List of files to process, sorted to maintain order
-        json_files = sorted(data_folder.glob(f"rt_{Review_Type.lower()}_reviews_preprocessed_*.json"), key=lambda x: int(re.search(r"_(\d+)\.json$", x.name).group(1)))
+        input_files = list_shards(data_folder, f"rt_{Review_Type.lower()}_reviews_preprocessed")
 
     else:
         data_folder = PROJECT_ROOT / "Rotten Tomatoes Reviews" / f"{Review_Type} Reviews Clean"
@@ -88,14 +145,78 @@ def PreprocessMovieReviews(Review_Type, To_Replace, num_cores=8, timing=True):
         output_folder.mkdir(parents=True, exist_ok=True)
 
         # List of files to process, sorted to maintain order
-        json_files = sorted(data_folder.glob(f"rt_{Review_Type.lower()}_reviews_clean_*.json"), key=lambda x: int(re.search(r"_(\d+)\.json$", x.name).group(1)))
+        input_files = list_shards(data_folder, f"rt_{Review_Type.lower()}_reviews_clean")
+
+    # Masking function with its options, applied to each work unit by the pool workers
+    masking_function = partial(processing_function, exact_match=exact_match, tokenizer=tokenizer, threshold=threshold)
+
+    # Load actor gazetteer once, it is shared with the pool workers
+    gazetteer = get_actor_gazetteer(threshold=threshold, tokenizer=tokenizer) if To_Replace.lower() != "movies" else None
+    actors = gazetteer.actors if gazetteer is not None else None
+
+    # Load manifest of completed files and snapshot the actor list used for masking
+    manifest_path = output_folder / "preprocessing_manifest.json"
+    snapshot_folder = output_folder / "Actor Lists"
+    manifest = load_manifest(manifest_path)
+    if actors is not None:
+        save_actor_list_snapshot(actors, snapshot_folder)
+
+    # Parameters the output of a file depends on ("compare" writes the fuzzy-only result)
+    run_parameters = {"mode": To_Replace.lower(),
+                      "exact_match": exact_match is True,
+                      "threshold": threshold,
+                      "actor_list": actor_list_hash(actors) if actors is not None else None}
+
+    # Matchers over added actor names, keyed by the actor list hash of the previous run
+    delta_matchers = {}
+
+    # State of files currently in flight (loaded, but not written yet), keyed by file index
+    files_in_flight = {}
+
+    # Limit the number of files held in memory, reading of the next file overlaps with processing the current one
+    file_slots = threading.Semaphore(max_files_in_flight)
+
+    # Set when the consumer stops (finished or failed), so the task feeder thread doesn't wait for a slot forever
+    stop = threading.Event()
 
-    # Process files in parallel
-    with multiprocessing.Pool(num_cores) as pool:
+    def generate_work_units():
+        """
+        Read files one after another and yield their work units, runs in the pool's task feeder thread.
+        """
+        for i, file_path in enumerate(input_files):
+            output_path = shard_path(output_folder, f"rt_{Review_Type.lower()}_reviews_preprocessed", i, file_format)
+            input_hash = file_hash(file_path)
+            entry = manifest.get(output_path.name) if resume else None
+            added_matcher = None
+
+            # Compare the previous run of this file (if any) with the current one
+            if entry is not None and output_path.exists():
+                output_unchanged = entry["output_hash"] == (input_hash if file_path == output_path else file_hash(output_path))
+                input_unchanged = file_path == output_path or (entry["input_file"] == file_path.name and entry["input_hash"] == input_hash)
+                changed = {key for key, value in run_parameters.items() if entry.get(key) != value}
+
+                if output_unchanged and input_unchanged:
+                    # Skip files already processed with the same parameters
+                    if not changed:
+                        print(f"[✓] Skipping file {i}/{len(input_files)-1}: {file_path.name}. Already up to date.")
+                        continue
+
+                    # Only reprocess affected reviews if nothing but the actor list changed
+                    if changed == {"actor_list"} and run_parameters["mode"] == "movies+actors" and not run_parameters["exact_match"]:
+                        if entry["actor_list"] not in delta_matchers:
+                            old_actors = load_actor_list_snapshot(entry["actor_list"], snapshot_folder)
+                            delta_matchers[entry["actor_list"]] = actor_list_delta(old_actors, actors, threshold) if old_actors is not None else None
+                        added_matcher = delta_matchers[entry["actor_list"]]
+
+            # Wait for a free slot, give up if the consumer stopped (the pool's terminate() joins this thread)
+            while not file_slots.acquire(timeout=0.5):
+                if stop.is_set():
+                    return
+            if stop.is_set():
+                return
 
-        for i, file_path in enumerate(json_files):
             # Load movie review data and initialize variables for processing and saving
-            movie_data = pd.read_json(file_path)
+            movie_data = read_shard(file_path)
             if "cleanedReviews" in movie_data.columns:
                 processing_data = movie_data[["reviewId", "id", "title", "cleanedReviews"]].copy()
                 processing_data.rename(columns={"cleanedReviews": "review"}, inplace=True)
@@ -106,42 +227,144 @@ def PreprocessMovieReviews(Review_Type, To_Replace, num_cores=8, timing=True):
                 raise KeyError(f"No valid review column found in {file_path}. Expected 'reviewText' or 'cleanedReviews'.")
 
             # Track file being processed and the time required for processing
-            print(f"[→] Processing file {i}/{len(json_files)-1}: {file_path.name}. Number of Reviews to Process: {processing_data.shape[0]}")
+            print(f"[→] Processing file {i}/{len(input_files)-1}: {file_path.name}. Number of Reviews to Process: {processing_data.shape[0]}")
             start_time = time.time()
 
-            # Split data for multiprocessing
-            groups = [g for _, g in processing_data.groupby("id")]
-            subsets = [[] for _ in range(num_cores)]
-            sizes = [0] * num_cores
+            # Normalize reviews of the whole file at once, the workers tokenize the normalized text
+            processing_data["normalized"] = normalize_texts(processing_data.pop("review"))
+
+            # Tokenize normalized reviews once, reusing tokens cached with the same tokenizer backend
+            # (in this thread, the pool can't be used from its own task feeder thread)
+            if token_cache:
+                cache_path = cache_folder / f"rt_{Review_Type.lower()}_reviews_tokens_{tokenizer}_{i}.parquet"
+                processing_data["tokens"], num_cached = cached_tokenize(processing_data["reviewId"], processing_data["normalized"], cache_path,
+                                                                        lambda texts: [tokenize(text) for text in texts])
+                processing_data.drop(columns="normalized", inplace=True)
+                print(f"Token cache: {num_cached}/{processing_data.shape[0]} reviews already tokenized")
+
+            # Keep the previous output of unaffected reviews, if the actor list changed
+            if added_matcher is not None:
+                previous_data = read_shard(output_path, columns=["reviewId", "cleanedReviews"])
+                if previous_data["reviewId"].astype(str).tolist() == movie_data["reviewId"].astype(str).tolist():
+                    affected = affected_reviews(previous_data["cleanedReviews"], added_matcher, gazetteer.max_actor_len).to_numpy()
+                    movie_data["cleanedReviews"] = previous_data["cleanedReviews"].to_numpy()
+                    processing_data = processing_data[affected]
+                    print(f"Actor list changed: {processing_data.shape[0]}/{movie_data.shape[0]} reviews affected")
+                del previous_data
+
+            # Split data into work units of whole movies, with about chunk_size reviews each
+            units = split_work_units(processing_data, chunk_size)
+
+            # Register file before its first work unit is handed out
+            files_in_flight[i] = {"movie_data": movie_data,
+                                  "output_path": output_path,
+                                  "entry": {"input_file": file_path.name, "input_hash": input_hash, **run_parameters},
+                                  "pending": len(units),
+                                  "results": [],
+                                  "start_time": start_time}
 
-            for g in groups:
-                idx = np.argmin(sizes)
-                subsets[idx].append(g)
-                sizes[idx] += len(g)
+            for unit in units:
+                yield masking_function, i, unit
 
-            subsets = [pd.concat(subset, ignore_index=False) if subset else pd.DataFrame(columns=processing_data.columns) for subset in subsets]
+            # Files without reviews are written right away
+            if not units:
+                yield None, i, None
 
-            # Call function
-            ret = pool.map(processing_function, subsets)
+    # Process work units of all files in parallel, finished units arrive in any order
+    with multiprocessing.Pool(num_cores, initializer=share_actor_gazetteer if gazetteer is not None else None, initargs=(gazetteer,)) as pool:
 
-            # Concat output from different Workers
-            ret_data = pd.concat(ret)
+        # Stop the task feeder and free its slots however the consumer exits, so a failing worker or write raises instead of hanging
+        try:
+            for i, ret in pool.imap_unordered(mask_work_unit, generate_work_units()):
+                state = files_in_flight[i]
+                if ret is not None:
+                    state["results"].append(ret)
+                state["pending"] -= 1
 
-            # Merge "cleanedReviews" column back into the original DataFrame
-            # Note: indices in processing_data are preserved from movie_data,
-            # so ret_data.index aligns correctly with movie_data.index
-            movie_data.loc[ret_data.index, "cleanedReviews"] = ret_data
+                # Wait for the remaining work units of this file
+                if state["pending"] > 0:
+                    continue
 
-            # Write data to file
-            movie_data.to_json(output_folder / f"rt_{Review_Type.lower()}_reviews_preprocessed_{i}.json", date_format="iso", orient="records", indent=2)
+                movie_data = state["movie_data"]
+                ret = state["results"]
+                start_time = state["start_time"]
 
-            # Clear variables
-            del ret, ret_data, subsets
-            gc.collect()
+                # Sum up replacements made by the exact and fuzzy matching paths of all work units
+                replacements = {}
+                for r in ret:
+                    for key, count in r.attrs.get("replacements", {}).items():
+                        replacements[key] = replacements.get(key, 0) + count
 
-            end_time = time.time()
-            # Display File Time
-            if timing:
-                elapsed = end_time-start_time
-                print(f"[✓] Done! Runtime File {i}: {int(elapsed//60)}:{elapsed%60:05.2f}")
+                # Merge "cleanedReviews" column back into the original DataFrame
+                # Note: indices in processing_data are preserved from movie_data,
+                # so the index of each work unit result aligns correctly with movie_data.index
+                if ret:
+                    ret_data = pd.concat(ret)
+                    movie_data.loc[ret_data.index, "cleanedReviews"] = ret_data
+                    del ret_data
+
+                # Write data to file atomically, so an interrupted write never leaves a partial file
+                output_path = state["output_path"]
+                write_shard(movie_data, output_path, schema=SCHEMAS["reviews"])
+
+                # Record completed file in the manifest, a rerun resumes after it
+                manifest[output_path.name] = {**state["entry"], "output_hash": file_hash(output_path)}
+                save_manifest(manifest, manifest_path)
+
+                # Clear variables and free up a slot for the next file
+                del files_in_flight[i], state, ret, movie_data
+                gc.collect()
+                file_slots.release()
+
+                # Display replacement counts of both matching paths
+                # ('reference': replacements of fuzzy matching only, 'differing': reviews where both paths differ)
+                if exact_match:
+                    print(f"File {i} replacements:", ", ".join(f"{key}: {count}" for key, count in replacements.items()))
+
+                end_time = time.time()
+                # Display File Time
+                if timing:
+                    elapsed = end_time-start_time
+                    print(f"[✓] Done! Runtime File {i}: {int(elapsed//60)}:{elapsed%60:05.2f}")
+        finally:
+            stop.set()
+            for _ in range(max_files_in_flight):
+                file_slots.release()
     return None
+
+
+def split_work_units(processing_data, chunk_size):
+    """
+    Split the reviews of a file into work units of whole movies with about `chunk_size` 
+    reviews each. Movies with more than `chunk_size` reviews are split into several units.
+    """
+    units = []
+    current = []
+    current_size = 0
+
+    for _, group in processing_data.groupby("id", sort=False):
+        # Split very large movies, so a single movie can't stall the file
+        for start in range(0, len(group), chunk_size):
+            part = group.iloc[start:start+chunk_size]
+            current.append(part)
+            current_size += len(part)
+
+            if current_size >= chunk_size:
+                units.append(pd.concat(current, ignore_index=False))
+                current = []
+                current_size = 0
+
+    if current:
+        units.append(pd.concat(current, ignore_index=False))
+
+    return units
+
+
+def mask_work_unit(task):
+    """
+    Apply the masking function to one work unit, returning the index of the file it belongs to.
+    """
+    masking_function, file_index, unit = task
+    if masking_function is None:
+        return file_index, None
+    return file_index, masking_function(unit)
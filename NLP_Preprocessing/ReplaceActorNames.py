@@ -1,14 +1,10 @@
 import pandas as pd
-from rapidfuzz import fuzz, process
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from NLP_Preprocessing.normalize_text import normalize_text
+from NLP_Preprocessing.tokenize_text import get_tokenizer, normalize_reviews, review_tokens
+from NLP_Preprocessing.mask_ngrams import mask_ngrams
+from NLP_Preprocessing.ActorGazetteer import get_actor_gazetteer
 
-stop_words = set(stopwords.words("english"))
-stop_words_lower = {w.lower() for w in stop_words}
 
-
-def ReplaceActorNames(MovieReviewDataFrame):
+def ReplaceActorNames(MovieReviewDataFrame, exact_match=False, tokenizer="fast", threshold=85):
     """
     Mask actor names in movie reviews by replacing them with the placeholder '[actor]'.
 
@@ -24,6 +20,17 @@ def ReplaceActorNames(MovieReviewDataFrame):
         - 'id': Unique identifier for each movie.
         - 'title': Movie title (used for grouping, not for matching).
         - 'reviewText': Text of the review in which actor names should be masked.
+    exact_match : bool or str, default=False
+        If True, exact occurrences of the actor names are replaced first with an Aho-Corasick
+        automaton (`ExactPhraseMatcher`) and only the remaining spans are fuzzy matched.
+        If "compare", both paths are run and the result of fuzzy matching only is returned,
+        so the number of differing reviews can be checked before switching to the fast path.
+    tokenizer : str, default="fast"
+        Tokenizer backend, "fast" (compiled regex, identical tokens on normalized text) or
+        "nltk" (`word_tokenize`). Ignored for reviews passed with a pre-tokenized 'tokens'
+        column (see `cached_tokenize`).
+    threshold : int or float, default=85
+        Minimum fuzzy matching score (0-100) for an n-gram to be replaced.
 
     Returns
     -------
@@ -31,27 +38,41 @@ def ReplaceActorNames(MovieReviewDataFrame):
         A Series indexed by the original review indices, containing the cleaned review 
         text with actor names replaced by '[actor]'.
 
+        The number of replacements made by each path is stored in the Series' attributes
+        under `attrs["replacements"]` (keys 'exact' and 'fuzzy', plus 'reference' and
+        'differing' when comparing).
+
     Notes
     -----
     - Actor names are loaded from 'NLP_Preprocessing/Actor_List.csv'. The CSV should
       contain a single column of normalized actor names (lowercased, punctuation removed).
+      The list and its matchers are loaded once per process (see `ActorGazetteer`).
     - Stopwords (from NLTK's English stopwords list) that occur at the start or end of
       matched names are preserved; only the actor name itself is replaced.
     - Full names are matched using fuzzy matching (RapidFuzz's fuzz.ratio). Only n-grams
       up to the length of the longest actor name are considered.
+    - Matching goes through an `ActorMatcher`, which only scores the few actor names that
+      can reach the threshold for a given n-gram (length and q-gram blocking), giving the
+      same result as scoring the n-gram against the whole actor list.
     - The function iterates over each movie individually for efficiency and maintains 
-      the original review indices in the output.
+      the original review indices in the output. All n-grams of a movie's reviews are
+      scored in one batch (see `mask_ngrams`).
     """
     # Initialize Variables used for finetuning
-    threshold = 85
     len_tolerance = 0
 
-    # Load actor names (already cleaned and lowercased when list was compiled)       
-    actors = pd.read_csv("NLP_Preprocessing/Actor_List.csv", index_col=0)           # Top 2000 Actors from the top 10000 celebrities database off of kaggle (Celebrity.csv) supplemented with IMDb_top_1000_actors.csv (total of 2515 actors)
-    actors = actors.iloc[:, 0].tolist()    
+    # Assign tokenizer backend
+    tokenize = get_tokenizer(tokenizer)
 
-    # Compute max n-gram for fuzzy matching
-    max_actor_len = max(len(a.split()) for a in actors) + len_tolerance
+    # Load actor gazetteer with precompiled matchers over all actor names (once per process)
+    gazetteer = get_actor_gazetteer(threshold=threshold, tokenizer=tokenizer)
+
+    # Actor matcher (candidate blocking index) and exact fast path, tokenized like the reviews
+    matcher = gazetteer.matcher
+    exact_matcher = gazetteer.exact_matcher if exact_match else None
+
+    # Normalize all reviews at once instead of once per movie
+    MovieReviewDataFrame = normalize_reviews(MovieReviewDataFrame)
 
     # Drop duplicate movies to iterate through each movie once
     movies = MovieReviewDataFrame.drop_duplicates("id")[["id", "title"]]
@@ -59,66 +80,39 @@ def ReplaceActorNames(MovieReviewDataFrame):
     # Dictionary to store cleaned reviews keyed by DataFrame index
     cleaned_reviews = {}
 
+    # Number of replacements made by the exact and fuzzy matching paths
+    replacement_stats = {}
+
     # Loop over each unique movie
     for _, row in movies.iterrows():
 
-        # Select reviews corresponding to the current movie
-        reviews = MovieReviewDataFrame.loc[MovieReviewDataFrame["id"] == row["id"], "review"].apply(normalize_text)
-
-        # Loop over each review for the current movie
-        for review_idx, review in reviews.items():
-            # Split review into lowercased words for comparison
-            review_words = word_tokenize(review)
-            cleaned_words = []
-            i = 0
-
-            # Loop through words in review
-            while i < len(review_words):
-                replaced = False
-                    
-                # Check n-grams starting from the largest down to 1
-                for n in range(min(max_actor_len, len(review_words) - i), 0, -1):
-                    ngram_words = review_words[i:i+n]
-                    ngram = " ".join(ngram_words)
-
-                    # Compute fuzzy match score for all actors' full names
-                    _, score, _ = process.extractOne(ngram, actors, scorer=fuzz.ratio)      # fuzz.ratio was found to perform better than fuzz.partial_ratio, cleaning first- and last-names individually was also found to lead to too many false positives
-
-                    # If score exceeds threshold, replace n-gram
-                    if score >= threshold:
-                        start, end = 0, len(ngram_words)
-
-                        # Trim stopwords at the start
-                        leading_stopwords = []
-                        while start < end and ngram_words[start] in stop_words_lower:
-                            leading_stopwords.append(ngram_words[start])
-                            start += 1
-                        
-                        # Trim stopwords at the end
-                        trailing_stopwords = []
-                        while start < end and ngram_words[end-1] in stop_words_lower:
-                            end -= 1
-                            trailing_stopwords.insert(0, ngram_words[end])      # insert at front to preserve order
-                        
-                        # Append in correct order: leading, actor placeholder, trailing
-                        cleaned_words.extend(leading_stopwords)
-                        if start < end:
-                            cleaned_words.append("[actor]")
-                        cleaned_words.extend(trailing_stopwords)
-
-                        # Skip past matched words
-                        i += n
-                        replaced = True
-                        break
-
-                # If no n-gram was replaced, keep current word
-                if not replaced:
-                    cleaned_words.append(review_words[i])
-                    i += 1
-            
-            # Save cleaned review while preserving the original index
+        # Select reviews corresponding to the current movie, split into words
+        review_indices, token_lists = review_tokens(MovieReviewDataFrame, MovieReviewDataFrame["id"] == row["id"], tokenize)
+
+        # Mask matched n-grams
+        masked_reviews = mask_actor_names(token_lists, matcher, exact_matcher=exact_matcher, compare=exact_match == "compare",
+                                          stats=replacement_stats, len_tolerance=len_tolerance)
+
+        # Save cleaned reviews while preserving the original index
+        for review_idx, cleaned_words in zip(review_indices, masked_reviews):
             cleaned_reviews[review_idx] = " ".join(cleaned_words)
     
     # Return a pandas series, mapping review indices to cleaned review text
-    return pd.Series(cleaned_reviews)
+    cleaned_reviews = pd.Series(cleaned_reviews)
+    cleaned_reviews.attrs["replacements"] = replacement_stats
+    return cleaned_reviews
+
+
+def mask_actor_names(token_lists, matcher, exact_matcher=None, compare=False, stats=None, len_tolerance=0):
+    """
+    Mask actor names in tokenized reviews using a precompiled `ActorMatcher`.
+
+    Token-level part of `ReplaceActorNames`, also used by `ReplaceMoviesAndActors`.
+    Returns the masked token lists, see `mask_ngrams`.
+    """
+    # Compute max n-gram for fuzzy matching
+    max_actor_len = matcher.max_words + len_tolerance
 
+    # fuzz.ratio was found to perform better than fuzz.partial_ratio, cleaning first- and last-names individually was also found to lead to too many false positives
+    return mask_ngrams(token_lists, max_actor_len, matcher.best_scores, matcher.threshold, "[actor]",
+                       exact_matcher=exact_matcher, compare=compare, stats=stats)
@@ -1,16 +1,14 @@
 import pandas as pd
+import numpy as np
 from NLP_Preprocessing.normalize_text import normalize_text
-from rapidfuzz import fuzz
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
+from NLP_Preprocessing.mask_ngrams import mask_ngrams
+from NLP_Preprocessing.ExactPhraseMatcher import ExactPhraseMatcher
+from NLP_Preprocessing.tokenize_text import get_tokenizer, normalize_reviews, review_tokens
+from rapidfuzz import fuzz, process
 
 
-stop_words = set(stopwords.words("english"))
-stop_words_lower = {w.lower() for w in stop_words}
 
-
-
-def ReplaceMovieTitles(MovieReviewDataFrame):
+def ReplaceMovieTitles(MovieReviewDataFrame, exact_match=False, tokenizer="fast", threshold=85):
 
     """
     Mask mentions of movie titles in reviews by replacing them with a placeholder '[movie]'.
@@ -28,6 +26,17 @@ def ReplaceMovieTitles(MovieReviewDataFrame):
         - 'id': Unique identifier for each movie.
         - 'title': Movie title (used for matching in reviews).
         - 'review' or 'reviewText': The review text in which movie titles will be masked.
+    exact_match : bool or str, default=False
+        If True, exact occurrences of the movie title are replaced first with an Aho-Corasick
+        automaton (`ExactPhraseMatcher`) and only the remaining spans are fuzzy matched.
+        If "compare", both paths are run and the result of fuzzy matching only is returned,
+        so the number of differing reviews can be checked before switching to the fast path.
+    tokenizer : str, default="fast"
+        Tokenizer backend, "fast" (compiled regex, identical tokens on normalized text) or
+        "nltk" (`word_tokenize`). Ignored for reviews passed with a pre-tokenized 'tokens'
+        column (see `cached_tokenize`).
+    threshold : int or float, default=85
+        Minimum fuzzy matching score (0-100) for an n-gram to be replaced.
 
     Returns
     -------
@@ -35,6 +44,10 @@ def ReplaceMovieTitles(MovieReviewDataFrame):
         A Series indexed by the original review indices, containing the cleaned review
         text with movie titles replaced by '[movie]'.
 
+        The number of replacements made by each path is stored in the Series' attributes
+        under `attrs["replacements"]` (keys 'exact' and 'fuzzy', plus 'reference' and
+        'differing' when comparing).
+
     Notes
     -----
     - Review text and movie titles are normalized (lowercased, punctuation removed) 
@@ -44,87 +57,69 @@ def ReplaceMovieTitles(MovieReviewDataFrame):
     - Stopwords (from NLTK's English stopwords list) at the start or end of matched 
       movie titles are preserved.
     - Processes each movie separately for efficiency and maintains the original review 
-      indices in the output.
+      indices in the output. All n-grams of a movie's reviews are scored against the title
+      in one batched `process.cdist` call (see `mask_ngrams`).
     - Progress for the outer loop over movies can be displayed using tqdm if desired.
     """
 
     # Initialize variables used for finetuning
-    threshold = 85
     len_tolerance = 0
 
+    # Assign tokenizer backend
+    tokenize = get_tokenizer(tokenizer)
+
+    # Normalize all reviews at once instead of once per movie
+    MovieReviewDataFrame = normalize_reviews(MovieReviewDataFrame)
+
     # Drop duplicate movies to iterate through each movie once
     movies = MovieReviewDataFrame.drop_duplicates("id")[["id", "title"]]
     
     # Dictionary to store cleaned reviews keyed by DataFrame index
     cleaned_reviews = {}
 
+    # Number of replacements made by the exact and fuzzy matching paths
+    replacement_stats = {}
+
     # Loop over each unique movie
     for _, row in movies.iterrows():
 
         # Clean Movie title
         movie_title = normalize_text(row["title"])
 
-        # Select reviews corresponding to the current movie
-        reviews = MovieReviewDataFrame.loc[MovieReviewDataFrame["id"] == row["id"], "review"].apply(normalize_text)
+        # Select reviews corresponding to the current movie, split into words
+        review_indices, token_lists = review_tokens(MovieReviewDataFrame, MovieReviewDataFrame["id"] == row["id"], tokenize)
 
-        # Determine max n-gram length for fuzzy matching
-        max_ngram = len(movie_title.split()) + len_tolerance
+        # Mask matched n-grams
+        masked_reviews = mask_movie_title(token_lists, movie_title, exact_match=exact_match, stats=replacement_stats,
+                                          threshold=threshold, len_tolerance=len_tolerance, tokenize=tokenize)
 
-        # Loop over each review for the current movie
-        for review_idx, review in reviews.items():
-            # Split review into lowercased words for comparison
-            review_words = word_tokenize(review)
-            cleaned_words = []
-            i = 0
-    
-            # Loop through words in review
-            while i < len(review_words):
-                replaced = False
-
-                # Check n-grams starting from the largest down to 1
-                for n in range(min(max_ngram, len(review_words) - i), 0, -1):
-                    ngram_words = review_words[i:i+n]
-                    ngram = " ".join(ngram_words)
-
-                    # Compute fuzzy match score
-                    score = fuzz.partial_ratio(ngram, movie_title)          # For movie titles fuzz.partial_ratio performs pretty well, catches more than fuzz.ratio, not too many false positives
-            
-                    # If score exceeds threshold, replace n-gram
-                    if score >= threshold:
-                        start, end = 0, len(ngram_words)
-                        
-                        # Trim stopwords at the start
-                        leading_stopwords = []
-                        while start < end and ngram_words[start] in stop_words_lower:
-                            leading_stopwords.append(ngram_words[start])
-                            start += 1
-
-                        # Trim stopwords at the end
-                        trailing_stopwords = []
-                        while end > start and ngram_words[end-1] in stop_words_lower:
-                            end -= 1
-                            trailing_stopwords.insert(0, ngram_words[end])  # insert at front to preserve order
-
-                        # Append in correct order: leading, movie placeholder, trailing
-                        cleaned_words.extend(leading_stopwords)
-                        if start < end:
-                            cleaned_words.append("[movie]")
-                        cleaned_words.extend(trailing_stopwords)
-
-                        # skip past matched words
-                        i += n
-                        replaced = True
-                        break
-        
-                # If no n-gram was replaced, keep current word
-                if not replaced:
-                    cleaned_words.append(review_words[i])
-                    i += 1
-            
-            # Save cleaned review while preserving the original index
+        # Save cleaned reviews while preserving the original index
+        for review_idx, cleaned_words in zip(review_indices, masked_reviews):
             cleaned_reviews[review_idx] = " ".join(cleaned_words)
 
     # Return a pandas series, mapping review indices to cleaned review text.
-    return pd.Series(cleaned_reviews)
+    cleaned_reviews = pd.Series(cleaned_reviews)
+    cleaned_reviews.attrs["replacements"] = replacement_stats
+    return cleaned_reviews
+
+
+def mask_movie_title(token_lists, movie_title, exact_match=False, stats=None, threshold=85, len_tolerance=0, tokenize=str.split):
+    """
+    Mask a (normalized) movie title in the tokenized reviews of that movie.
+
+    Token-level part of `ReplaceMovieTitles`, also used by `ReplaceMoviesAndActors`.
+    Returns the masked token lists, see `mask_ngrams`.
+    """
+    # Determine max n-gram length for fuzzy matching
+    max_ngram = len(movie_title.split()) + len_tolerance
+
+    # Compute fuzzy match scores of all n-grams at once, 
+    # for movie titles fuzz.partial_ratio performs pretty well, catches more than fuzz.ratio, not too many false positives
+    def score_ngrams(ngrams):
+        return process.cdist(ngrams, [movie_title], scorer=fuzz.partial_ratio, dtype=np.float64)[:, 0]
 
+    # Exact fast path for the title, tokenized like the reviews
+    exact_matcher = ExactPhraseMatcher([movie_title], tokenize=tokenize) if exact_match else None
 
+    return mask_ngrams(token_lists, max_ngram, score_ngrams, threshold, "[movie]",
+                       exact_matcher=exact_matcher, compare=exact_match == "compare", stats=stats)
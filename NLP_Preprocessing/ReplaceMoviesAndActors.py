@@ -0,0 +1,98 @@
+import pandas as pd
+from NLP_Preprocessing.normalize_text import normalize_text
+from NLP_Preprocessing.tokenize_text import get_tokenizer, normalize_reviews, review_tokens
+from NLP_Preprocessing.ReplaceMovieTitles import mask_movie_title
+from NLP_Preprocessing.ReplaceActorNames import mask_actor_names
+from NLP_Preprocessing.ActorGazetteer import get_actor_gazetteer
+
+
+def ReplaceMoviesAndActors(MovieReviewDataFrame, exact_match=False, tokenizer="fast", threshold=85):
+    """
+    Mask movie titles and actor names in movie reviews in a single pass.
+
+    Each review is normalized and tokenized once, movie titles are replaced by '[movie]'
+    (see `ReplaceMovieTitles`) and the resulting tokens are then masked for actor names,
+    replacing them by '[actor]' (see `ReplaceActorNames`).
+
+    Parameters
+    ----------
+    MovieReviewDataFrame : pandas.DataFrame
+        A DataFrame containing movie reviews. Must contain the following columns:
+        - 'id': Unique identifier for each movie.
+        - 'title': Movie title (used for matching in reviews).
+        - 'review': The review text in which movie titles and actor names will be masked.
+    exact_match : bool or str, default=False
+        Exact-match fast path for both maskings, see `ReplaceMovieTitles`.
+    tokenizer : str, default="fast"
+        Tokenizer backend, see `ReplaceMovieTitles`.
+    threshold : int or float, default=85
+        Minimum fuzzy matching score (0-100), used for both maskings.
+
+    Returns
+    -------
+    pandas.Series
+        A Series indexed by the original review indices, containing the cleaned review
+        text with movie titles replaced by '[movie]' and actor names replaced by '[actor]'.
+
+        The number of replacements of both maskings is stored in the Series' attributes
+        under `attrs["replacements"]`, with keys prefixed by 'movies' and 'actors'.
+
+    Notes
+    -----
+    - The output is identical to running `ReplaceMovieTitles` and then `ReplaceActorNames`
+      on its output. The second run re-tokenizes '[movie]' into '[', 'movie', ']', which
+      is mirrored here before masking actor names.
+    """
+    # Initialize Variables used for finetuning
+    len_tolerance = 0
+
+    # Assign tokenizer backend
+    tokenize = get_tokenizer(tokenizer)
+
+    # Load actor gazetteer with precompiled matchers over all actor names (once per process)
+    gazetteer = get_actor_gazetteer(threshold=threshold, tokenizer=tokenizer)
+    matcher = gazetteer.matcher
+    exact_matcher = gazetteer.exact_matcher if exact_match else None
+
+    # Normalize all reviews at once instead of once per movie
+    MovieReviewDataFrame = normalize_reviews(MovieReviewDataFrame)
+
+    # Drop duplicate movies to iterate through each movie once
+    movies = MovieReviewDataFrame.drop_duplicates("id")[["id", "title"]]
+
+    # Dictionary to store cleaned reviews keyed by DataFrame index
+    cleaned_reviews = {}
+
+    # Number of replacements made by the exact and fuzzy matching paths of both maskings
+    movie_stats = {}
+    actor_stats = {}
+
+    # Loop over each unique movie
+    for _, row in movies.iterrows():
+
+        # Clean Movie title
+        movie_title = normalize_text(row["title"])
+
+        # Select reviews corresponding to the current movie, split into words once
+        review_indices, token_lists = review_tokens(MovieReviewDataFrame, MovieReviewDataFrame["id"] == row["id"], tokenize)
+
+        # Mask movie titles
+        masked_reviews = mask_movie_title(token_lists, movie_title, exact_match=exact_match, stats=movie_stats,
+                                          threshold=threshold, len_tolerance=len_tolerance, tokenize=tokenize)
+
+        # Split movie placeholders the way the tokenizer splits them in the reviews
+        masked_reviews = [[word for token in words for word in (["[", "movie", "]"] if token == "[movie]" else [token])] for words in masked_reviews]
+
+        # Mask actor names
+        masked_reviews = mask_actor_names(masked_reviews, matcher, exact_matcher=exact_matcher, compare=exact_match == "compare",
+                                          stats=actor_stats, len_tolerance=len_tolerance)
+
+        # Save cleaned reviews while preserving the original index
+        for review_idx, cleaned_words in zip(review_indices, masked_reviews):
+            cleaned_reviews[review_idx] = " ".join(cleaned_words)
+
+    # Return a pandas series, mapping review indices to cleaned review text
+    cleaned_reviews = pd.Series(cleaned_reviews)
+    cleaned_reviews.attrs["replacements"] = {**{f"movies {key}": count for key, count in movie_stats.items()},
+                                             **{f"actors {key}": count for key, count in actor_stats.items()}}
+    return cleaned_reviews
@@ -1,5 +1,13 @@
 from .ReplaceMovieTitles import ReplaceMovieTitles
 from .PreprocessMovieReviews import PreprocessMovieReviews
-from .normalize_text import normalize_text
+from .normalize_text import normalize_text, normalize_texts
 from .split_actor_name import split_actor_name
-from .ReplaceActorNames import ReplaceActorNames
\ No newline at end of file
+from .ReplaceActorNames import ReplaceActorNames
+from .ActorMatcher import ActorMatcher
+from .mask_ngrams import mask_ngrams
+from .ExactPhraseMatcher import ExactPhraseMatcher
+from .ReplaceMoviesAndActors import ReplaceMoviesAndActors
+from .tokenize_text import fast_tokenize, get_tokenizer, compare_tokenizers
+from .token_cache import cached_tokenize
+from .preprocessing_manifest import load_manifest, affected_reviews
+from .ActorGazetteer import ActorGazetteer, get_actor_gazetteer
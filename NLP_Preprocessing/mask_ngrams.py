@@ -0,0 +1,175 @@
+import numpy as np
+from nltk.corpus import stopwords
+
+stop_words = set(stopwords.words("english"))
+stop_words_lower = {w.lower() for w in stop_words}
+
+
+def mask_ngrams(token_lists, max_ngram, score_ngrams, threshold, placeholder, exact_matcher=None, compare=False, stats=None):
+    """
+    Mask fuzzy matches in tokenized reviews, scoring all candidate n-grams in one batch.
+
+    This is the masking engine shared by `ReplaceMovieTitles` and `ReplaceActorNames`.
+    Instead of scoring n-grams one at a time while walking each review, it builds every
+    n-gram (up to `max_ngram` words) of all given reviews, deduplicates them, and scores
+    the unique n-grams with a single call to `score_ngrams`. The replacement policy is
+    then resolved from the resulting match matrix:
+
+    - Reviews are walked from left to right, at each position the longest matching
+      n-gram is replaced and the walk continues after it (non-overlapping matches).
+    - Stopwords at the start or end of a matched n-gram are preserved, only the words in
+      between are replaced by `placeholder`.
+
+    If an `exact_matcher` is given, exact occurrences of the names are replaced first in a
+    single linear scan, and only the remaining spans between them go through fuzzy scoring.
+
+    Parameters
+    ----------
+    token_lists : list of list of str
+        Tokenized (and normalized) reviews.
+    max_ngram : int
+        Maximum number of words of an n-gram to check.
+    score_ngrams : callable
+        Function taking a list of n-gram strings and returning an array of match scores
+        (one per n-gram), e.g. a RapidFuzz `process.cdist` call against the names to mask.
+    threshold : int or float
+        Minimum score for an n-gram to be replaced.
+    placeholder : str
+        Token replacing matched n-grams, e.g. '[movie]' or '[actor]'.
+    exact_matcher : ExactPhraseMatcher, optional
+        Automaton over the names to mask, used as an exact fast path before fuzzy scoring.
+    compare : bool, default=False
+        If True (and an `exact_matcher` is given), also mask the reviews with fuzzy scoring
+        only, count the reviews for which both paths differ and return the fuzzy-only result.
+    stats : dict, optional
+        If given, the number of replacements made by the exact path ('exact') and by
+        fuzzy scoring ('fuzzy') are added to it. When comparing, the replacements of the
+        fuzzy-only path ('reference') and the number of differing reviews ('differing')
+        are added as well.
+
+    Returns
+    -------
+    list of list of str
+        The masked token lists, in the same order as `token_lists`.
+    """
+    if stats is None:
+        stats = {}
+
+    if exact_matcher is None:
+        masked = _mask_fuzzy(token_lists, max_ngram, score_ngrams, threshold, placeholder, stats)
+        stats["exact"] = stats.get("exact", 0)
+        return masked
+
+    # Replace exact matches, collecting the remaining spans of each review for fuzzy matching
+    segments = []
+    layouts = []
+    num_exact = 0
+    for tokens in token_lists:
+        layout = []
+        position = 0
+        for start, end in exact_matcher.find(tokens):
+            layout.append(len(segments))
+            segments.append(tokens[position:start])
+            layout.append(replace_ngram(tokens[start:end], placeholder))
+            num_exact += 1
+            position = end
+        layout.append(len(segments))
+        segments.append(tokens[position:])
+        layouts.append(layout)
+
+    stats["exact"] = stats.get("exact", 0) + num_exact
+
+    # Fuzzy match remaining spans (n-grams never cross an exact match)
+    masked_segments = _mask_fuzzy(segments, max_ngram, score_ngrams, threshold, placeholder, stats)
+
+    # Reassemble reviews from masked spans and replaced exact matches
+    masked = []
+    for layout in layouts:
+        cleaned_words = []
+        for part in layout:
+            cleaned_words.extend(masked_segments[part] if isinstance(part, int) else part)
+        masked.append(cleaned_words)
+
+    # Compare against fuzzy matching on the full reviews, keeping the fuzzy-only result
+    if compare:
+        reference_stats = {}
+        reference = _mask_fuzzy(token_lists, max_ngram, score_ngrams, threshold, placeholder, reference_stats)
+        stats["reference"] = stats.get("reference", 0) + reference_stats["fuzzy"]
+        stats["differing"] = stats.get("differing", 0) + sum(a != b for a, b in zip(masked, reference))
+        return reference
+
+    return masked
+
+
+def _mask_fuzzy(token_lists, max_ngram, score_ngrams, threshold, placeholder, stats):
+    """
+    Fuzzy part of `mask_ngrams`: batch score all n-grams and resolve the replacements.
+    """
+    stats["fuzzy"] = stats.get("fuzzy", 0)
+
+    if max_ngram < 1:
+        return [list(tokens) for tokens in token_lists]
+
+    # Build all n-grams, keeping an id into the list of unique n-grams per (position, length)
+    ngram_ids = {}
+    review_ids = []
+    for tokens in token_lists:
+        ids = np.full((len(tokens), max_ngram), -1, dtype=np.int64)
+        for i in range(len(tokens)):
+            for n in range(1, min(max_ngram, len(tokens) - i) + 1):
+                ids[i, n-1] = ngram_ids.setdefault(" ".join(tokens[i:i+n]), len(ngram_ids))
+        review_ids.append(ids)
+
+    if not ngram_ids:
+        return [list(tokens) for tokens in token_lists]
+
+    # Score unique n-grams in a single batch
+    scores = np.asarray(score_ngrams(list(ngram_ids)), dtype=np.float64)
+    is_match = np.append(scores >= threshold, False)      # id -1 (n-gram past the end of the review) never matches
+
+    masked = []
+    for tokens, ids in zip(token_lists, review_ids):
+        # Length of the longest matching n-gram at each position (0 if nothing matches)
+        matches = is_match[ids]
+        longest = np.where(matches.any(axis=1), max_ngram - np.argmax(matches[:, ::-1], axis=1), 0).tolist()
+
+        cleaned_words = []
+        i = 0
+
+        # Loop through words in review
+        while i < len(tokens):
+            n = longest[i]
+
+            # If no n-gram matches, keep current word
+            if n == 0:
+                cleaned_words.append(tokens[i])
+                i += 1
+                continue
+
+            cleaned_words.extend(replace_ngram(tokens[i:i+n], placeholder))
+            stats["fuzzy"] += 1
+
+            # Skip past matched words
+            i += n
+
+        masked.append(cleaned_words)
+
+    return masked
+
+
+def replace_ngram(ngram_words, placeholder):
+    """
+    Replace a matched n-gram by `placeholder`, preserving leading and trailing stopwords.
+    """
+    start, end = 0, len(ngram_words)
+
+    # Trim stopwords at the start
+    while start < end and ngram_words[start] in stop_words_lower:
+        start += 1
+
+    # Trim stopwords at the end
+    while end > start and ngram_words[end-1] in stop_words_lower:
+        end -= 1
+
+    # Return in correct order: leading, placeholder, trailing
+    return ngram_words[:start] + ([placeholder] if start < end else []) + ngram_words[end:]
@@ -1,12 +1,55 @@
 import re
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Precompiled patterns: all non-alphanumeric characters except whitespace and square brackets,
+# and commas inside numbers (only relevant if commas were kept by the first pattern)
+_NON_ALPHANUMERIC = re.compile(r"[^a-z0-9\s\[\]]")
+_NUMBER_COMMAS = re.compile(r"(?<=\d),(?=\d)")
+
+# Same pattern for Arrow's RE2 engine, where \s only matches ASCII whitespace,
+# so the characters matched by Python's Unicode \s are listed explicitly
+_WHITESPACE = r"\t\n\v\f\r\x1c-\x1f\x20\x85\xa0\x{1680}\x{2000}-\x{200a}\x{2028}\x{2029}\x{202f}\x{205f}\x{3000}"
+_NON_ALPHANUMERIC_RE2 = rf"[^a-z0-9{_WHITESPACE}\[\]]"
+
 
 def normalize_text(text):
     """
-    Lowercase, remove punctuation except numbers, letters, spaces, 
+    Lowercase, remove punctuation except numbers, letters, spaces,
     and square brackets (so placeholders like [actor] survive).
     """
     # Remove all non-alphanumeric characters except spaces
-    text = re.sub(r"[^a-z0-9\s\[\]]", "", text.lower())
+    text = _NON_ALPHANUMERIC.sub("", text.lower())
     # Optionally, remove commas inside numbers: "10,000" -> "10000"
-    text = re.sub(r"(?<=\d),(?=\d)", "", text)
+    text = _NUMBER_COMMAS.sub("", text)
     return text
+
+
+def normalize_texts(texts):
+    """
+    Normalize a whole Series or Arrow string array at once, see `normalize_text`.
+
+    Texts are lowercased and stripped with Arrow's vectorized string kernels (`utf8_lower`,
+    `replace_substring_regex`), which give the same result as `normalize_text` for every
+    Unicode character. Commas inside numbers are already removed by the first pattern.
+
+    Parameters
+    ----------
+    texts : pandas.Series, pyarrow.Array or pyarrow.ChunkedArray
+        Texts to normalize. Missing values stay missing.
+
+    Returns
+    -------
+    pandas.Series or pyarrow.Array or pyarrow.ChunkedArray
+        Normalized texts, of the same type as the input (a Series keeps its index).
+    """
+    if isinstance(texts, (pa.Array, pa.ChunkedArray)):
+        return pc.replace_substring_regex(pc.utf8_lower(texts), pattern=_NON_ALPHANUMERIC_RE2, replacement="")
+
+    # Texts that can't be encoded as UTF-8 (lone surrogates) are normalized one by one
+    try:
+        normalized = normalize_texts(pa.array(texts, type=pa.string(), from_pandas=True))
+    except UnicodeEncodeError:
+        return texts.apply(lambda text: normalize_text(text) if isinstance(text, str) else text)
+    return pd.Series(normalized.to_numpy(zero_copy_only=False), index=texts.index, name=texts.name, dtype=object)
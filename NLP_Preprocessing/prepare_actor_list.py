@@ -1,5 +1,5 @@
 import pandas as pd
-from NLP_Preprocessing.normalize_text import normalize_text
+from NLP_Preprocessing.normalize_text import normalize_texts
 
 # Load datasets
 celebrities = pd.read_csv("NLP_Preprocessing/Celebrity.csv", index_col=0)
@@ -9,8 +9,8 @@ top_1000 = pd.read_csv("NLP_Preprocessing/IMDb_top_1000_actors.csv")["Name"]
 actors = celebrities[celebrities["known_for_department"] == "Acting"].head(2000)["name"].reset_index(drop=True)
 
 # Normalize text (lowercase, remove punctuation, etc.)
-actors = actors.apply(normalize_text)
-top_1000 = top_1000.apply(normalize_text)
+actors = normalize_texts(actors)
+top_1000 = normalize_texts(top_1000)
 
 # Remove IMDb actors already in the celebrity list
 actor_set = set(actors)
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+from NLP_Preprocessing.ActorMatcher import ActorMatcher
+
+
+def file_hash(path):
+    """
+    Return the 128-bit BLAKE2b content hash of a file (hex digest).
+    """
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+
+
+def actor_list_hash(actors):
+    """
+    Return the content hash of an actor list (hex digest), independent of the file it was read from.
+    """
+    return hashlib.blake2b("\n".join(actors).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def load_manifest(manifest_path):
+    """
+    Load the preprocessing manifest, an empty manifest if it does not exist yet.
+
+    The manifest maps each output file name to the parameters and content hashes of the
+    run that produced it: input file and hash, masking mode, exact-match flag, threshold,
+    actor list hash and output hash.
+    """
+    if not manifest_path.exists():
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, manifest_path):
+    """
+    Write the preprocessing manifest atomically (write to a temporary file, then rename).
+    """
+    tmp_path = manifest_path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def save_actor_list_snapshot(actors, snapshot_folder):
+    """
+    Store the actor list used for a run, so a later run can tell which names changed.
+    """
+    snapshot_folder.mkdir(parents=True, exist_ok=True)
+    snapshot_path = snapshot_folder / f"{actor_list_hash(actors)}.txt"
+    if not snapshot_path.exists():
+        tmp_path = snapshot_path.with_suffix(".tmp")
+        tmp_path.write_text("\n".join(actors), encoding="utf-8")
+        os.replace(tmp_path, snapshot_path)
+
+
+def load_actor_list_snapshot(actors_hash, snapshot_folder):
+    """
+    Load a stored actor list by its hash, None if no snapshot exists.
+    """
+    snapshot_path = snapshot_folder / f"{actors_hash}.txt"
+    if not snapshot_path.exists():
+        return None
+    return snapshot_path.read_text(encoding="utf-8").split("\n")
+
+
+def actor_list_delta(old_actors, new_actors, threshold=85):
+    """
+    Build the matcher over the names added to the actor list since a previous run.
+
+    Parameters
+    ----------
+    old_actors, new_actors : list of str
+        Actor lists of the previous and of the current run.
+    threshold : int or float, default=85
+        Fuzzy matching threshold used by both runs.
+
+    Returns
+    -------
+    ActorMatcher or None
+        Matcher over the added names, or None if every review has to be reprocessed
+        (the maximal number of words of a name changed, so different n-grams are scored).
+    """
+    max_words = lambda actors: max((len(name.split()) for name in actors), default=0)
+    if max_words(old_actors) != max_words(new_actors):
+        return None
+    return ActorMatcher(sorted(set(new_actors) - set(old_actors)), threshold=threshold)
+
+
+def affected_reviews(previous_reviews, added_matcher, max_words):
+    """
+    Find the reviews whose actor masking can change when the actor list changes.
+
+    A review is affected if the previous run replaced an actor name in it (a removed or
+    added name may change that replacement), or if any n-gram of its previous output
+    matches one of the added names. Reviews without a previous replacement contained no
+    n-gram matching any old name, so their output only changes through added names.
+
+    Parameters
+    ----------
+    previous_reviews : pandas.Series
+        Masked review texts of the previous run.
+    added_matcher : ActorMatcher
+        Matcher over the added names (see `actor_list_delta`).
+    max_words : int
+        Maximal n-gram length scored by the masking pass (the number of words of the longest
+        name of the whole actor list). Matching is fuzzy across word counts, so n-grams longer
+        than the added names (e.g. "de niro" for "deniro") are checked as well.
+
+    Returns
+    -------
+    pandas.Series
+        Boolean mask of the affected reviews.
+    """
+    def is_affected(review):
+        words = review.split()
+
+        # Reviews with a previous replacement ('[actor]' placeholders are never split, unlike '[ actor ]' from the input text)
+        if "[actor]" in words:
+            return True
+
+        # Reviews with an n-gram matching an added name
+        for i in range(len(words)):
+            for n in range(1, min(max_words, len(words) - i) + 1):
+                if added_matcher.is_match(" ".join(words[i:i+n])):
+                    return True
+        return False
+
+    return previous_reviews.fillna("").apply(is_affected).astype(bool)
@@ -0,0 +1,68 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Schema of token cache files: tokens are stored as an Arrow list column keyed by reviewId,
+# together with a hash of the normalized review text they were computed from
+TOKEN_CACHE_SCHEMA = pa.schema([("reviewId", pa.string()),
+                                ("textHash", pa.uint64()),
+                                ("tokens", pa.list_(pa.string()))])
+
+
+def cached_tokenize(review_ids, normalized_reviews, cache_path, tokenize_texts):
+    """
+    Tokenize normalized reviews, reusing tokens stored in an on-disk token cache.
+
+    Cached tokens are only used if the hash of the normalized review text still matches,
+    so a changed review is re-tokenized. Reviews missing from the cache are tokenized
+    with `tokenize_texts` and the cache file is rewritten.
+
+    Parameters
+    ----------
+    review_ids : pandas.Series
+        Review identifiers, aligned with `normalized_reviews`.
+    normalized_reviews : pandas.Series
+        Normalized review texts (see `normalize_text`).
+    cache_path : pathlib.Path
+        Parquet file holding the token cache of this shard.
+    tokenize_texts : callable
+        Function taking a list of texts and returning a list of token lists.
+
+    Returns
+    -------
+    tokens : pandas.Series
+        Token lists, indexed like `normalized_reviews`.
+    num_cached : int
+        Number of reviews whose tokens were taken from the cache.
+    """
+    review_ids = review_ids.astype(str).to_numpy()
+    text_hashes = pd.util.hash_pandas_object(normalized_reviews, index=False).to_numpy()
+    tokens = [None] * len(normalized_reviews)
+
+    # Look up cached tokens with a matching text hash
+    if cache_path.exists():
+        cache = pq.read_table(cache_path, schema=TOKEN_CACHE_SCHEMA)
+        cache_rows = {review_id: row for row, review_id in enumerate(cache.column("reviewId").to_pylist())}
+        cache_hashes = cache.column("textHash").to_numpy()
+        cache_tokens = cache.column("tokens").to_pylist()
+
+        for n, (review_id, text_hash) in enumerate(zip(review_ids, text_hashes)):
+            row = cache_rows.get(review_id)
+            if row is not None and cache_hashes[row] == text_hash:
+                tokens[n] = cache_tokens[row]
+
+    # Tokenize reviews missing from the cache
+    missing = [n for n, words in enumerate(tokens) if words is None]
+    if missing:
+        for n, words in zip(missing, tokenize_texts(normalized_reviews.iloc[missing].tolist())):
+            tokens[n] = words
+
+        # Rewrite cache atomically, so an interrupted write never leaves a corrupt cache
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        table = pa.Table.from_pydict({"reviewId": review_ids.tolist(), "textHash": text_hashes, "tokens": tokens}, schema=TOKEN_CACHE_SCHEMA)
+        tmp_path = cache_path.with_suffix(".tmp")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, cache_path)
+
+    return pd.Series(tokens, index=normalized_reviews.index, dtype=object), len(tokens) - len(missing)
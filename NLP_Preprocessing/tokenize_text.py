@@ -0,0 +1,92 @@
+import re
+import pandas as pd
+from nltk.tokenize import word_tokenize
+from NLP_Preprocessing.normalize_text import normalize_texts
+
+# Square brackets are split off as separate tokens by NLTK's Treebank tokenizer
+_BRACKETS = re.compile(r"([\[\]])")
+
+# Treebank contractions that can occur in normalized text (the others require an apostrophe)
+_CONTRACTIONS = {"cannot": ["can", "not"],
+                 "gimme": ["gim", "me"],
+                 "gonna": ["gon", "na"],
+                 "gotta": ["got", "ta"],
+                 "lemme": ["lem", "me"],
+                 "wanna": ["wan", "na"]}
+
+
+def fast_tokenize(text):
+    """
+    Tokenize normalized text (see `normalize_text`) into the same tokens as NLTK's
+    `word_tokenize`, using a single compiled regex and `str.split`.
+
+    On normalized text only characters in [a-z0-9], whitespace and square brackets remain,
+    so the only Treebank rules that can apply are splitting off brackets and splitting
+    the contractions listed in `_CONTRACTIONS`. Punkt sentence splitting has no effect,
+    as there is no sentence-final punctuation left.
+    """
+    tokens = _BRACKETS.sub(r" \1 ", text).split()
+    return [part for token in tokens for part in _CONTRACTIONS.get(token, (token,))]
+
+
+TOKENIZERS = {"nltk": word_tokenize,
+              "fast": fast_tokenize}
+
+
+def get_tokenizer(tokenizer):
+    """
+    Return the tokenizer function for a backend name ("nltk" or "fast").
+    """
+    if tokenizer not in TOKENIZERS:
+        raise ValueError(f"Unsupported tokenizer: {tokenizer}. Must be one of {set(TOKENIZERS)}")
+    return TOKENIZERS[tokenizer]
+
+
+def compare_tokenizers(texts):
+    """
+    Validate the fast tokenizer against NLTK's `word_tokenize` on a sample of texts.
+
+    Texts are normalized before tokenizing, as in the masking functions.
+
+    Returns
+    -------
+    list of str
+        The normalized texts for which both tokenizers disagree (empty if identical).
+    """
+    normalized = normalize_texts(pd.Series(list(texts), dtype=object))
+    return [text for text in normalized if fast_tokenize(text) != word_tokenize(text)]
+
+
+def normalize_reviews(MovieReviewDataFrame):
+    """
+    Add a 'normalized' column with the normalized 'review' column (see `normalize_texts`),
+    unless the reviews are already normalized or tokenized. Normalizes all reviews at once
+    instead of once per movie.
+    """
+    if "tokens" in MovieReviewDataFrame.columns or "normalized" in MovieReviewDataFrame.columns:
+        return MovieReviewDataFrame
+    return MovieReviewDataFrame.assign(normalized=normalize_texts(MovieReviewDataFrame["review"]))
+
+
+def review_tokens(MovieReviewDataFrame, mask, tokenize):
+    """
+    Return the tokens of the reviews selected by `mask`.
+
+    Uses the pre-tokenized 'tokens' column if present (see `cached_tokenize`), otherwise
+    tokenizes the 'normalized' column (see `normalize_reviews`), or normalizes and
+    tokenizes the 'review' column.
+
+    Returns
+    -------
+    tuple of (pandas.Index, list of list of str)
+        Original review indices and the tokens of each review.
+    """
+    if "tokens" in MovieReviewDataFrame.columns:
+        tokens = MovieReviewDataFrame.loc[mask, "tokens"]
+        return tokens.index, [list(words) for words in tokens]
+
+    if "normalized" in MovieReviewDataFrame.columns:
+        reviews = MovieReviewDataFrame.loc[mask, "normalized"]
+    else:
+        reviews = normalize_texts(MovieReviewDataFrame.loc[mask, "review"])
+    return reviews.index, [tokenize(review) for review in reviews]
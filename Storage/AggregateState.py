@@ -0,0 +1,149 @@
+import os
+import pickle
+import numpy as np
+
+
+class AggregateState:
+    """
+    Persistent per-movie running sums, counts and sums of squares of a review-level value.
+
+    The state keeps the partial aggregates of every shard it was built from, together with
+    a fingerprint of the shard file(s) (see `shard_fingerprint`). When shards are added,
+    re-analysed or removed, only their partials are merged in or subtracted out of the
+    per-movie totals, so refreshing the movie-level aggregates costs time proportional to
+    the changed shards instead of the whole corpus.
+
+    Values can be scalars (e.g. sentiment scores) or vectors (e.g. embeddings), the sums
+    and sums of squares then have the shape (number of movies,) or (number of movies, dim).
+    """
+
+    def __init__(self):
+        self.shards = {}
+        self.ids = np.array([], dtype=object)
+        self.sums = None
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.sumsqs = None
+        self._positions = {}
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load the state from its file, an empty state if it doesn't exist yet.
+        """
+        if not path.exists():
+            return cls()
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    def save(self, path):
+        """
+        Write the state to its file, atomically.
+        """
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def is_current(self, name, fingerprint):
+        """
+        Return True if shard `name` was merged with the same fingerprint.
+        """
+        return name in self.shards and self.shards[name]["fingerprint"] == fingerprint
+
+    def stale_shards(self, fingerprints):
+        """
+        Return the names of merged shards that are no longer in `fingerprints` (name -> fingerprint).
+        """
+        return [name for name in self.shards if name not in fingerprints]
+
+    def merge(self, name, fingerprint, ids, sums, counts, sumsqs):
+        """
+        Merge the per-movie partial aggregates of shard `name` into the totals.
+
+        A previous version of the shard is retracted first.
+
+        Parameters
+        ----------
+        name : str
+            Shard name, e.g. its file name.
+        fingerprint : tuple
+            Fingerprint of the shard file(s), see `shard_fingerprint`.
+        ids : numpy.ndarray
+            Distinct movie ids of the shard.
+        sums, counts, sumsqs : numpy.ndarray
+            Sum, number and sum of squares of the values of each movie in the shard.
+        """
+        if name in self.shards:
+            self.retract(name)
+        partial = {"fingerprint": fingerprint,
+                   "ids": np.asarray(ids, dtype=object),
+                   "sums": np.asarray(sums, dtype=np.float64),
+                   "counts": np.asarray(counts, dtype=np.int64),
+                   "sumsqs": np.asarray(sumsqs, dtype=np.float64)}
+        self._add(partial, 1)
+        self.shards[name] = partial
+
+    def retract(self, name):
+        """
+        Subtract the partial aggregates of shard `name` out of the totals.
+        """
+        self._add(self.shards.pop(name), -1)
+
+    def _add(self, partial, sign):
+        # Add rows for movies not seen yet
+        new_ids = [movie_id for movie_id in partial["ids"] if movie_id not in self._positions]
+        if self.sums is None:
+            self.sums = np.zeros((0,) + partial["sums"].shape[1:])
+            self.sumsqs = np.zeros((0,) + partial["sumsqs"].shape[1:])
+        if new_ids:
+            for movie_id in new_ids:
+                self._positions[movie_id] = len(self._positions)
+            self.ids = np.concatenate([self.ids, np.array(new_ids, dtype=object)])
+            self.sums = np.concatenate([self.sums, np.zeros((len(new_ids),) + self.sums.shape[1:])])
+            self.counts = np.concatenate([self.counts, np.zeros(len(new_ids), dtype=np.int64)])
+            self.sumsqs = np.concatenate([self.sumsqs, np.zeros((len(new_ids),) + self.sumsqs.shape[1:])])
+
+        # Update totals of the shard's movies (ids are distinct within a shard)
+        positions = np.fromiter((self._positions[movie_id] for movie_id in partial["ids"]), dtype=np.intp, count=len(partial["ids"]))
+        self.sums[positions] += sign * partial["sums"]
+        self.counts[positions] += sign * partial["counts"]
+        self.sumsqs[positions] += sign * partial["sumsqs"]
+
+    def totals(self):
+        """
+        Return the movie ids (sorted) with their total sums, counts and sums of squares.
+
+        Movies whose reviews were all retracted are left out.
+        """
+        if self.sums is None:
+            return self.ids, np.zeros(0), self.counts, np.zeros(0)
+        order = np.argsort(self.ids, kind="stable")
+        order = order[self.counts[order] > 0]
+        return self.ids[order], self.sums[order], self.counts[order], self.sumsqs[order]
+
+    def means(self):
+        """
+        Return the movie ids (sorted) and the mean value of each movie.
+        """
+        ids, sums, counts, _ = self.totals()
+        return ids, sums / counts.reshape((-1,) + (1,) * (sums.ndim - 1))
+
+    def variances(self):
+        """
+        Return the movie ids (sorted) and the (population) variance of the values of each movie.
+        """
+        ids, sums, counts, sumsqs = self.totals()
+        counts = counts.reshape((-1,) + (1,) * (sums.ndim - 1))
+        return ids, np.maximum(sumsqs / counts - (sums / counts) ** 2, 0)
+
+
+def shard_fingerprint(*paths):
+    """
+    Fingerprint of shard file(s) by name, size and modification time, used to detect
+    shards that were rewritten since they were merged into an `AggregateState`.
+    """
+    fingerprint = []
+    for path in paths:
+        stat = path.stat()
+        fingerprint.append((path.name, stat.st_size, stat.st_mtime_ns))
+    return tuple(fingerprint)
@@ -0,0 +1,174 @@
+import os
+import re
+import numpy as np
+import pandas as pd
+from Storage.shard_storage import FILE_FORMATS, SCHEMAS, read_shard, write_shard
+
+# Supported dtypes of the stored embedding matrices
+EMBEDDING_DTYPES = {"float32": np.float32,
+                    "float16": np.float16}
+
+
+class EmbeddingStore:
+    """
+    Review embeddings stored as one contiguous matrix per shard, with an id/reviewId index.
+
+    Each shard i consists of two files in `folder`:
+    - '{stem}_{i}.npy': float32 (or float16) matrix with one row per review, memory-mapped when read.
+    - '{stem}_index_{i}.parquet': 'id' and 'reviewId' of the rows, in matrix row order.
+
+    Rows are sorted by movie id when written, so the embeddings of one movie are a contiguous
+    block of the matrix and can be sliced without copying (see `movie_slices`). The index is
+    written after the matrix and marks the shard as complete.
+
+    The store holds the per-review embeddings written by CalculateEmbeddings and read by
+    AggregateEmbeddings. The similarity analyses in the notebooks use the per-movie averages
+    written by AggregateEmbeddings, and the topic model embeds its own aspect strings
+    ('TopicModelling/aspect_model_embeddings.npy'), so neither reads from the store.
+
+    Parameters
+    ----------
+    folder : pathlib.Path
+        Folder containing the shards.
+    stem : str
+        File name stem of the shards, e.g. 'rt_audience_embeddings'.
+    """
+
+    def __init__(self, folder, stem):
+        self.folder = folder
+        self.stem = stem
+
+    def matrix_path(self, i):
+        return self.folder / f"{self.stem}_{i}.npy"
+
+    def index_path(self, i):
+        return self.folder / f"{self.stem}_index_{i}{FILE_FORMATS['parquet']}"
+
+    def has_shard(self, i):
+        """
+        Return True if shard `i` was completely written.
+        """
+        return self.index_path(i).exists() and self.matrix_path(i).exists()
+
+    def shards(self):
+        """
+        List the numbers of the complete shards in the store, sorted.
+        """
+        pattern = re.compile(rf"^{re.escape(self.stem)}_index_(\d+){re.escape(FILE_FORMATS['parquet'])}$")
+        shards = []
+        for path in self.folder.glob(f"{self.stem}_index_*{FILE_FORMATS['parquet']}"):
+            match = pattern.match(path.name)
+            if match and self.matrix_path(int(match.group(1))).exists():
+                shards.append(int(match.group(1)))
+        return sorted(shards)
+
+    def __len__(self):
+        return len(self.shards())
+
+    def __iter__(self):
+        for i in self.shards():
+            yield self.read_shard(i)
+
+    def write_shard(self, i, ids, review_ids, embeddings, dtype="float32"):
+        """
+        Write the embeddings of shard `i`, atomically.
+
+        Parameters
+        ----------
+        i : int
+            Shard number.
+        ids, review_ids : array-like of str
+            Movie id and reviewId of each embedding.
+        embeddings : numpy.ndarray
+            Matrix of shape (number of reviews, embedding dimension).
+        dtype : {"float32", "float16"}, default="float32"
+            Storage dtype of the matrix. float16 halves the file size, at a precision of
+            about 3 significant digits.
+        """
+        if dtype not in EMBEDDING_DTYPES:
+            raise ValueError(f"Unsupported dtype: {dtype}. Must be one of {set(EMBEDDING_DTYPES)}")
+
+        index = pd.DataFrame({"id": pd.Series(ids, dtype=object).to_numpy(),
+                              "reviewId": pd.Series(review_ids, dtype=object).to_numpy()})
+
+        # Sort rows by movie id, so each movie's embeddings are a contiguous block
+        order = np.argsort(index["id"].to_numpy(), kind="stable")
+        index = index.iloc[order].reset_index(drop=True)
+        matrix = np.ascontiguousarray(np.asarray(embeddings)[order], dtype=EMBEDDING_DTYPES[dtype])
+
+        # Write matrix first, the index marks the shard as complete
+        matrix_path = self.matrix_path(i)
+        tmp_path = matrix_path.with_name(matrix_path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, matrix)
+        os.replace(tmp_path, matrix_path)
+        write_shard(index, self.index_path(i), schema=SCHEMAS["embeddings"])
+
+    def read_shard(self, i, mmap=True):
+        """
+        Read shard `i`.
+
+        Returns
+        -------
+        index : pandas.DataFrame
+            'id' and 'reviewId' of the rows of the matrix.
+        matrix : numpy.ndarray
+            Embedding matrix, memory-mapped read-only unless `mmap` is False.
+        """
+        index = read_shard(self.index_path(i))
+        matrix = np.load(self.matrix_path(i), mmap_mode="r" if mmap else None)
+        return index, matrix
+
+    @staticmethod
+    def movie_slices(index):
+        """
+        Return the movie ids of a shard index and the start offset of their rows.
+
+        The rows of movie `ids[k]` are `matrix[starts[k]:starts[k + 1]]` (the last
+        movie ends at the end of the matrix), which is a view without copying.
+        """
+        return segment_starts(index["id"].to_numpy())
+
+    def movie_embeddings(self, i, movie_id):
+        """
+        Return the embeddings of one movie in shard `i` as a read-only view of the memory-mapped matrix.
+        """
+        index, matrix = self.read_shard(i)
+        ids = index["id"].to_numpy()
+        start, stop = np.searchsorted(ids, movie_id, side="left"), np.searchsorted(ids, movie_id, side="right")
+        return matrix[start:stop]
+
+
+def segment_starts(keys):
+    """
+    Return the distinct keys of a sorted array and the offset at which each of them starts.
+
+    The rows of key `k` are `[starts[k], starts[k + 1])`, see `segment_sums`.
+    """
+    keys = np.asarray(keys)
+    if len(keys) == 0:
+        return keys, np.zeros(0, dtype=np.intp)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return keys[starts], starts
+
+
+def segment_sums(values, starts, squares=False):
+    """
+    Sum the rows of each segment of `values` starting at the offsets `starts`, in float64.
+
+    Each segment is a contiguous block (a view, also of a memory-mapped matrix), summed with
+    one vectorized call. This is several times faster than `np.add.reduceat` along the rows,
+    which doesn't vectorize across columns. If `squares` is True, the sums of squares of
+    each segment are returned as well.
+    """
+    # Plain ndarray view of memory-mapped matrices (avoids the np.memmap overhead per slice)
+    values = values.view(np.ndarray)
+    sums = np.empty((len(starts),) + values.shape[1:], dtype=np.float64)
+    sumsqs = np.empty_like(sums) if squares else None
+    for k, (start, stop) in enumerate(zip(starts, np.r_[starts[1:], len(values)])):
+        block = values[start:stop]
+        sums[k] = block.sum(axis=0, dtype=np.float64)
+        if squares:
+            block = block.astype(np.float64)
+            sumsqs[k] = np.einsum("i...,i...->...", block, block)
+    return (sums, sumsqs) if squares else sums
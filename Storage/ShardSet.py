@@ -0,0 +1,94 @@
+import copy
+import json
+import pandas as pd
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from Storage.shard_storage import list_shards, read_shard
+
+
+class ShardSet:
+    """
+    Set of data shards of one dataset, discovered on disk and loaded in parallel.
+
+    Shards are found by their file names ('{stem}_{i}.parquet' / '{stem}_{i}.json', see
+    `list_shards`) or, if a manifest is given, restricted to the shards recorded in it
+    (e.g. 'preprocessing_manifest.json', which only lists completed files). This replaces
+    hardcoded numbers of files per review type.
+
+    Iterating over a ShardSet yields one DataFrame per shard in shard order, while the next
+    shards are already being read by a thread pool. Aggregations can therefore stream over
+    the shards instead of holding the whole corpus in memory. `load` concatenates all shards.
+
+    Parameters
+    ----------
+    folder : pathlib.Path
+        Folder containing the shards.
+    stem : str
+        File name stem of the shards, e.g. 'rt_audience_reviews_sentiment'.
+    columns : list of str, optional
+        Columns to read from each shard (only these are read from Parquet shards).
+    manifest : pathlib.Path, optional
+        JSON manifest keyed by shard file names. Only shards listed in it are used.
+    max_workers : int, default=4
+        Number of threads reading shards. At most `max_workers` shards are read ahead
+        of the shard currently being processed.
+    """
+
+    def __init__(self, folder, stem, columns=None, manifest=None, max_workers=4):
+        self.folder = folder
+        self.stem = stem
+        self.columns = columns
+        self.max_workers = max_workers
+
+        # Discover shards by file name, optionally restricted to the shards recorded in the manifest
+        self.paths = list_shards(folder, stem)
+        if manifest is not None:
+            with open(manifest, "r", encoding="utf-8") as f:
+                recorded = set(json.load(f))
+            self.paths = [path for path in self.paths if path.name in recorded]
+
+    def select(self, predicate):
+        """
+        Return a ShardSet of the shards whose path satisfies `predicate`, e.g. the shards
+        changed since an aggregate was last updated.
+        """
+        selected = copy.copy(self)
+        selected.paths = [path for path in self.paths if predicate(path)]
+        return selected
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __iter__(self):
+        for _, data in self.items():
+            yield data
+
+    def items(self):
+        """
+        Iterate over the shards as (path, DataFrame) pairs, reading ahead in parallel.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque()
+            paths = iter(self.paths)
+
+            # Keep up to max_workers shards being read ahead
+            for path in paths:
+                pending.append((path, executor.submit(read_shard, path, self.columns)))
+                if len(pending) >= self.max_workers:
+                    break
+
+            while pending:
+                path, future = pending.popleft()
+                next_path = next(paths, None)
+                if next_path is not None:
+                    pending.append((next_path, executor.submit(read_shard, next_path, self.columns)))
+                yield path, future.result()
+
+    def load(self):
+        """
+        Read all shards in parallel and concatenate them into one DataFrame.
+        """
+        if not self.paths:
+            return pd.DataFrame(columns=self.columns)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return pd.concat(executor.map(lambda path: read_shard(path, self.columns), self.paths), ignore_index=True)
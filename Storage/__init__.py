@@ -0,0 +1,4 @@
+from .shard_storage import FILE_FORMATS, SCHEMAS, check_file_format, shard_path, find_shard, list_shards, read_shard, write_shard, export_json
+from .ShardSet import ShardSet
+from .EmbeddingStore import EmbeddingStore
+from .AggregateState import AggregateState, shard_fingerprint
\ No newline at end of file
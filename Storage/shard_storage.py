@@ -0,0 +1,174 @@
+import os
+import re
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Supported shard formats and their file extensions
+FILE_FORMATS = {"parquet": ".parquet",
+                "json": ".json"}
+
+# Explicit column types of the datasets written by the pipeline stages
+# (columns not listed here keep their inferred type, e.g. the join key 'reviewId', int64 in the
+# cleaned data, or the emotion and argument labels)
+SCHEMAS = {"reviews": pa.schema([("id", pa.string()),
+                                 ("title", pa.string()),
+                                 ("creationDate", pa.string()),
+                                 ("reviewText", pa.string()),
+                                 ("originalReview", pa.string()),
+                                 ("cleanedReviews", pa.string()),
+                                 ("language", pa.string())]),
+           "sentiment": pa.schema([("sentiment", pa.string()),
+                                   ("sentimentScore", pa.float64()),
+                                   ("id", pa.string())]),
+           "aspects": pa.schema([("sentence", pa.string()),
+                                 ("aspect", pa.list_(pa.string())),
+                                 ("sentiment", pa.list_(pa.string())),
+                                 ("confidence", pa.list_(pa.float64())),
+                                 ("tokens", pa.list_(pa.string())),
+                                 ("IOB", pa.list_(pa.string())),
+                                 ("aspectString", pa.string())]),
+           "topics": pa.schema([("sentence", pa.string()),
+                                ("aspect", pa.string()),
+                                ("sentiment", pa.string()),
+                                ("confidence", pa.float64()),
+                                ("topic", pa.int64()),
+                                ("topic_label", pa.string()),
+                                ("topic_probability", pa.float64())]),
+           "embeddings": pa.schema([("id", pa.string())]),
+           "valence_aggregated": pa.schema([("id", pa.string()),
+                                            ("AvgValence", pa.float64())]),
+           "topics_aggregated": pa.schema([("Topic", pa.int64()),
+                                           ("TopicLabel", pa.string()),
+                                           ("TopicCount", pa.int64())])}
+
+
+def check_file_format(file_format):
+    """
+    Raise a ValueError for unsupported shard formats.
+    """
+    if file_format not in FILE_FORMATS:
+        raise ValueError(f"Unsupported file_format: {file_format}. Must be one of {set(FILE_FORMATS)}")
+
+
+def shard_path(folder, stem, i=None, file_format="parquet"):
+    """
+    Return the path of shard `i` of a dataset, e.g. 'rt_audience_reviews_sentiment_3.parquet'
+    for the stem 'rt_audience_reviews_sentiment', or of a single file if `i` is None.
+    """
+    check_file_format(file_format)
+    name = f"{stem}_{i}" if i is not None else stem
+    return folder / f"{name}{FILE_FORMATS[file_format]}"
+
+
+def find_shard(folder, stem, i=None):
+    """
+    Return the path of an existing shard in any supported format (Parquet first), None if
+    it doesn't exist yet. Used to skip shards already written by a previous run.
+    """
+    for file_format in FILE_FORMATS:
+        path = shard_path(folder, stem, i, file_format)
+        if path.exists():
+            return path
+    return None
+
+
+def list_shards(folder, stem):
+    """
+    List the shards of a dataset in a folder, sorted by shard number.
+
+    Shards may be stored in any supported format. If a shard exists in several formats,
+    the Parquet file is used.
+
+    Returns
+    -------
+    list of pathlib.Path
+        Paths of the shards '{stem}_{i}.parquet' / '{stem}_{i}.json', ordered by i.
+    """
+    shards = {}
+    for file_format in reversed(list(FILE_FORMATS)):
+        pattern = re.compile(rf"^{re.escape(stem)}_(\d+){re.escape(FILE_FORMATS[file_format])}$")
+        for path in folder.glob(f"{stem}_*{FILE_FORMATS[file_format]}"):
+            match = pattern.match(path.name)
+            if match:
+                shards[int(match.group(1))] = path
+    return [shards[i] for i in sorted(shards)]
+
+
+def read_shard(path, columns=None):
+    """
+    Read a shard (Parquet or JSON) into a DataFrame.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        Path of the shard, its format is determined by the file extension.
+    columns : list of str, optional
+        Columns to read. Parquet shards only read these columns from disk.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Shard data. List columns hold Python lists, as when reading JSON.
+    """
+    if path.suffix == FILE_FORMATS["json"]:
+        data = pd.read_json(path)
+        return data[columns] if columns is not None else data
+
+    table = pq.read_table(path, columns=columns)
+    data = table.to_pandas()
+
+    # Arrow list columns are converted to numpy arrays by default
+    for field in table.schema:
+        if pa.types.is_list(field.type) or pa.types.is_large_list(field.type):
+            data[field.name] = pd.Series(table.column(field.name).to_pylist(), index=data.index, dtype=object)
+    return data
+
+
+def write_shard(data, path, schema=None):
+    """
+    Write a DataFrame to a shard (Parquet or JSON), atomically.
+
+    Parquet shards are compressed with zstd and written with the column types of `schema`
+    (one of `SCHEMAS`), other columns keep their inferred type. JSON shards are written as
+    before, as records with an indent of 2.
+
+    Parameters
+    ----------
+    data : pandas.DataFrame
+        Data to write, the index is not stored.
+    path : pathlib.Path
+        Path of the shard, its format is determined by the file extension.
+    schema : pyarrow.Schema, optional
+        Explicit types of (a subset of) the columns.
+    """
+    tmp_path = path.with_name(path.name + ".tmp")
+
+    if path.suffix == FILE_FORMATS["json"]:
+        data.to_json(tmp_path, date_format="iso", orient="records", indent=2)
+    else:
+        arrays = []
+        for column in data.columns:
+            try:
+                array = pa.array(data[column], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # Columns with mixed types (e.g. ratings given as numbers and as strings) are stored as strings
+                array = pa.array(data[column].where(data[column].isna(), data[column].astype(str)), from_pandas=True)
+            if schema is not None and column in schema.names:
+                array = array.cast(schema.field(column).type)
+            arrays.append(array)
+        table = pa.Table.from_arrays(arrays, names=[str(column) for column in data.columns])
+        pq.write_table(table, tmp_path, compression="zstd")
+
+    os.replace(tmp_path, path)
+
+
+def export_json(path, json_path=None):
+    """
+    Export a Parquet shard to JSON (records with an indent of 2), e.g. for inspection.
+
+    Returns the path of the JSON file (default: same name with the extension '.json').
+    """
+    json_path = json_path if json_path is not None else path.with_suffix(FILE_FORMATS["json"])
+    write_shard(read_shard(path), json_path)
+    return json_path
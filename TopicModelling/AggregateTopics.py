@@ -1,16 +1,18 @@
 import pandas as pd
 from pathlib import Path
+from Storage.shard_storage import SCHEMAS, check_file_format, shard_path, write_shard
+from Storage.ShardSet import ShardSet
 
 
 
 
-def AggregateTopics(Review_Type):
+def AggregateTopics(Review_Type, file_format="parquet"):
     """
     Aggregate topic counts for a given review type (Audience or Critic).
 
-    This function loads all topic-assigned review files (previously generated 
-    with BERTopic inference), merges them into a single DataFrame, and 
-    computes the number of documents per topic. It also preserves the 
+    This function streams all topic-assigned review files (previously generated 
+    with BERTopic inference) one at a time, computes the number of documents 
+    per topic in each file and sums these counts. It also preserves the 
     first available topic label for each topic.
 
     Parameters
@@ -18,6 +20,8 @@ def AggregateTopics(Review_Type):
     Review_Type : str
         Must be either "Audience" or "Critic". Determines which dataset 
         (Audience Topic Data or Critic Topic Data) is processed.
+    file_format : {"parquet", "json"}, default="parquet"
+        Format of the output file. Input files are read in either format.
 
     Returns
     -------
@@ -29,42 +33,43 @@ def AggregateTopics(Review_Type):
 
     Side Effects
     ------------
-    - Reads JSON files from:
+    - Reads Parquet or JSON files from:
         NLP Data/{Review_Type} Topic Data/
-        (expects filenames of the form rt_{review_type}_reviews_topics_{i}.json)
-    - Writes an aggregated JSON file:
-        NLP Data/{Review_Type} Topic Data/rt_{review_type}_topics_aggregated.json
+        (expects filenames of the form rt_{review_type}_reviews_topics_{i}.parquet / .json)
+    - Writes an aggregated Parquet (or JSON) file:
+        NLP Data/{Review_Type} Topic Data/rt_{review_type}_topics_aggregated.parquet
 
     Notes
     -----
-    - The number of input files is currently hardcoded:
-        * Audience → 25 files
-        * Critic → 20 files
+    - All topic files found in the folder are aggregated (see `ShardSet`).
     - Topics assigned as `-1` (outliers) will also appear in the aggregation.
     """
     VALID_REVIEW_TYPES = {"Audience", "Critic"}
 
-    num_files = {"Audience": 25, "Critic": 20}
-
     # Find Workspace folder for relative paths to input/output folders & files
     PROJECT_ROOT = Path(__file__).resolve().parents[1]
 
     # Check for valid Review_Type/Analysis_Type argument. 
     if Review_Type not in VALID_REVIEW_TYPES:
         raise ValueError(f"Unsupported Review Type: {Review_Type}. Must be one of {VALID_REVIEW_TYPES}")
+    check_file_format(file_format)
     
     # Set up paths for reading / saving the data
     folder = PROJECT_ROOT / "NLP Data" / f"{Review_Type} Topic Data"
 
-    # Read in Data
-    topics_data = pd.concat([pd.read_json(folder / f"rt_{Review_Type.lower()}_reviews_topics_{i}.json") for i in range(num_files[Review_Type])], ignore_index=True)
+    # Discover topic files, only the needed columns are read
+    shards = ShardSet(folder, f"rt_{Review_Type.lower()}_reviews_topics", columns=["topic", "topic_label"])
+
+    # Extract Topic Counts per file
+    partials = [topics_data.groupby("topic").agg(TopicLabel = ("topic_label", "first"),
+                                                 TopicCount = ("topic", "count")) for topics_data in shards]
 
-    # Extract Topic Counts
-    TopicCounts = topics_data.groupby("topic").agg(TopicLabel = ("topic_label", "first"),
-                                                   TopicCount = ("topic", "count")).reset_index()
+    # Combine Topic Counts of all files (keeping the first available label)
+    TopicCounts = pd.concat(partials).groupby(level=0).agg(TopicLabel = ("TopicLabel", "first"),
+                                                           TopicCount = ("TopicCount", "sum")).rename_axis("topic").reset_index()
     TopicCounts.rename(columns={"topic": "Topic"}, inplace=True)
 
     # Write to file
-    TopicCounts.to_json(folder / f"rt_{Review_Type.lower()}_topics_aggregated.json", orient="records", indent=2)
+    write_shard(TopicCounts, shard_path(folder, f"rt_{Review_Type.lower()}_topics_aggregated", file_format=file_format), schema=SCHEMAS["topics_aggregated"])
 
     return TopicCounts
@@ -4,43 +4,46 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 from tqdm import tqdm
-import re, gc
+import gc
 import time
+from Storage.shard_storage import SCHEMAS, check_file_format, shard_path, find_shard, list_shards, read_shard, write_shard
 
 
 
 
-def BERTopicInference(Review_Type, ModelFile="bertopic_aspects_model_tuned", timing=True):
+def BERTopicInference(Review_Type, ModelFile="bertopic_aspects_model_tuned", file_format="parquet", timing=True):
     """
     Run BERTopic inference on extracted review aspects and save results with topic assignments.
 
-    This function loads all JSON files containing extracted aspects and their metadata 
+    This function loads all files containing extracted aspects and their metadata 
     (per review) for either Audience or Critic reviews. It then performs the following steps:
 
     1. Reads each file and explodes aspect/sentiment lists into individual rows.
     2. Runs the trained BERTopic model to assign a topic and topic probability to each aspect.
     3. Maps topics to their human-readable labels (if available in the model).
-    4. Writes the enriched data (including topics, labels, and probabilities) back to JSON 
+    4. Writes the enriched data (including topics, labels, and probabilities) to Parquet (or JSON) 
        in a separate output folder, while preserving review metadata.
 
     Parameters
     ----------
     Review_Type : str
         Must be either "Audience" or "Critic". Determines which dataset to process.
+    file_format : {"parquet", "json"}, default="parquet"
+        Format of the output files. Input files are read in either format.
     timing : bool, default=True
         If True, prints per-file runtime information.
 
     Input
     -----
-    - JSON files located in:
+    - Parquet or JSON files located in:
       NLP Data/{Review_Type} Aspects Data/
-      with filenames of the form: rt_{review_type}_reviews_aspects_{i}.json
+      with filenames of the form: rt_{review_type}_reviews_aspects_{i}.parquet / .json
 
     Output
     ------
-    - JSON files saved to:
+    - Parquet (or JSON) files saved to:
       NLP Data/{Review_Type} Topic Data/
-      with filenames of the form: rt_{review_type}_reviews_topics_{i}.json
+      with filenames of the form: rt_{review_type}_reviews_topics_{i}.parquet
 
       Each output file contains the following columns:
       - reviewId: Unique identifier of the review
@@ -73,6 +76,7 @@ def BERTopicInference(Review_Type, ModelFile="bertopic_aspects_model_tuned", tim
     # Check for valid Review_Type/Analysis_Type argument. 
     if Review_Type not in VALID_REVIEW_TYPES:
         raise ValueError(f"Unsupported Review Type: {Review_Type}. Must be one of {VALID_REVIEW_TYPES}")
+    check_file_format(file_format)
     
     topic_model = BERTopic.load(PROJECT_ROOT / f"TopicModelling/{ModelFile}")
 
@@ -85,27 +89,27 @@ def BERTopicInference(Review_Type, ModelFile="bertopic_aspects_model_tuned", tim
 
     print("PROJECT_ROOT:", PROJECT_ROOT)
     print("Looking in folder:", folder)
-    print("Glob pattern:", f"rt_{Review_Type.lower()}_reviews_aspects_*.json")
+    print("Shard pattern:", f"rt_{Review_Type.lower()}_reviews_aspects_*")
 
     # List of files to process, sorted to maintain order
-    json_files = sorted(folder.glob(f"rt_{Review_Type.lower()}_reviews_aspects_*.json"), key=lambda x: int(re.search(r"_(\d+)\.json$", x.name).group(1)))
+    input_files = list_shards(folder, f"rt_{Review_Type.lower()}_reviews_aspects")
 
     # Get label mapping to write the topic label into the DataFrame
     label_map = topic_model.get_topic_info().set_index("Topic")["CustomName"].to_dict()
 
     # Process files one by one
-    for i, file_path in tqdm(enumerate(json_files), desc=f"Processing {Review_Type} files."):
+    for i, file_path in tqdm(enumerate(input_files), desc=f"Processing {Review_Type} files."):
 
         # Inizialize output path
-        output_path = output_folder / f"rt_{Review_Type.lower()}_reviews_topics_{i}.json"
+        output_path = shard_path(output_folder, f"rt_{Review_Type.lower()}_reviews_topics", i, file_format)
 
-        # Skip already processed files
-        if output_path.exists():
+        # Skip already processed files (in any format)
+        if find_shard(output_folder, f"rt_{Review_Type.lower()}_reviews_topics", i) is not None:
             print(f"[✓] Skipping File {i} — already completed.")
             continue
         
         # Prepare aspect data
-        aspect_data = pd.read_json(file_path)
+        aspect_data = read_shard(file_path, columns=["reviewId", "sentence", "aspect", "sentiment", "confidence"])
 
         # Ensure lists are lists
         aspect_data["aspect"] = aspect_data["aspect"].apply(lambda x: x if isinstance(x, list) else [])
@@ -121,7 +125,7 @@ def BERTopicInference(Review_Type, ModelFile="bertopic_aspects_model_tuned", tim
         # Drop rows with empty aspects (after exploding)
         aspect_data = aspect_data[aspect_data["aspect"].astype(str).str.strip().astype(bool)]
 
-        print(f"[→] Processing file {i}/{len(json_files)-1}: {file_path.name}, doing Topic Modelling…")
+        print(f"[→] Processing file {i}/{len(input_files)-1}: {file_path.name}, doing Topic Modelling…")
         start_time = time.time()
 
         # Run inference
@@ -133,7 +137,7 @@ def BERTopicInference(Review_Type, ModelFile="bertopic_aspects_model_tuned", tim
         aspect_data["topic_label"] = aspect_data["topic"].map(label_map)
 
         # Write Data to file
-        aspect_data[["reviewId", "sentence", "aspect", "sentiment", "confidence", "topic", "topic_label", "topic_probability"]].to_json(output_path, date_format="iso", orient="records", indent=2)
+        write_shard(aspect_data[["reviewId", "sentence", "aspect", "sentiment", "confidence", "topic", "topic_label", "topic_probability"]], output_path, schema=SCHEMAS["topics"])
 
         # Clear variables
         del aspect_data, topics, probabilities
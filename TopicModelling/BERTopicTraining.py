@@ -6,6 +6,7 @@ import torch
 import pandas as pd
 from pathlib import Path
 import time
+from Storage.ShardSet import ShardSet
 
 
 
@@ -15,9 +16,9 @@ def BERTopicTraining():
     Train a BERTopic model on movie review aspects extracted from audience and critic reviews.
 
     The function performs the following steps:
-    1. Loads JSON files containing audience and critic review aspects.
-    2. Combines the data into a single DataFrame.
-    3. Flattens and cleans the "aspect" column by removing empty entries.
+    1. Streams the aspect column of the files containing audience and critic review aspects.
+    2. Flattens the "aspect" column of each file into a single list.
+    3. Cleans the aspects by removing empty entries.
     4. Deduplicates aspect strings to improve training efficiency.
     5. Computes embeddings for the unique, non-empty aspect strings using SentenceTransformer.
     6. Trains a BERTopic model with a KeyBERT-inspired representation.
@@ -26,7 +27,7 @@ def BERTopicTraining():
     Notes
     -----
     - Empty aspect strings are excluded from training.
-    - The function is currently hardcoded to load 25 audience and 20 critic JSON files.
+    - All audience and critic aspect files found (Parquet or JSON) are used (see `ShardSet`).
     - The "all-MiniLM-L6-v2" SentenceTransformer model is used for embeddings.
     - The following artifacts are saved in the "TopicModelling" folder at the project root:
         * `bertopic_aspects_model/` : The trained BERTopic model.
@@ -43,16 +44,18 @@ def BERTopicTraining():
 
     start_time = time.time()
 
-    # Load Data
-    audience_data = pd.concat([pd.read_json(PROJECT_ROOT / f"NLP Data/Audience Aspects Data/rt_audience_reviews_aspects_{i}.json") for i in range(25)])
-    critic_data = pd.concat([pd.read_json(PROJECT_ROOT / f"NLP Data/Critic Aspects Data/rt_critic_reviews_aspects_{i}.json") for i in range(20)])
+    # Discover audience and critic aspect files, only the aspect column is read
+    shard_sets = [ShardSet(PROJECT_ROOT / "NLP Data/Audience Aspects Data", "rt_audience_reviews_aspects", columns=["aspect"]),
+                  ShardSet(PROJECT_ROOT / "NLP Data/Critic Aspects Data", "rt_critic_reviews_aspects", columns=["aspect"])]
 
-    # Flatten aspects into a list (faster than explode)
+    # Flatten aspects into a list (faster than explode), one file at a time
     all_aspects = []
 
-    for aspects in pd.concat([audience_data, critic_data], ignore_index=True)["aspect"]:
-        if isinstance(aspects, list):
-            all_aspects.extend(aspects)
+    for shards in shard_sets:
+        for aspects_data in shards:
+            for aspects in aspects_data["aspect"]:
+                if isinstance(aspects, list):
+                    all_aspects.extend(aspects)
 
     # Clean and filter aspects
     train_docs = []
@@ -1,16 +1,17 @@
 import pandas as pd
 import numpy as np
 import time
-import re, gc
+import gc
 from pathlib import Path
 import multiprocessing
 from Translation.DetectLanguage import DetectLanguage
 from Translation.MovieReviewTranslatorGoogle import MovieReviewTranslatorGoogle
 from Translation.MovieReviewTranslatorDeepl import MovieReviewTranslatorDeepl
+from Storage.shard_storage import SCHEMAS, check_file_format, shard_path, find_shard, list_shards, read_shard, write_shard
 
 
 
-def TranslateMovieReview(Review_Type, Free=True, chunk_size = 100, num_cores = 5, timing = True):
+def TranslateMovieReview(Review_Type, Free=True, chunk_size = 100, num_cores = 5, file_format = "parquet", timing = True):
     """
     Translate all non-English Rotten Tomatoes movie reviews into English.
 
@@ -29,6 +30,8 @@ def TranslateMovieReview(Review_Type, Free=True, chunk_size = 100, num_cores = 5
         Number of reviews to process per batch during translation.
     num_cores : int, default=5
         Number of CPU cores to use for parallel processing.
+    file_format : {"parquet", "json"}, default="parquet"
+        Format of the output files. Input files are read in either format.
     timing : bool, default=True
         If True, print runtime information for each processed file and chunk.
 
@@ -46,7 +49,7 @@ def TranslateMovieReview(Review_Type, Free=True, chunk_size = 100, num_cores = 5
     4. Translate reviews in parallel, processing them in `chunk_size` batches.
     5. Merge translated reviews back into the dataset, preserving the original text 
        in a new `originalReview` column.
-    6. Save the translated dataset as a JSON file in the `Translated` folder.
+    6. Save the translated dataset as a Parquet (or JSON) file in the `Translated` folder.
 
     Notes
     -----
@@ -75,6 +78,7 @@ def TranslateMovieReview(Review_Type, Free=True, chunk_size = 100, num_cores = 5
     # Check for valid Review_Type/Analysis_Type argument.   
     if Review_Type not in VALID_REVIEW_TYPES:
         raise ValueError(f"Unsupported Review Type: {Review_Type}. Must be one of {VALID_REVIEW_TYPES}")
+    check_file_format(file_format)
 
     # Find Workspace folder for relative paths to input/output folders & files
     PROJECT_ROOT = Path(__file__).resolve().parents[1]
@@ -85,21 +89,23 @@ def TranslateMovieReview(Review_Type, Free=True, chunk_size = 100, num_cores = 5
     output_folder.mkdir(parents=True, exist_ok=True)
 
     # List of files to process, sorted to maintain order
-    json_files = sorted(folder.glob(f"rt_{Review_Type.lower()}_reviews_pre_translation_*.json"), key=lambda x: int(re.search(r"_(\d+)\.json$", x.name).group(1)))
+    input_files = list_shards(folder, f"rt_{Review_Type.lower()}_reviews_pre_translation")
 
     # Process files
-    for i, file_path in enumerate(json_files):
+    for i, file_path in enumerate(input_files):
         
-        # Load movie review data and initialize variables for processing and saving
-        movie_data = pd.read_json(file_path)
-        output_path = output_folder / f"rt_{Review_Type.lower()}_reviews_translated_{i}.json"
+        # Initialize variables for processing and saving
+        output_path = shard_path(output_folder, f"rt_{Review_Type.lower()}_reviews_translated", i, file_format)
         chunks = []
 
-        # Skip already processed files
-        if output_path.exists():
+        # Skip already processed files (in any format)
+        if find_shard(output_folder, f"rt_{Review_Type.lower()}_reviews_translated", i) is not None:
             print(f"[✓] Skipping File {i} — already completed.")
             continue
 
+        # Load movie review data
+        movie_data = read_shard(file_path)
+
         # Find reviews to translate in parallel
         split_data = [*np.array_split(movie_data, num_cores)]
         with multiprocessing.Pool(num_cores) as pool:
@@ -112,11 +118,11 @@ def TranslateMovieReview(Review_Type, Free=True, chunk_size = 100, num_cores = 5
         # Skip empty translations
         if reviews_to_translate.empty:
             print(f"[✓] File {i} has no non-English reviews — skipping translation.")
-            movie_data.to_json(output_path, orient="records", indent=2)
+            write_shard(movie_data, output_path, schema=SCHEMAS["reviews"])
             continue
 
         # Track File being processed and the time it takes
-        print(f"[→] Translating file {i}/{len(json_files)-1}: {file_path.name}. Number of Reviews to translate: {reviews_to_translate.shape[0]}")
+        print(f"[→] Translating file {i}/{len(input_files)-1}: {file_path.name}. Number of Reviews to translate: {reviews_to_translate.shape[0]}")
         start_time = time.time()
 
         # Calculate number of total chunks to keep track of progress
@@ -163,7 +169,7 @@ def TranslateMovieReview(Review_Type, Free=True, chunk_size = 100, num_cores = 5
         movie_data = movie_data[cols]
 
         # Write data to file
-        movie_data.to_json(output_path, date_format="iso", orient="records", indent=2)
+        write_shard(movie_data, output_path, schema=SCHEMAS["reviews"])
 
         # Clear variables
         del translations, chunks, movie_data, reviews_to_translate